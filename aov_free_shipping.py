@@ -40,8 +40,12 @@ def get_total_orders(start_date, end_date, is_subscribed):
 
 def generate_order_report(query, filename, start_date, end_date, is_subscribed):
     # Ejecutar la consulta SQL principal
-    data = execute_query(query)
-    df = pd.DataFrame(data, columns=['orderNumber', 'createdAt', 'total_amount', 'units', 'content'])
+    # Se lee por chunks; el query no trae `content` (el JSON completo del intent, que no se
+    # procesa), así que ni el servidor lo envía ni la memoria depende de su tamaño
+    columns = ['orderNumber', 'createdAt', 'total_amount', 'units']
+    chunks = list(execute_query(query, chunksize=50000))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    df = pd.DataFrame(df, columns=columns)
     
     # Obtener total de órdenes para el período y tipo
     total_orders = get_total_orders(start_date, end_date, is_subscribed)
@@ -324,8 +328,7 @@ SELECT
             value JSON PATH '$'
         )) AS item
         WHERE JSON_EXTRACT(item.value, '$.unitPrice') > 0
-    ) AS units,
-    content -- Incluimos content por si acaso, aunque no se procese directamente en _process_sheet
+    ) AS units
 FROM 
     prod_sales_and_subscriptions.intents
 WHERE 
@@ -376,8 +379,7 @@ SELECT
             value JSON PATH '$'
         )) AS item
         WHERE JSON_EXTRACT(item.value, '$.unitPrice') > 0
-    ) AS units,
-    content -- Incluimos content por si acaso, aunque no se procese directamente en _process_sheet
+    ) AS units
 FROM 
     prod_sales_and_subscriptions.intents
 WHERE 
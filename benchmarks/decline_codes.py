@@ -0,0 +1,66 @@
+"""
+Throughput de la extracción de `decline_code` desde `payments.metadata`, en filas/segundo.
+
+Compara el `json.loads` fila a fila de la versión anterior de `payments.process_data`
+con `modules.payment_metadata.extract_decline_codes`, y verifica que ambos devuelven lo
+mismo, incluidos JSON inválidos, valores vacíos y JSON sin `decline_code`.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.decline_codes [filas]
+"""
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from modules import payment_metadata
+from modules.payment_metadata import extract_decline_codes
+
+
+def synthetic_metadata(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    codes = rng.choice(['insufficient_funds', 'card_declined', 'expired_card', 'do_not_honor'], n_rows)
+    # Cada error de Stripe trae su propio request id, así que casi no hay valores repetidos
+    valores = [
+        json.dumps({
+            'stripeError': {'error': {'decline_code': code, 'request_log_url': f'https://dashboard.stripe.com/logs/req_{i}'}},
+            'attempt': int(i % 3),
+        })
+        for i, code in enumerate(codes)
+    ]
+    especiales = [None, '{not json', '{"stripeError": {}}', '{"other": 1}', '{"stripeError": {"error": {"decline_code": Infinity}}}', np.nan]
+    for posicion, valor in zip(rng.integers(0, n_rows, len(especiales) * 50), especiales * 50):
+        valores[posicion] = valor
+    return pd.Series(valores, dtype=object)
+
+
+def legacy_extract(metadata):
+    def extract_decline_code(metadata):
+        try:
+            metadata_dict = json.loads(metadata)
+            return metadata_dict.get('stripeError', {}).get('error', {}).get('decline_code', 'unknown_error')
+        except (json.JSONDecodeError, TypeError):
+            return 'invalid_metadata'
+
+    return metadata.apply(extract_decline_code)
+
+
+def measure(label, func, metadata):
+    inicio = time.perf_counter()
+    result = func(metadata)
+    elapsed = time.perf_counter() - inicio
+    print(f"{label:<24} {len(metadata) / elapsed:12,.0f} filas/s   ({elapsed:.2f}s)")
+    return result
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    metadata = synthetic_metadata(n_rows)
+
+    legacy = measure("json.loads por fila", legacy_extract, metadata)
+    bulk = measure("extract_decline_codes", extract_decline_codes, metadata)
+    print(f"parser rápido (orjson): {'sí' if payment_metadata._fast_loads is not None else 'no instalado'}")
+
+    assert legacy.tolist() == bulk.tolist()
+    print(f"Resultados idénticos en {n_rows} filas")
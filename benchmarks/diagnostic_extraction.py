@@ -0,0 +1,196 @@
+"""
+Benchmark de la extracción de etnia y experience_with_color de los diagnósticos
+(`additionalFields`) en los análisis de cancelaciones.
+
+Compara los dos extractores anteriores de shadeCancelations.py (`extract_diagnostic_values`
+para las etnias y `extract_diagnostic_var` para la variable 40/36, cada uno con su propio
+`json.loads` por fila) con `modules.diagnostic_fields.extract_diagnostic_fields`, que parsea
+cada diagnóstico distinto una sola vez. Muestra filas/s y verifica que los resultados
+coinciden; la única diferencia esperada son las etnias del formato {"values": {"<id>": {...}}},
+que el extractor anterior no leía. También verifica que, como antes, una variable 40 presente
+con value nulo da "Unknown" sin pasar a la 36 (`null_falls_back=False`), y que con el valor por
+defecto (el COALESCE de `inversor raw data.py`) esas filas sí toman la 36. Por último verifica
+que con `wrapped_only=True` (shadeBeardOrHairCancelations.py e `inversor raw data.py`, cuyos
+JSON_TABLE solo leían `$.diagnostic.values`) las listas y dicts sueltos quedan sin etnia ni
+experiencia y los diagnósticos con "values" no cambian.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.diagnostic_extraction [filas]
+"""
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+from modules.diagnostic_fields import extract_diagnostic_fields, experience_with_color
+
+FILAS_POR_CANCELACION = 3
+
+
+def synthetic_additional_fields(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    n_diagnosticos = max(1, n_rows // FILAS_POR_CANCELACION)
+    formatos = rng.choice(['lista', 'values_lista', 'values_dict', 'dict'], n_diagnosticos)
+    diagnosticos = []
+    for i, formato in enumerate(formatos):
+        respuestas = [
+            {'variable': 4, 'value': int(rng.choice([5, 13, 14, 15]))},
+            {'variable': int(rng.choice([40, 36])), 'value': str(rng.choice([112, 114, 116, 118, 119, 120, 999]))},
+            {'variable': 27, 'value': f'Cliente {i}'},
+        ]
+        if rng.random() < 0.1:
+            # Variable 40 presente pero sin value, con una 36 detrás
+            respuestas[1] = {'variable': 40, 'value': None}
+            respuestas.append({'variable': 36, 'value': str(rng.choice([112, 114, 116]))})
+        rng.shuffle(respuestas)
+        if formato == 'lista':
+            diagnosticos.append(json.dumps(respuestas))
+        elif formato == 'values_lista':
+            diagnosticos.append(json.dumps({'values': respuestas}))
+        else:
+            por_id = {str(396000 + j): {k: None if v is None else str(v) for k, v in r.items()} for j, r in enumerate(respuestas)}
+            diagnosticos.append(json.dumps({'values': por_id} if formato == 'values_dict' else por_id))
+
+    filas = [diagnosticos[i % n_diagnosticos] for i in range(n_rows)]
+    for i in rng.choice(n_rows, n_rows // 50, replace=False):
+        filas[i] = None if i % 2 else '{invalid'
+    return pd.Series(filas), formatos
+
+
+def legacy_extract_diagnostic_var(additional_fields, var_ids):
+    if not additional_fields or pd.isna(additional_fields):
+        return None
+    try:
+        diagnostic_data = json.loads(additional_fields)
+        if isinstance(diagnostic_data, dict) and "values" in diagnostic_data:
+            values = diagnostic_data.get("values")
+        else:
+            values = diagnostic_data
+        if isinstance(values, list):
+            items = values
+        elif isinstance(values, dict):
+            items = list(values.values())
+        else:
+            items = []
+        for wanted_var in var_ids:
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                var = item.get("variable", item.get("var"))
+                val = item.get("value", item.get("val"))
+                if var is None:
+                    continue
+                try:
+                    var_int = int(var)
+                except (ValueError, TypeError):
+                    continue
+                if var_int == int(wanted_var):
+                    return None if val is None else str(val)
+        return None
+    except json.JSONDecodeError:
+        return None
+
+
+def legacy_map_experience_with_color(exp_code):
+    if exp_code is None or (isinstance(exp_code, float) and pd.isna(exp_code)):
+        return "Unknown"
+    code = str(exp_code).strip()
+    if code in ("118", "112"):
+        return "Currently Dyed"
+    if code in ("119", "116"):
+        return "I've colored"
+    if code in ("120", "114"):
+        return "Never colored"
+    return "Unknown"
+
+
+def _legacy_values(items):
+    found = []
+    for item in items:
+        if isinstance(item, dict) and 'value' in item:
+            try:
+                value = int(item['value'])
+                if value in [13, 14, 15]:
+                    found.append(value)
+            except (ValueError, TypeError):
+                continue
+    return found
+
+
+def legacy_extract_diagnostic_values(additional_fields):
+    if not additional_fields or pd.isna(additional_fields):
+        return []
+    try:
+        diagnostic_data = json.loads(additional_fields)
+        values_found = []
+        if isinstance(diagnostic_data, list):
+            values_found = _legacy_values(diagnostic_data)
+        elif isinstance(diagnostic_data, dict):
+            for _, value_dict in diagnostic_data.items():
+                if isinstance(value_dict, dict):
+                    values_found.extend(_legacy_values([value_dict]))
+                elif isinstance(value_dict, list):
+                    values_found.extend(_legacy_values(value_dict))
+        return values_found[:1]
+    except json.JSONDecodeError:
+        return []
+
+
+def run_legacy(additional_fields):
+    etnias = additional_fields.apply(legacy_extract_diagnostic_values)
+    exp_code = additional_fields.apply(lambda x: legacy_extract_diagnostic_var(x, [40, 36]))
+    return pd.DataFrame({
+        'ethnicity': etnias.apply(lambda x: x[0] if x else np.nan).astype(float),
+        'experience_with_color': exp_code.apply(legacy_map_experience_with_color),
+    })
+
+
+def run_nuevo(additional_fields):
+    diagnostico = extract_diagnostic_fields(additional_fields, variables=(40, 36))
+    return pd.DataFrame({
+        'ethnicity': diagnostico['ethnicity'],
+        'experience_with_color': experience_with_color(diagnostico, null_falls_back=False),
+        'experience_coalesce': experience_with_color(diagnostico),
+    })
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    additional_fields, formatos = synthetic_additional_fields(n_rows)
+
+    inicio = time.perf_counter()
+    legacy = run_legacy(additional_fields)
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nuevo = run_nuevo(additional_fields)
+    nuevo_seconds = time.perf_counter() - inicio
+
+    pd.testing.assert_series_equal(legacy['experience_with_color'], nuevo['experience_with_color'], check_dtype=False)
+    distintas = ~((legacy['ethnicity'] == nuevo['ethnicity']) | (legacy['ethnicity'].isna() & nuevo['ethnicity'].isna()))
+    assert (legacy.loc[distintas, 'ethnicity'].isna() & nuevo.loc[distintas, 'ethnicity'].notna()).all()
+    assert additional_fields[distintas].str.startswith('{"values": {').all()
+
+    # Con el COALESCE de 40 y 36, solo cambian las filas con la 40 presente y sin value
+    con_40_nula = nuevo['experience_with_color'] != nuevo['experience_coalesce']
+    assert (nuevo.loc[con_40_nula, 'experience_with_color'] == 'Unknown').all()
+    assert additional_fields[con_40_nula].str.contains('"variable": "?40"?, "value": null', regex=True).all()
+
+    print(f"{n_rows} filas ({additional_fields.nunique()} diagnósticos distintos)")
+    print(f"anterior (2 parseos por fila): {n_rows / legacy_seconds:12,.0f} filas/s")
+    print(f"un parseo por diagnóstico:     {n_rows / nuevo_seconds:12,.0f} filas/s   ({legacy_seconds / nuevo_seconds:.1f}x)")
+    print(f"Resultados idénticos; {distintas.sum()} filas del formato {{\"values\": {{...}}}} ganan la etnia que antes se perdía")
+
+    # Solo el formato con "values": lo demás sin respuestas, como los JSON_TABLE anteriores
+    envuelto = extract_diagnostic_fields(additional_fields, variables=(40, 36), wrapped_only=True)
+    envuelto_exp = experience_with_color(envuelto, unknown=None)
+    con_values = additional_fields.str.startswith('{"values": ', na=False)
+    assert envuelto.loc[~con_values, 'ethnicity'].isna().all() and envuelto_exp[~con_values].isna().all()
+    pd.testing.assert_series_equal(envuelto.loc[con_values, 'ethnicity'], nuevo.loc[con_values, 'ethnicity'], check_names=False)
+    pd.testing.assert_series_equal(envuelto_exp[con_values], experience_with_color(
+        extract_diagnostic_fields(additional_fields[con_values], variables=(40, 36)), unknown=None))
+    sueltos = (~con_values & additional_fields.str.startswith(('[', '{"'), na=False)).sum()
+
+    print(f"{con_40_nula.sum()} filas con la variable 40 sin value: 'Unknown' como antes (con el COALESCE tomarían la 36)")
+    print(f"wrapped_only: {sueltos} filas con lista o dict sueltos quedan sin etnia ni experiencia; las {con_values.sum()} con \"values\" no cambian")
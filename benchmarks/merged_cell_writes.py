@@ -0,0 +1,63 @@
+"""
+Micro-benchmark de escrituras sobre celdas combinadas en una hoja tipo Monthly Report.
+
+Compara el recorrido lineal de `ws.merged_cells.ranges` (comportamiento anterior de
+`anotar_datos_excel`) con `report.MergedCellIndex` a medida que crece el número de
+rangos combinados del template. Con el índice el coste por escritura se mantiene plano.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.merged_cell_writes
+"""
+import time
+from openpyxl import Workbook
+from report import MergedCellIndex, _escribir_celda
+
+WRITES = 500
+
+
+def build_sheet(n_ranges):
+    ws = Workbook().active
+    # Rangos de 2 filas x 2 columnas apilados, como los bloques de métricas del template
+    for i in range(n_ranges):
+        fila = 1 + (i // 10) * 2
+        columna = 1 + (i % 10) * 2
+        ws.merge_cells(start_row=fila, start_column=columna, end_row=fila + 1, end_column=columna + 1)
+    return ws
+
+
+def write_linear_scan(ws, fila, columna, valor):
+    try:
+        ws.cell(row=fila, column=columna, value=valor)
+    except AttributeError:
+        cell = ws.cell(row=fila, column=columna)
+        for merged_range in ws.merged_cells.ranges:
+            if cell.coordinate in merged_range:
+                top_left_cell = ws.cell(row=merged_range.min_row, column=merged_range.min_col)
+                top_left_cell.value = valor
+                break
+
+
+def run(n_ranges):
+    ws = build_sheet(n_ranges)
+    max_fila = (n_ranges // 10) * 2
+    # Siempre la celda inferior derecha de un rango: nunca la principal
+    celdas = [(2 + (i % (max_fila // 2)) * 2, 2 + (i % 10) * 2) for i in range(WRITES)]
+
+    inicio = time.perf_counter()
+    for i, (fila, columna) in enumerate(celdas):
+        write_linear_scan(ws, fila, columna, i)
+    lineal = (time.perf_counter() - inicio) / WRITES
+
+    inicio = time.perf_counter()
+    indice = MergedCellIndex(ws)
+    for i, (fila, columna) in enumerate(celdas):
+        _escribir_celda(ws, fila, columna, i, indice)
+    con_indice = (time.perf_counter() - inicio) / WRITES
+
+    print(f"{n_ranges:>6} rangos   lineal: {lineal * 1e6:9.1f} µs/escritura   índice: {con_indice * 1e6:7.1f} µs/escritura")
+
+
+if __name__ == "__main__":
+    for n_ranges in (50, 200, 1000, 5000):
+        run(n_ranges)
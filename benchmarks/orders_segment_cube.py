@@ -0,0 +1,120 @@
+"""
+Benchmark del cubo de segmentos de `orders.get_orders` sobre un `fact_orders` sintético de 12 meses.
+
+Compara la implementación anterior (9 copias filtradas del DataFrame y un groupby + merge
+por cada una) con `build_segment_cube` + `segment_slice`, y verifica que los 9 resúmenes
+diarios y sus promedios coinciden.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.orders_segment_cube [filas]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from orders import SEGMENTOS, build_segment_cube, segment_slice, process_data
+
+START_DATE = '2025-01-01'
+END_DATE = '2026-01-01'
+
+
+def synthetic_fact_orders(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(START_DATE).value
+    end = pd.Timestamp(END_DATE).value
+    return pd.DataFrame({
+        'order_number': np.arange(n_rows),
+        'created_at': pd.to_datetime(rng.integers(start, end, n_rows)),
+        'is_first_order': rng.integers(0, 2, n_rows),
+        'recurrent': rng.integers(0, 2, n_rows),
+        'order_plan': rng.choice(['SUBSCRIPTION', 'OTO', 'MIXED'], n_rows),
+        'total': rng.integers(1000, 20000, n_rows) / 100,
+        'validItems': rng.integers(1, 6, n_rows),
+    })
+
+
+def legacy_segments(sO):
+    sO_sin_recurrentes = sO[sO['recurrent'] == 0]
+    usuarios_nuevos = sO_sin_recurrentes[sO_sin_recurrentes['is_first_order'] == 1]
+    usuarios_antiguos = sO_sin_recurrentes[sO_sin_recurrentes['is_first_order'] == 0]
+    return [
+        usuarios_nuevos[usuarios_nuevos['order_plan'] == 'SUBSCRIPTION'],
+        usuarios_nuevos[usuarios_nuevos['order_plan'] == 'OTO'],
+        usuarios_nuevos[usuarios_nuevos['order_plan'] == 'MIXED'],
+        usuarios_nuevos,
+        usuarios_antiguos[usuarios_antiguos['order_plan'] == 'SUBSCRIPTION'],
+        usuarios_antiguos[usuarios_antiguos['order_plan'] == 'OTO'],
+        usuarios_antiguos[usuarios_antiguos['order_plan'] == 'MIXED'],
+        usuarios_antiguos,
+        sO[sO['recurrent'] == 1],
+    ]
+
+
+def legacy_process_data(metrica, start_date, end_date):
+    metrica = metrica.copy()
+    metrica['created_at'] = pd.to_datetime(metrica['created_at'])
+    metrica['date'] = metrica['created_at'].dt.date
+
+    all_dates_df = pd.DataFrame({'date': pd.date_range(start=start_date, end=end_date).date})
+    daily_summary = metrica.groupby('date').agg(
+        total_revenue=('total', 'sum'),
+        total_sales=('order_number', 'count'),
+        total_items=('validItems', 'sum'),
+    ).reset_index()
+    daily_summary = pd.merge(all_dates_df, daily_summary, on='date', how='left').fillna(0)
+    daily_summary['average_items'] = (
+        daily_summary['total_items'] / daily_summary['total_sales'].replace(0, 1)
+    ).where(daily_summary['total_sales'] > 0, 0)
+    daily_summary['average_value'] = (
+        daily_summary['total_revenue'] / daily_summary['total_sales'].replace(0, 1)
+    ).where(daily_summary['total_sales'] > 0, 0)
+
+    suma_total = metrica['total'].sum()
+    total_ventas = metrica['total'].count()
+    total_items = metrica['validItems'].sum()
+    average_items = total_items / total_ventas if total_ventas > 0 else 0
+    average_value = suma_total / total_ventas if total_ventas > 0 else 0
+    totals_row = pd.DataFrame([{
+        'date': 'Total',
+        'total_revenue': suma_total,
+        'total_sales': total_ventas,
+        'total_items': total_items,
+        'average_items': average_items,
+        'average_value': average_value,
+    }])
+    return pd.concat([daily_summary, totals_row], ignore_index=True), average_items, average_value
+
+
+def run_legacy(sO, new_end_date):
+    return [legacy_process_data(segmento, START_DATE, new_end_date) for segmento in legacy_segments(sO)]
+
+
+def run_cube(sO, new_end_date):
+    cube = build_segment_cube(sO)
+    return [
+        process_data(segment_slice(cube, recurrent, is_first_order, order_plan), START_DATE, new_end_date)
+        for _, recurrent, is_first_order, order_plan in SEGMENTOS
+    ]
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    sO = synthetic_fact_orders(n_rows)
+    new_end_date = (pd.to_datetime(END_DATE) - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+
+    inicio = time.perf_counter()
+    legacy = run_legacy(sO, new_end_date)
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    cube = run_cube(sO, new_end_date)
+    cube_seconds = time.perf_counter() - inicio
+
+    for (nombre, *_), (old_df, old_items, old_value), (new_df, new_items, new_value) in zip(SEGMENTOS, legacy, cube):
+        pd.testing.assert_frame_equal(old_df, new_df, check_dtype=False)
+        assert np.isclose(old_items, new_items) and np.isclose(old_value, new_value), nombre
+
+    print(f"{n_rows} órdenes, 9 segmentos")
+    print(f"anterior: {legacy_seconds:.2f}s   cubo: {cube_seconds:.2f}s   ({legacy_seconds / cube_seconds:.1f}x)")
+    print("Resultados idénticos en los 9 segmentos")
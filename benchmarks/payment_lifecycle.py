@@ -0,0 +1,103 @@
+"""
+Benchmark del ciclo de errores de pago de `payments.process_data` sobre pagos sintéticos.
+
+Compara la implementación anterior (`groupby('entityId').apply` con un sort e `iloc` por
+entidad) con `payments.payment_lifecycle`, y verifica que ambas devuelven las mismas
+fechas de primer error, fechas de resolución y metadatos para cada entityId.
+
+La versión anterior tarda varios minutos con 1M de filas, así que se compara sobre una
+muestra de entidades completas de unas `filas_anterior` filas (100k por defecto); la
+vectorizada corre sobre todas.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.payment_lifecycle [filas] [filas_anterior]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from payments import payment_lifecycle
+
+START_DATE = '2025-01-01'
+END_DATE = '2025-03-01'
+
+
+def synthetic_payments(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(START_DATE).value
+    end = pd.Timestamp(END_DATE).value
+    # Marcas de tiempo únicas: el sort anterior no era estable ante empates
+    created = start + rng.permutation(n_rows) * ((end - start) // n_rows)
+    status = rng.choice(['FAILED', 'SUCCESS', 'PENDING'], n_rows, p=[0.3, 0.6, 0.1])
+    codes = rng.choice(['insufficient_funds', 'card_declined', 'expired_card'], n_rows)
+    metadata = np.where(
+        status == 'FAILED',
+        pd.Series(codes).map(lambda code: '{"stripeError": {"error": {"decline_code": "%s"}}}' % code),
+        None,
+    )
+    return pd.DataFrame({
+        'entityId': rng.integers(0, n_rows // 4, n_rows).astype(str),
+        'createdAt': pd.to_datetime(created),
+        'status': status,
+        'metadata': metadata,
+    })
+
+
+def legacy_lifecycle(sP):
+    def calculate_metrics(group):
+        group = group.sort_values('createdAt')
+
+        first_failed = group.iloc[0] if group.iloc[0]['status'] == 'FAILED' else None
+
+        resolved_date = None
+        if 'FAILED' in group['status'].values and 'SUCCESS' in group['status'].values:
+            success_row = group[group['status'] == 'SUCCESS'].iloc[0]
+            resolved_date = success_row['createdAt'].date()
+
+        return pd.Series({
+            'first_error_date': first_failed['createdAt'].date() if first_failed is not None else None,
+            'resolved_date': resolved_date,
+            'metadata': first_failed['metadata'] if first_failed is not None else None
+        })
+
+    return sP.groupby('entityId').apply(calculate_metrics)
+
+
+def as_dates(series):
+    return series.map(lambda x: None if pd.isna(x) else pd.Timestamp(x).date())
+
+
+def as_values(series):
+    return series.map(lambda x: None if pd.isna(x) else x)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    legacy_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    sP = synthetic_payments(n_rows)
+
+    inicio = time.perf_counter()
+    vectorized = payment_lifecycle(sP)
+    print(f"vectorizado: {n_rows} pagos, {len(vectorized)} entityId en {time.perf_counter() - inicio:.2f}s")
+
+    # Muestra por entidades completas, para conservar el tamaño real de los grupos
+    entidades = sP['entityId'].drop_duplicates().head(legacy_rows * len(vectorized) // n_rows)
+    muestra = sP[sP['entityId'].isin(entidades)]
+
+    inicio = time.perf_counter()
+    legacy = legacy_lifecycle(muestra)
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorized = payment_lifecycle(muestra)
+    vectorized_seconds = time.perf_counter() - inicio
+
+    assert legacy.index.equals(vectorized.index)
+    for column in ['first_error_date', 'resolved_date']:
+        assert as_dates(legacy[column]).equals(as_dates(vectorized[column])), column
+    assert as_values(legacy['metadata']).equals(as_values(vectorized['metadata']))
+
+    print(f"{len(muestra)} pagos, {len(legacy)} entityId")
+    print(f"anterior: {legacy_seconds:.2f}s   vectorizado: {vectorized_seconds:.2f}s   ({legacy_seconds / vectorized_seconds:.1f}x)")
+    print("Resultados idénticos por entityId")
@@ -0,0 +1,51 @@
+"""
+Benchmark de la normalización de razones de cancelación de `modules/cancellation_cube.py`.
+
+Compara `normalize_reason` fila por fila con `.apply` (como hacían `procesar_razon` y
+`simplificar_razon` en cada script) con `normalize_reasons`, que normaliza cada razón
+distinta una sola vez y devuelve un Categorical, y mide un groupby por razón sobre cada
+resultado. Verifica que las razones y los conteos coinciden.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.reason_normalization [filas]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from modules.cancellation_cube import normalize_reason, normalize_reasons
+
+RAZONES = [
+    'Too expensive -> Found a cheaper option', 'Too expensive -> Other', 'Color not right -> Too dark',
+    'Color not right -> Too light -> Orange tones', 'Skin reaction', 'No longer needed', '  ',
+    'Other - product arrived late', 'Moving abroad -> Other', None,
+]
+
+
+def medir(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = np.random.default_rng(7)
+    reasons = pd.Series(rng.choice(np.array(RAZONES, dtype=object), n_rows))
+    subscriptions = pd.Series(rng.integers(0, n_rows // 3, n_rows))
+
+    for separator in ('->', '-'):
+        texto, apply_seconds = medir(lambda: reasons.apply(normalize_reason, separator=separator))
+        categorias, unicas_seconds = medir(lambda: normalize_reasons(reasons, separator=separator))
+        assert (categorias.astype(str) == texto).all()
+
+        conteo_texto, groupby_texto = medir(lambda: subscriptions.groupby(texto).nunique())
+        conteo_categorias, groupby_categorias = medir(lambda: subscriptions.groupby(categorias, observed=True).nunique())
+        pd.testing.assert_series_equal(conteo_texto, conteo_categorias.rename(index=str), check_index_type=False)
+
+        print(f"separador '{separator}': {n_rows} razones, {reasons.nunique(dropna=False)} distintas")
+        print(f"  normalización  .apply: {apply_seconds:.3f}s   únicas + Categorical: {unicas_seconds:.3f}s   "
+              f"({apply_seconds / unicas_seconds:.0f}x)")
+        print(f"  groupby        texto:  {groupby_texto:.3f}s   códigos:              {groupby_categorias:.3f}s")
+    print("Razones y conteos idénticos")
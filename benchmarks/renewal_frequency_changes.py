@@ -0,0 +1,146 @@
+"""
+Benchmark del análisis de cambios de frecuencia de `newRealRenewalFrecuency.renewalFrequency`.
+
+Compara el recorrido anterior (`iterrows` con un `json.loads`, un regex y un `strptime` por
+cambio en cada suscripción, más `calculate_frequency_change_difference`) con
+`analyze_frequency_changes`, que pasa el historial a formato largo una sola vez y resuelve el
+cambio en el período y la diferencia de los dos últimos cambios con operaciones por columnas.
+Verifica que la columna `has_valid_frequency_change`, las diferencias y su promedio coinciden.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.renewal_frequency_changes [suscripciones]
+"""
+import json
+import re
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from newRealRenewalFrecuency import analyze_frequency_changes
+
+FRECUENCIAS = ['Every 2 weeks', 'Every 3 weeks', 'Every 4 weeks', 'Every 4 weeks (RECO)', 'Every 6 weeks',
+               'Every 8 weeks', 'Every 12 weeks', 'Monthly', 'One time']
+
+
+def synthetic_subscriptions(n_subscriptions, seed=7):
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64('2023-01-01T00:00:00')
+    last = inicio + rng.integers(60, 1000, n_subscriptions).astype('timedelta64[D]')
+    second_last = last - rng.integers(7, 120, n_subscriptions).astype('timedelta64[D]')
+    second_last = np.where(rng.random(n_subscriptions) < 0.05, np.datetime64('NaT'), second_last)
+
+    historiales = []
+    for i in range(n_subscriptions):
+        n_cambios = rng.choice([0, 0, 0, 2, 2, 3, 4])
+        if n_cambios == 0:
+            historiales.append('{}' if i % 2 else None)
+            continue
+        # Cambios alrededor del período; algunos con la misma fecha o milisegundos
+        fechas = np.sort(last[i] - rng.integers(-20, 200, n_cambios).astype('timedelta64[D]'))
+        pares = []
+        for fecha in fechas:
+            texto = str(fecha).replace('T', ' ')
+            if rng.random() < 0.2:
+                texto += '.123000'
+            pares.append(f'"{rng.choice(FRECUENCIAS)}": "{texto}"')
+        if rng.random() < 0.01:
+            pares.append('"Every 5 weeks": "0000-00-00 00:00:00"')
+        historiales.append('{invalid' if rng.random() < 0.01 else '{' + ','.join(pares) + '}')
+
+    return pd.DataFrame({
+        'subscription_id': [f'SU{i:08d}' for i in range(n_subscriptions)],
+        'last_order_date': pd.to_datetime(last),
+        'second_last_order_date': pd.to_datetime(second_last),
+        'frequency_changes_json': pd.Series(historiales, dtype=object).fillna('{}'),
+    })
+
+
+def legacy_extract_weeks_from_frequency(freq_str):
+    try:
+        if 'Every' in freq_str:
+            match = re.search(r'Every\s+(\d+)\s+weeks', freq_str)
+            if match:
+                return int(match.group(1))
+        return None
+    except:
+        return None
+
+
+def legacy_calculate_frequency_change_difference(frequencies_dict):
+    try:
+        if not frequencies_dict:
+            return None
+        freq_changes = []
+        for freq, date_str in frequencies_dict.items():
+            weeks = legacy_extract_weeks_from_frequency(freq)
+            if weeks is not None:
+                try:
+                    date = datetime.strptime(date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
+                    freq_changes.append((weeks, date))
+                except:
+                    continue
+        freq_changes.sort(key=lambda x: x[1], reverse=True)
+        valid_changes = [fc for fc in freq_changes if fc[0] is not None]
+        if len(valid_changes) >= 2:
+            return valid_changes[0][0] - valid_changes[1][0]
+        return None
+    except:
+        return None
+
+
+def legacy_analyze_frequency_changes(df_main):
+    frequency_changes_data = []
+    frequency_change_differences = []
+    for idx, row in df_main.iterrows():
+        has_valid_frequency_change = False
+        try:
+            freq_json = row['frequency_changes_json']
+            if freq_json and freq_json != '{}':
+                frequencies_dict = json.loads(freq_json)
+                if frequencies_dict:
+                    valid_changes = {}
+                    for freq, date_str in frequencies_dict.items():
+                        weeks = legacy_extract_weeks_from_frequency(freq)
+                        if weeks is not None:
+                            try:
+                                change_date = datetime.strptime(date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
+                                valid_changes[freq] = date_str
+                                if (pd.notna(row['second_last_order_date']) and
+                                    pd.notna(row['last_order_date']) and
+                                    row['second_last_order_date'] <= change_date <= row['last_order_date']):
+                                    has_valid_frequency_change = True
+                            except:
+                                continue
+                    if has_valid_frequency_change:
+                        frequency_change_diff = legacy_calculate_frequency_change_difference(valid_changes)
+                        if frequency_change_diff is not None:
+                            frequency_change_differences.append(frequency_change_diff)
+        except (json.JSONDecodeError, ValueError):
+            pass
+        frequency_changes_data.append(has_valid_frequency_change)
+    return pd.Series(frequency_changes_data, index=df_main.index), frequency_change_differences
+
+
+if __name__ == "__main__":
+    n_subscriptions = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    df_main = synthetic_subscriptions(n_subscriptions)
+
+    inicio = time.perf_counter()
+    legacy_flags, legacy_differences = legacy_analyze_frequency_changes(df_main)
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    flags, differences = analyze_frequency_changes(df_main)
+    nuevo_seconds = time.perf_counter() - inicio
+
+    pd.testing.assert_series_equal(legacy_flags, flags)
+    assert legacy_differences == differences
+    assert np.mean(legacy_differences) == np.mean(differences)
+
+    print(f"{n_subscriptions} suscripciones, {flags.sum()} con cambio de frecuencia en el período, "
+          f"{len(differences)} diferencias")
+    print(f"anterior (iterrows): {legacy_seconds:.2f}s   formato largo: {nuevo_seconds:.2f}s   "
+          f"({legacy_seconds / nuevo_seconds:.1f}x)")
+    print("Resultados idénticos")
@@ -0,0 +1,109 @@
+"""
+Benchmark del análisis por combinaciones de `repurchaseFirstOrderDiagnosticTotal.py`.
+
+Compara la implementación anterior (lista traducida por cliente y `all(... in lista)` por
+combinación) con `procesar_datos_combinaciones_diagnostico` sobre la matriz clientes x tokens,
+verifica que las combinaciones predefinidas dan el mismo resultado y mide el escaneo
+exhaustivo de pares y tríos con `escanear_combinaciones_diagnostico`, comprobando una
+muestra de sus conteos contra la evaluación directa.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.repurchase_combinations [filas] [min_usuarios]
+"""
+import contextlib
+import io
+import sys
+import time
+from collections import defaultdict
+import pandas as pd
+from benchmarks.repurchase_diagnostic_index import synthetic_first_orders
+from repurchaseFirstOrderDiagnosticTotal import (
+    construir_indice_diagnostico, escanear_combinaciones_diagnostico, parse_diagnostico,
+    procesar_datos_combinaciones_diagnostico, traducir_producto,
+)
+
+COMBINACIONES = {
+    "Exp. Color: Currently Dyed + Skin Reaction: NO": ["B - EXPERIENCE WITH COLOR:B - Currently Dyed", "SKIN REACTION:NO"],
+    "Exp. Color: I've colored + Skin Reaction: NO": ["B - EXPERIENCE WITH COLOR:B - I've colored", "SKIN REACTION:NO"],
+    "Exp. Color: Never colored + Skin Reaction: NO": ["B - EXPERIENCE WITH COLOR:B - Never colored", "SKIN REACTION:NO"],
+    "Exp. Color: Currently Dyed + Skin Reaction: YES": ["B - EXPERIENCE WITH COLOR:B - Currently Dyed", "SKIN REACTION:YES"],
+    "Exp. Color: I've colored + Skin Reaction: YES": ["B - EXPERIENCE WITH COLOR:B - I've colored", "SKIN REACTION:YES"],
+    "Exp. Color: Never colored + Skin Reaction: YES": ["B - EXPERIENCE WITH COLOR:B - Never colored", "SKIN REACTION:YES"],
+    "Sin coincidencias": ["SKIN REACTION:NO", "SKIN REACTION:YES"],
+}
+
+
+def legacy_procesar_datos_combinaciones_diagnostico(df, combinaciones):
+    resultados = defaultdict(lambda: {'recompraron': 0, 'no_recompraron': 0})
+
+    if df.size == 0:
+        return pd.DataFrame()
+
+    for _, row in df.iterrows():
+        diagnostico = row['diagnostic']
+        total_compras = row['total_custom_orders']
+        if pd.isna(diagnostico):
+            continue
+        diagnostico_traducido = [traducir_producto(variable, value) for variable, value in parse_diagnostico(diagnostico)]
+        for nombre_combinacion, variables_combinacion in combinaciones.items():
+            if all(variable in diagnostico_traducido for variable in variables_combinacion):
+                if total_compras > 1:
+                    resultados[nombre_combinacion]['recompraron'] += 1
+                else:
+                    resultados[nombre_combinacion]['no_recompraron'] += 1
+
+    df_resultado = pd.DataFrame([
+        {
+            'Combinación': combinacion,
+            'Variables': ', '.join(combinaciones[combinacion]),
+            'Usuarios que recompraron': stats['recompraron'],
+            'Usuarios que no recompraron': stats['no_recompraron'],
+            'Total de usuarios': stats['recompraron'] + stats['no_recompraron'],
+            'Porcentaje de recompra': (stats['recompraron'] / (stats['recompraron'] + stats['no_recompraron'])) * 100
+            if (stats['recompraron'] + stats['no_recompraron']) > 0 else 0
+        }
+        for combinacion, stats in resultados.items()
+    ])
+    return df_resultado.sort_values('Total de usuarios', ascending=False)
+
+
+def verificar_escaneo(df, indice, escaneo, muestra=25):
+    # Cada fila del escaneo, evaluada como combinación explícita, debe dar los mismos conteos
+    filas = escaneo.sample(min(muestra, len(escaneo)), random_state=7)
+    combinaciones = {fila['Combinación']: fila['Variables'].split(', ') for _, fila in filas.iterrows()}
+    directo = procesar_datos_combinaciones_diagnostico(df, combinaciones, indice).set_index('Combinación')
+    esperado = filas.set_index('Combinación')[directo.columns]
+    pd.testing.assert_frame_equal(esperado.loc[directo.index], directo)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    min_usuarios = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    df = synthetic_first_orders(n_rows)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        legacy = legacy_procesar_datos_combinaciones_diagnostico(df, COMBINACIONES)
+        legacy_seconds = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        indice = construir_indice_diagnostico(df)
+        indice_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nuevo = procesar_datos_combinaciones_diagnostico(df, COMBINACIONES, indice)
+    matriz_seconds = time.perf_counter() - inicio
+    pd.testing.assert_frame_equal(legacy, nuevo)
+
+    print(f"{n_rows} primeras órdenes, {len(COMBINACIONES)} combinaciones predefinidas")
+    print(f"anterior: {legacy_seconds:.2f}s   índice: {indice_seconds:.2f}s + matriz: {matriz_seconds:.3f}s")
+    print("Resultados idénticos en las combinaciones predefinidas")
+
+    for tamano in (2, 3):
+        inicio = time.perf_counter()
+        escaneo = escanear_combinaciones_diagnostico(df, tamano, min_usuarios, indice)
+        escaneo_seconds = time.perf_counter() - inicio
+        if not escaneo.empty:
+            verificar_escaneo(df, indice, escaneo)
+        print(f"escaneo de {tamano}: {len(escaneo)} combinaciones con >= {min_usuarios} usuarios en {escaneo_seconds:.2f}s")
@@ -0,0 +1,161 @@
+"""
+Benchmark de `combinar_dataframes` de `repurchaseFirstOrderDiagnosticTotal.py` con muchos
+rangos (CTF/DVL/AMZ/trimestres).
+
+Compara la implementación anterior (`iterrows()` y diccionarios por clave, totales por
+variable con un bucle sobre `unique()` y formato de porcentajes celda a celda) con la
+versión por groupby + pivot, y verifica que el resultado es idéntico, tanto para el
+análisis por diagnóstico como para el de combinaciones, incluyendo un rango sin datos.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.repurchase_combine_ranges [rangos] [productos]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from repurchaseFirstOrderDiagnosticTotal import combinar_dataframes
+
+
+def synthetic_rango(n_productos, seed, tipo_analisis="diagnostico"):
+    rng = np.random.default_rng(seed)
+    # Cada rango tiene un subconjunto distinto de productos
+    productos = rng.choice(n_productos, int(n_productos * 0.8), replace=False)
+    recompraron = rng.integers(0, 500, len(productos))
+    no_recompraron = rng.integers(1, 500, len(productos))
+    total = recompraron + no_recompraron
+
+    if tipo_analisis == "diagnostico":
+        claves = [f"VARIABLE {p % 40}:VALOR {p}" for p in productos]
+        claves[0] = "SIN VARIABLE"
+        columnas = {'Producto': claves}
+    else:
+        claves = [f"Combinación {p}" for p in productos]
+        columnas = {'Combinación': claves, 'Variables': [f"A:{p}, B:{p % 7}" for p in productos]}
+
+    df = pd.DataFrame({
+        **columnas,
+        'Usuarios que recompraron': recompraron,
+        'Usuarios que no recompraron': no_recompraron,
+        'Total de usuarios': total,
+        'Porcentaje de recompra': recompraron / total * 100,
+    })
+    return df.sort_values('Total de usuarios', ascending=False)
+
+
+def legacy_combinar_dataframes(lista_dataframes, nombres_rangos, tipo_analisis="diagnostico"):
+    if not lista_dataframes:
+        return pd.DataFrame()
+
+    codigos = list(nombres_rangos.keys())
+    maximos_por_rango = {}
+    for i, df in enumerate(lista_dataframes):
+        if df is not None and not df.empty and 'Total de usuarios' in df.columns:
+            maximos_por_rango[codigos[i]] = df['Total de usuarios'].max()
+        else:
+            maximos_por_rango[codigos[i]] = 0
+
+    totales_por_variable_rango = {}
+    for i, df in enumerate(lista_dataframes):
+        if df is None or df.empty:
+            continue
+        codigo_rango = codigos[i]
+        totales_por_variable_rango[codigo_rango] = {}
+        if tipo_analisis == "diagnostico":
+            df['variable_only'] = df['Producto'].apply(lambda x: x.split(':')[0] if ':' in x else '')
+        else:
+            df['variable_only'] = df['Combinación']
+        for variable in df['variable_only'].unique():
+            if variable:
+                total_variable = df[df['variable_only'] == variable]['Total de usuarios'].sum()
+                totales_por_variable_rango[codigo_rango][variable] = total_variable
+
+    datos_combinados = {}
+    for i, df in enumerate(lista_dataframes):
+        if df is None or df.empty:
+            continue
+        codigo_rango = codigos[i]
+        nombre_rango = nombres_rangos[codigo_rango]
+        maximo_rango = maximos_por_rango[codigo_rango]
+
+        for _, row in df.iterrows():
+            if tipo_analisis == "diagnostico":
+                clave = row['Producto']
+                variable = clave.split(':')[0]
+                value = clave.split(':')[1] if ':' in clave else ''
+            else:
+                clave = row['Combinación']
+                variable = clave
+                value = row['Variables']
+
+            if clave not in datos_combinados:
+                datos_combinados[clave] = {'Variable': variable, 'Value': value}
+                for codigo in codigos:
+                    datos_combinados[clave][f'Usuarios que recompraron {codigo}'] = 0
+                    datos_combinados[clave][f'Usuarios que no recompraron {codigo}'] = 0
+                    datos_combinados[clave][f'Total de usuarios {codigo}'] = 0
+                    datos_combinados[clave][f'% del máximo {codigo}'] = 0
+                    datos_combinados[clave][f'% por variable {codigo}'] = 0
+                    datos_combinados[clave][f'{nombres_rangos[codigo]}'] = 0
+
+            datos_combinados[clave][f'Usuarios que recompraron {codigo_rango}'] = row['Usuarios que recompraron']
+            datos_combinados[clave][f'Usuarios que no recompraron {codigo_rango}'] = row['Usuarios que no recompraron']
+            datos_combinados[clave][f'Total de usuarios {codigo_rango}'] = row['Total de usuarios']
+            porcentaje_maximo = (row['Total de usuarios'] / maximo_rango) * 100 if maximo_rango > 0 else 0
+            datos_combinados[clave][f'% del máximo {codigo_rango}'] = porcentaje_maximo
+            total_variable = totales_por_variable_rango[codigo_rango].get(variable, 0)
+            porcentaje_variable = (row['Total de usuarios'] / total_variable) * 100 if total_variable > 0 else 0
+            datos_combinados[clave][f'% por variable {codigo_rango}'] = porcentaje_variable
+            datos_combinados[clave][f'{nombre_rango}'] = row['Porcentaje de recompra']
+
+    df_combinado = pd.DataFrame(list(datos_combinados.values()))
+
+    column_order = ['Variable', 'Value']
+    for codigo in codigos:
+        column_order.extend([
+            f'Usuarios que recompraron {codigo}',
+            f'Usuarios que no recompraron {codigo}',
+            f'Total de usuarios {codigo}',
+            f'% del máximo {codigo}',
+            f'% por variable {codigo}',
+            f'{nombres_rangos[codigo]}'
+        ])
+    df_combinado = df_combinado[[col for col in column_order if col in df_combinado.columns]]
+    df_combinado = df_combinado.sort_values(['Variable', 'Value'])
+
+    for codigo in codigos:
+        for porcentaje_col in [f'% del máximo {codigo}', f'% por variable {codigo}', f'{nombres_rangos[codigo]}']:
+            if porcentaje_col in df_combinado.columns:
+                df_combinado[porcentaje_col] = df_combinado[porcentaje_col].apply(
+                    lambda x: f"{x:.2f}%" if pd.notna(x) and isinstance(x, (int, float)) else x
+                )
+    return df_combinado
+
+
+def comparar(n_rangos, n_productos, tipo_analisis):
+    codigos = ['CTF', 'DVL', 'AMZ'] + [f'Q{i % 4 + 1} - {2023 + i // 4}' for i in range(n_rangos - 3)]
+    nombres_rangos = {codigo: f'Recompra {codigo}' for codigo in codigos}
+    rangos = [synthetic_rango(n_productos, seed, tipo_analisis) for seed in range(n_rangos)]
+    # Un rango sin datos, como cuando falla su consulta
+    rangos[1] = pd.DataFrame()
+
+    inicio = time.perf_counter()
+    legacy = legacy_combinar_dataframes([df.copy() for df in rangos], nombres_rangos, tipo_analisis)
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nuevo = combinar_dataframes(rangos, nombres_rangos, tipo_analisis)
+    nuevo_seconds = time.perf_counter() - inicio
+
+    pd.testing.assert_frame_equal(legacy, nuevo, obj=tipo_analisis)
+    print(f"{tipo_analisis}: {n_rangos} rangos x {n_productos} claves   "
+          f"anterior: {legacy_seconds:.2f}s   groupby + pivot: {nuevo_seconds:.3f}s   "
+          f"({legacy_seconds / nuevo_seconds:.0f}x, resultados idénticos)")
+
+
+if __name__ == "__main__":
+    n_rangos = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    n_productos = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    for tipo_analisis in ("diagnostico", "combinaciones"):
+        comparar(n_rangos, n_productos, tipo_analisis)
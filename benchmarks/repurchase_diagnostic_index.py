@@ -0,0 +1,151 @@
+"""
+Benchmark del análisis de recompra por diagnóstico de `repurchaseFirstOrderDiagnosticTotal.py`
+sobre primeras órdenes sintéticas.
+
+Compara la implementación anterior (tres `iterrows()` que vuelven a parsear el diagnóstico
+y los ítems de cada fila) con `construir_indice_diagnostico` + `procesar_datos_diagnostico`
+sobre el índice, y verifica que las tres páginas (todos, ítem 22 e ítem 23) coinciden.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.repurchase_diagnostic_index [filas]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from repurchaseFirstOrderDiagnosticTotal import (
+    construir_indice_diagnostico, parse_diagnostico, parse_items, procesar_datos_diagnostico,
+    traducir_producto, values_dict, variables_dict,
+)
+
+ITEM_22 = 'IT00000000000000000000000000000022'
+ITEM_23 = 'IT00000000000000000000000000000023'
+OTROS_ITEMS = ['IT00000000000000000000001004170001', 'IT00000000000000000000001004170007', 'IT00000000000000000000000000000098']
+
+
+def synthetic_first_orders(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    variables = np.array(list(variables_dict) + [99])
+    valores = np.array(list(values_dict) + [500])
+    nombres = ['John', 'Mike', 'Carlos', 'Dave']
+    # Cada variable responde con unos pocos valores, como en el quiz real
+    opciones = {int(v): rng.choice(valores, rng.integers(2, 7), replace=False) for v in variables}
+    opciones[40] = np.array([118, 119, 120])
+    opciones[41] = np.array([121, 122])
+
+    diagnosticos = []
+    for i in range(n_rows):
+        muestra = rng.choice(variables, rng.integers(4, 12), replace=False)
+        if rng.random() < 0.05:
+            # Respuesta repetida dentro del mismo diagnóstico
+            muestra = np.append(muestra, muestra[0])
+        respuestas = [
+            {'variable': int(v), 'value': nombres[i % 4] if v == 27 else int(rng.choice(opciones[int(v)]))}
+            for v in muestra
+        ]
+        sorteo = rng.random()
+        if sorteo < 0.03:
+            diagnosticos.append(None)
+        elif sorteo < 0.035:
+            diagnosticos.append('{"values": [{"variable": "x"}]}')
+        elif sorteo < 0.5:
+            diagnosticos.append(json.dumps({'values': respuestas}))
+        else:
+            diagnosticos.append(json.dumps({'values': {
+                str(300000 + j): {'variable': str(r['variable']), 'value': str(r['value'])}
+                for j, r in enumerate(respuestas)
+            }}))
+
+    items = []
+    for _ in range(n_rows):
+        lista = list(rng.choice(OTROS_ITEMS, rng.integers(1, 3), replace=False))
+        sorteo = rng.random()
+        if sorteo < 0.3:
+            lista.append(ITEM_22)
+        elif sorteo < 0.5:
+            lista.append(ITEM_23)
+        items.append(json.dumps(lista) if rng.random() > 0.01 else None)
+
+    return pd.DataFrame({
+        'customer_id': [f'CU{i:08d}' for i in range(n_rows)],
+        'diagnostic': diagnosticos,
+        'total_custom_orders': rng.integers(1, 5, n_rows),
+        'first_order_items': items,
+    })
+
+
+def legacy_procesar_datos_diagnostico(df, filtro_items=None):
+    if filtro_items:
+        df_filtrado = df[df['first_order_items'].apply(
+            lambda x: filtro_items in parse_items(x) if pd.notna(x) else False
+        )]
+    else:
+        df_filtrado = df
+
+    resultados = defaultdict(lambda: {'recompraron': 0, 'no_recompraron': 0})
+
+    if df_filtrado.size == 0:
+        return pd.DataFrame()
+
+    for _, row in df_filtrado.iterrows():
+        diagnostico = row['diagnostic']
+        total_compras = row['total_custom_orders']
+        if pd.isna(diagnostico):
+            continue
+        for variable, value in parse_diagnostico(diagnostico):
+            if variable == 27:
+                continue
+            producto = traducir_producto(variable, value)
+            if total_compras > 1:
+                resultados[producto]['recompraron'] += 1
+            else:
+                resultados[producto]['no_recompraron'] += 1
+
+    df_resultado = pd.DataFrame([
+        {
+            'Producto': producto,
+            'Usuarios que recompraron': stats['recompraron'],
+            'Usuarios que no recompraron': stats['no_recompraron'],
+            'Total de usuarios': stats['recompraron'] + stats['no_recompraron'],
+            'Porcentaje de recompra': (stats['recompraron'] / (stats['recompraron'] + stats['no_recompraron'])) * 100
+            if (stats['recompraron'] + stats['no_recompraron']) > 0 else 0
+        }
+        for producto, stats in resultados.items()
+    ])
+    return df_resultado.sort_values('Total de usuarios', ascending=False)
+
+
+def run_legacy(df):
+    return [legacy_procesar_datos_diagnostico(df, filtro) for filtro in (None, ITEM_22, ITEM_23)]
+
+
+def run_indice(df):
+    indice = construir_indice_diagnostico(df)
+    return [procesar_datos_diagnostico(df, filtro, indice) for filtro in (None, ITEM_22, ITEM_23)]
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    df = synthetic_first_orders(n_rows)
+
+    # Los diagnósticos inválidos imprimen un aviso por fila; no interesan aquí
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        legacy = run_legacy(df)
+        legacy_seconds = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        nuevo = run_indice(df)
+        indice_seconds = time.perf_counter() - inicio
+
+    for pagina, old_df, new_df in zip(('total', 'item22', 'item23'), legacy, nuevo):
+        pd.testing.assert_frame_equal(old_df, new_df, obj=pagina)
+
+    print(f"{n_rows} primeras órdenes, 3 páginas")
+    print(f"anterior: {legacy_seconds:.2f}s   índice: {indice_seconds:.2f}s   ({legacy_seconds / indice_seconds:.1f}x)")
+    print("Resultados idénticos en las 3 páginas")
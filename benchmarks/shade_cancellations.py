@@ -0,0 +1,144 @@
+"""
+Benchmark del análisis de cancelaciones por razón y shade de `shadeCancelations.py`.
+
+Compara la implementación anterior (un `str.contains` sobre `itemIds` por cada uno de los
+34 shades, repetido en las 4 llamadas de main: todas las etnias, CAUCASIAN, AFRICAN y ASIAN)
+con `modules.cancellation_cube`: `shade_flags` separa la lista de ítems una sola vez y las 4
+tablas salen de un solo cubo razón x etnia. Verifica que las 4 tablas son idénticas.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.shade_cancellations [cancelaciones]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from modules.cancellation_cube import (
+    cancellation_cube, cancellation_fact, normalize_reasons, reason_shade_table, shade_flags,
+)
+from shadeCancelations import shades
+
+RAZONES = [
+    'Too expensive', 'Color not right - too dark', 'Color not right - too light', 'Skin reaction',
+    'Other: moving abroad', 'Other - product arrived late', 'No longer needed', None,
+]
+OTROS_ITEMS = ['IT00000000000000000000000000000022', 'IT00000000000000000000000000000023', 'IT00000000000000000000001004170001']
+
+
+def synthetic_cancelaciones(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    ids_shades = np.array(list(shades))
+    item_ids = []
+    for _ in range(n_rows):
+        lista = list(rng.choice(ids_shades, rng.integers(0, 3), replace=False))
+        lista += list(rng.choice(OTROS_ITEMS, rng.integers(0, 2), replace=False))
+        item_ids.append(','.join(lista) if lista else None)
+
+    etnia = rng.choice([13, 14, 15, 0], n_rows)
+    return pd.DataFrame({
+        'id': [f'SC{i:08d}' for i in range(n_rows)],
+        'subscriptionId': [f'SU{i:08d}' for i in rng.integers(0, n_rows // 2, n_rows)],
+        'reason': rng.choice(np.array(RAZONES, dtype=object), n_rows),
+        'itemIds': item_ids,
+        'ethnicity': np.where(etnia > 0, etnia, np.nan),
+        'has_13': etnia == 13,
+        'has_14': etnia == 14,
+        'has_15': etnia == 15,
+    })
+
+
+def legacy_procesar_razon(razon):
+    if pd.isna(razon):
+        return "Sin razón especificada"
+    razon_str = str(razon).strip()
+    if '->' in razon_str:
+        return razon_str.split('->')[0].strip()
+    return razon_str
+
+
+def legacy_agregar_porcentaje(valor):
+    if pd.isna(valor):
+        return ""
+    return f"{valor}%"
+
+
+def legacy_analizar_cancelaciones_por_razon_y_shade(df, filtro_etnia=None):
+    if filtro_etnia == 13:
+        df = df[df['has_13'] == True]
+    elif filtro_etnia == 14:
+        df = df[df['has_14'] == True]
+    elif filtro_etnia == 15:
+        df = df[df['has_15'] == True]
+    df = df.copy()
+
+    df['razon_procesada'] = df['reason'].apply(legacy_procesar_razon)
+
+    for item_id, shade_name in shades.items():
+        col_name = f"shade_{item_id[-4:]}"
+        df[col_name] = df['itemIds'].str.contains(item_id, na=False)
+
+    agg_dict = {
+        'total_cancelaciones': ('id', 'count'),
+        'suscripciones_unicas': ('subscriptionId', 'nunique')
+    }
+    for item_id in shades.keys():
+        col_name = f"shade_{item_id[-4:]}"
+        agg_dict[col_name] = (col_name, 'sum')
+
+    resultado = df.groupby('razon_procesada').agg(**agg_dict).reset_index()
+
+    total_cancelaciones = resultado['total_cancelaciones'].sum()
+    if total_cancelaciones > 0:
+        resultado['porcentaje_cancelaciones'] = (resultado['total_cancelaciones'] / total_cancelaciones * 100).round(2)
+    else:
+        resultado['porcentaje_cancelaciones'] = 0
+
+    for item_id in shades.keys():
+        col_name = f"shade_{item_id[-4:]}"
+        total_shade = resultado[col_name].sum()
+        if total_shade > 0:
+            resultado[f'porcentaje_{col_name}'] = (resultado[col_name] / total_shade * 100).round(2)
+        else:
+            resultado[f'porcentaje_{col_name}'] = 0
+
+    rename_dict = {}
+    for item_id, shade_name in shades.items():
+        col_name = f"shade_{item_id[-4:]}"
+        rename_dict[col_name] = shade_name
+        rename_dict[f'porcentaje_{col_name}'] = f'porcentaje_{shade_name}'
+    resultado = resultado.rename(columns=rename_dict)
+
+    columnas_porcentaje = ['porcentaje_cancelaciones'] + [f'porcentaje_{shade_name}' for shade_name in shades.values()]
+    for col in columnas_porcentaje:
+        if col in resultado.columns:
+            resultado[col] = resultado[col].apply(legacy_agregar_porcentaje)
+
+    return resultado.sort_values('total_cancelaciones', ascending=False)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    df = synthetic_cancelaciones(n_rows)
+    etnias = (None, 13, 14, 15)
+
+    inicio = time.perf_counter()
+    legacy = [legacy_analizar_cancelaciones_por_razon_y_shade(df, etnia) for etnia in etnias]
+    legacy_seconds = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    fact = cancellation_fact(
+        df['subscriptionId'], normalize_reasons(df['reason']), ethnicity=df['ethnicity'],
+        shades=shade_flags(df['itemIds'], shades)
+    )
+    cubo = cancellation_cube(fact, ['razon', 'etnia'])
+    nuevo = [reason_shade_table(cubo, shades, etnia) for etnia in etnias]
+    cubo_seconds = time.perf_counter() - inicio
+
+    for etnia, old_df, new_df in zip(etnias, legacy, nuevo):
+        pd.testing.assert_frame_equal(old_df, new_df, obj=f'etnia {etnia}')
+
+    print(f"{n_rows} cancelaciones, {len(shades)} shades, 4 tablas (todas + 3 etnias)")
+    print(f"anterior (str.contains por shade): {legacy_seconds:.2f}s   cubo: {cubo_seconds:.2f}s   "
+          f"({legacy_seconds / cubo_seconds:.1f}x)")
+    print("Resultados idénticos en las 4 tablas")
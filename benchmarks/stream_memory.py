@@ -0,0 +1,58 @@
+"""
+Compara la memoria pico de cargar una consulta completa con `execute_query` frente a
+recorrerla por chunks con `iter_query`, agregando lo mismo en ambos casos.
+
+Uso (desde la raíz del repositorio, con el .env configurado):
+
+    python -m benchmarks.stream_memory 2025-01-01 2025-02-01 [chunksize]
+"""
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from modules.database_queries import execute_query, iter_query
+
+
+def payments_query(start_date, end_date):
+    return f"""
+    SELECT *
+    FROM prod_sales_and_subscriptions.payments
+    WHERE createdAt >= '{start_date} 00:00:00'
+    AND createdAt < '{end_date} 00:00:00';
+    """
+
+
+def measure(label, func):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - inicio
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} pico: {peak / 1024 / 1024:8.1f} MB   tiempo: {elapsed:6.1f}s")
+    return result
+
+
+def full_load(query):
+    data = execute_query(query)
+    return data['status'].value_counts()
+
+
+def streamed(query, chunksize):
+    counts = pd.Series(dtype="int64")
+    for chunk in iter_query(query, chunksize):
+        counts = counts.add(chunk['status'].value_counts(), fill_value=0)
+    return counts.astype("int64").sort_values(ascending=False)
+
+
+if __name__ == "__main__":
+    start_date = sys.argv[1] if len(sys.argv) > 1 else "2025-01-01"
+    end_date = sys.argv[2] if len(sys.argv) > 2 else "2025-02-01"
+    chunksize = int(sys.argv[3]) if len(sys.argv) > 3 else 50000
+
+    query = payments_query(start_date, end_date)
+    total_full = measure("read_sql", lambda: full_load(query))
+    total_stream = measure(f"chunks {chunksize}", lambda: streamed(query, chunksize))
+
+    iguales = total_full.sort_index().to_dict() == total_stream.sort_index().to_dict()
+    print(f"Mismo resultado: {iguales}")
@@ -1,5 +1,6 @@
 import pandas as pd
 from modules.database_queries import execute_query
+from modules.query_cache import ONE_DAY
 from modules.excel_creator import save_dataframe_to_excel
 import numpy as np  
 
@@ -135,7 +136,7 @@ def get_blocked_payments(ruta_archivo_blocked, ruta_archivo_payments, nombre_sal
         SELECT id, email
         FROM prod_sales_and_subscriptions.customers;
     """
-    customers_df = pd.DataFrame(execute_query(consulta_customers), columns=['id', 'email'])
+    customers_df = pd.DataFrame(execute_query(consulta_customers, cache_ttl=ONE_DAY), columns=['id', 'email'])
 
     # 13. Crear un conjunto de correos existentes en la base de datos
     existing_emails = set(customers_df['email'].dropna().unique())
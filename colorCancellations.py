@@ -1,5 +1,6 @@
 import pandas as pd
 from modules.database_queries import execute_query
+from modules.cancellation_cube import cancellation_cube, cancellation_fact, shade_counts, shade_flags
 
 # Lista de productos (itemId y nombre)
 productos = {
@@ -65,17 +66,13 @@ data = execute_query(query)
 # Convertir los datos en un DataFrame de pandas
 df = pd.DataFrame(data, columns=['subscription_id', 'createdAt', 'legacy_category', 'itemId'])
 
-# Mapear los itemId a nombres de productos
-df['producto'] = df['itemId'].map(productos)
+# Cubo de cancelaciones por día (sin la hora) con una columna por producto;
+# cada fila del extracto es un ítem de una suscripción cancelada
+fact = cancellation_fact(df['subscription_id'], created_at=df['createdAt'], shades=shade_flags(df['itemId'], productos))
+cubo = cancellation_cube(fact, ['fecha'])
 
-# Convertir la columna createdAt a tipo datetime
-df['createdAt'] = pd.to_datetime(df['createdAt'])
-
-# Extraer la fecha (sin la hora)
-df['fecha'] = df['createdAt'].dt.date
-
-# Agrupar por fecha y producto, y contar las cancelaciones
-cancelaciones_por_dia = df.groupby(['fecha', 'producto']).size().unstack(fill_value=0)
+# Cancelaciones por fecha y producto (solo los productos con cancelaciones)
+cancelaciones_por_dia = shade_counts(cubo, productos, 'fecha')
 
 # Resetear el índice para que la fecha sea una columna
 cancelaciones_por_dia = cancelaciones_por_dia.reset_index()
@@ -102,17 +99,12 @@ porcentajes_historicos['date'] = 'Porcentaje Histórico'
 # Concatenar la fila de porcentajes históricos al DataFrame
 cancelaciones_por_dia = pd.concat([cancelaciones_por_dia, porcentajes_historicos], ignore_index=True)
 
-# Crear una nueva columna para el año y el mes
-df['año_mes'] = df['createdAt'].dt.to_period('M')
-
-# Agrupar por año, mes y producto, y contar las cancelaciones
-cancelaciones_por_mes = df.groupby(['año_mes', 'producto']).size().unstack(fill_value=0)
-
-# Resetear el índice para que el año y el mes sean columnas
-cancelaciones_por_mes = cancelaciones_por_mes.reset_index()
+# Agregar el cubo diario por año y mes
+año_mes = pd.to_datetime(cubo.index).to_period('M')
+cancelaciones_por_mes = shade_counts(cubo, productos, año_mes)
 
-# Renombrar la columna de año y mes a "date"
-cancelaciones_por_mes = cancelaciones_por_mes.rename(columns={'año_mes': 'date'})
+# Resetear el índice para que el año y el mes sean columnas, con el nombre "date"
+cancelaciones_por_mes = cancelaciones_por_mes.rename_axis('date').reset_index()
 
 # Crear un archivo Excel con todas las hojas
 with pd.ExcelWriter("colorCancelations.xlsx", engine='xlsxwriter') as writer:
@@ -163,7 +155,7 @@ with pd.ExcelWriter("colorCancelations.xlsx", engine='xlsxwriter') as writer:
         grupo_porcentajes['date'] = grupo_porcentajes['date'].dt.strftime('%B')  # Convertir a nombre del mes
 
         # Calcular los porcentajes (dividir entre el total mensual)
-        grupo_porcentajes.iloc[:, 1:] = (grupo_porcentajes.iloc[:, 1:].div(grupo_porcentajes.iloc[:, 1:].sum(axis=1), axis=0))
+        grupo_porcentajes[grupo_porcentajes.columns[1:]] = grupo.iloc[:, 1:].div(grupo.iloc[:, 1:].sum(axis=1), axis=0)
 
         # Calcular los porcentajes totales (dividir entre el total general)
         totales_generales = grupo.iloc[:, 1:].sum()  # Totales generales por producto
@@ -3,6 +3,7 @@ import json
 from datetime import datetime, timedelta
 
 from modules.database_queries import execute_query
+from modules.order_snapshot import get_order_snapshot
 from modules.excel_creator import save_dataframe_to_excel
 
 def get_expected_renewals(start_date, end_date, folder_name):
@@ -58,16 +59,9 @@ def get_expected_renewals(start_date, end_date, folder_name):
     # Renombrar columnas para claridad
     expected_renewals.rename(columns={'expected_renewal': 'date'}, inplace=True)
 
-    # Consulta SQL para obtener los datos de fact_orders
-    query_orders = f"""
-    SELECT created_at, order_plan, recurrent, units
-    FROM bi.fact_orders
-    WHERE created_at >= '{start_date} 00:00:00'
-      AND created_at < '{end_date} 00:00:00';
-    """
-
-    # Ejecutar la consulta
-    fact_orders = execute_query(query_orders)
+    # Órdenes del periodo desde la foto compartida de fact_orders
+    snapshot = get_order_snapshot(start_date, end_date)
+    fact_orders = snapshot.orders[snapshot.between()]
 
     # Asegurar que los datos están en un DataFrame
     fact_orders = pd.DataFrame(fact_orders, columns=['created_at', 'order_plan', 'recurrent', 'units'])
@@ -1,8 +1,13 @@
 
+import os
+import sys
+import json
 import pandas as pd
+import numpy as np
 from pandas.api.types import is_datetime64_any_dtype
 from openpyxl import load_workbook
 from modules.database_queries import execute_query
+from modules.query_cache import ONE_DAY
 
 
 fc_query = """
@@ -96,25 +101,27 @@ def _validate_required_columns(df: pd.DataFrame, required_cols: list[str], conte
         raise ValueError(f"{prefix}faltan columnas requeridas: {missing}")
 
 
-def _prepare_date_parts(df: pd.DataFrame, date_column: str) -> pd.DataFrame:
-    data = df.copy()
-
-    _validate_required_columns(data, [date_column], context="_prepare_date_parts")
-
-    if not is_datetime64_any_dtype(data[date_column]):
-        data[date_column] = _normalize_date_column(data, date_column)
+_FILTER_OPERATORS = {
+    "eq": lambda s, value: s == value,
+    "ne": lambda s, value: s != value,
+    "gt": lambda s, value: s > value,
+    "gte": lambda s, value: s >= value,
+    "lt": lambda s, value: s < value,
+    "lte": lambda s, value: s <= value,
+}
 
-    data = data[data[date_column].notna()].copy()
-    data["year"] = data[date_column].dt.year
-    data["month_number"] = data[date_column].dt.month
-    data["month"] = data["month_number"].map(MONTH_MAP)
 
-    return data
+def _comparable_series(series: pd.Series) -> pd.Series:
+    """
+    Versión numérica de la columna si tiene algún valor numérico; si no, la original.
+    """
+    numeric_series = pd.to_numeric(series, errors="coerce")
+    return numeric_series if numeric_series.notna().any() else series
 
 
-def _apply_single_filter(series: pd.Series, condition) -> pd.Series:
+def _compile_filter(condition) -> tuple[str, object]:
     """
-    Devuelve una máscara booleana.
+    Valida una condición de filtro y la reduce a (op, valor).
 
     Soporta:
     - valor simple: 1
@@ -129,13 +136,27 @@ def _apply_single_filter(series: pd.Series, condition) -> pd.Series:
     - {"op": "lte", "value": x}
     """
     if not isinstance(condition, dict):
-        numeric_series = pd.to_numeric(series, errors="coerce")
-        if numeric_series.notna().any():
-            return numeric_series == condition
-        return series == condition
+        return "eq", condition
 
     op = condition.get("op")
 
+    if op in ("notna", "isna"):
+        return op, None
+
+    if op == "in":
+        return op, list(condition.get("values", []))
+
+    if op in _FILTER_OPERATORS:
+        return op, condition.get("value")
+
+    raise ValueError(f"Operador de filtro no soportado: {op}")
+
+
+def _evaluate_filter(series: pd.Series, op: str, value, comparable=None) -> pd.Series:
+    """
+    Evalúa una condición ya compilada. `comparable` es la columna ya convertida con
+    _comparable_series; si no se pasa, se calcula aquí.
+    """
     if op == "notna":
         return series.notna()
 
@@ -143,59 +164,145 @@ def _apply_single_filter(series: pd.Series, condition) -> pd.Series:
         return series.isna()
 
     if op == "in":
-        return series.isin(condition.get("values", []))
+        return series.isin(value)
 
-    value = condition.get("value")
-    numeric_series = pd.to_numeric(series, errors="coerce")
-    s = numeric_series if numeric_series.notna().any() else series
-
-    if op == "eq":
-        return s == value
-    if op == "ne":
-        return s != value
-    if op == "gt":
-        return s > value
-    if op == "gte":
-        return s >= value
-    if op == "lt":
-        return s < value
-    if op == "lte":
-        return s <= value
+    if comparable is None:
+        comparable = _comparable_series(series)
 
-    raise ValueError(f"Operador de filtro no soportado: {op}")
+    return _FILTER_OPERATORS[op](comparable, value)
 
 
-def _apply_filters(df: pd.DataFrame, filters: dict | None = None) -> pd.DataFrame:
-    data = df.copy()
+def _apply_single_filter(series: pd.Series, condition) -> pd.Series:
+    """
+    Devuelve una máscara booleana para una condición (ver _compile_filter).
+    """
+    op, value = _compile_filter(condition)
+    return _evaluate_filter(series, op, value)
+
+
+def _freeze(value):
+    """Convierte una condición de filtro en algo hasheable para usarla como clave de caché."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _CompiledFrame:
+    """
+    Envoltorio de solo lectura sobre el DataFrame preparado.
+
+    Calcula una sola vez por columna de fecha sus partes (year, month_number, month) y
+    una sola vez cada filtro, y los reutiliza entre todas las métricas. Nunca copia el
+    DataFrame completo: cada métrica solo materializa las filas y columnas que agrega.
+
+    Los filtros se compilan y se guardan en tres niveles: la conversión numérica de cada
+    columna, la máscara de cada condición y la máscara combinada de cada conjunto de
+    filtros, identificados por su firma.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._date_parts: dict[str, tuple[np.ndarray, pd.DataFrame]] = {}
+        self._comparable: dict[str, pd.Series] = {}
+        self._filter_masks: dict[tuple, np.ndarray] = {}
+        self._combined_masks: dict[tuple, np.ndarray] = {}
+
+    def date_parts(self, date_column: str) -> tuple[np.ndarray, pd.DataFrame]:
+        """
+        Devuelve (posiciones con fecha válida, partes de fecha de esas filas).
+        """
+        if date_column not in self._date_parts:
+            _validate_required_columns(self.df, [date_column], context="_CompiledFrame.date_parts")
+
+            dates = self.df[date_column]
+            if not is_datetime64_any_dtype(dates):
+                dates = _normalize_date_column(self.df, date_column)
+
+            valid = dates.notna().to_numpy()
+            valid_dates = dates[valid]
+            parts = pd.DataFrame({
+                "year": valid_dates.dt.year.to_numpy(),
+                "month_number": valid_dates.dt.month.to_numpy(),
+            })
+            parts["month"] = parts["month_number"].map(MONTH_MAP)
+
+            self._date_parts[date_column] = (np.flatnonzero(valid), parts)
+
+        return self._date_parts[date_column]
+
+    def comparable(self, col: str) -> pd.Series:
+        """
+        Columna convertida para comparaciones (ver _comparable_series), una vez por columna.
+        """
+        if col not in self._comparable:
+            self._comparable[col] = _comparable_series(self.df[col])
+        return self._comparable[col]
+
+    def condition_mask(self, col: str, condition) -> np.ndarray:
+        """
+        Máscara de una condición sobre una columna, evaluada una sola vez.
+        """
+        key = (col, _freeze(condition))
+
+        if key not in self._filter_masks:
+            op, value = _compile_filter(condition)
+            comparable = self.comparable(col) if op in _FILTER_OPERATORS else None
+            mask = _evaluate_filter(self.df[col], op, value, comparable)
+            self._filter_masks[key] = mask.fillna(False).to_numpy(dtype=bool)
+
+        return self._filter_masks[key]
+
+    def filter_mask(self, filters: dict | None = None) -> np.ndarray:
+        """
+        Máscara booleana con todos los filtros combinados (AND), memorizada por firma.
+        """
+        signature = _freeze(filters or {})
+
+        if signature not in self._combined_masks:
+            mask = np.ones(len(self.df), dtype=bool)
+            for col, condition in (filters or {}).items():
+                mask &= self.condition_mask(col, condition)
+            self._combined_masks[signature] = mask
+
+        return self._combined_masks[signature]
+
+    def select(self, date_column: str, filters: dict | None, columns: list[str]) -> pd.DataFrame:
+        """
+        Filas con fecha válida que cumplen los filtros, con sus partes de fecha y `columns`.
+        """
+        positions, parts = self.date_parts(date_column)
+        keep = self.filter_mask(filters)[positions]
+
+        data = parts[keep].reset_index(drop=True)
+        for col in columns:
+            data[col] = self.df[col].iloc[positions[keep]].array
 
-    if not filters:
         return data
 
-    for col, condition in filters.items():
-        mask = _apply_single_filter(data[col], condition)
-        data = data[mask].copy()
 
-    return data
+def _compiled(df) -> _CompiledFrame:
+    return df if isinstance(df, _CompiledFrame) else _CompiledFrame(df)
 
 
 def _build_monthly_count_table(
-    df: pd.DataFrame,
+    df: pd.DataFrame | _CompiledFrame,
     date_column: str,
     value_column: str,
     output_column_name: str,
     filters: dict | None = None,
 ) -> pd.DataFrame:
-    data = df.copy()
+    frame = _compiled(df)
 
     required_cols = [date_column, value_column]
     if filters:
         required_cols.extend(filters.keys())
 
-    _validate_required_columns(data, required_cols, context="_build_monthly_count_table")
+    _validate_required_columns(frame.df, required_cols, context="_build_monthly_count_table")
 
-    data = _prepare_date_parts(data, date_column)
-    data = _apply_filters(data, filters)
-    data = data[data[value_column].notna()].copy()
+    data = frame.select(date_column, filters, [value_column])
+    data = data[data[value_column].notna()]
 
     result = (
         data.groupby(["year", "month_number", "month"], as_index=False)
@@ -208,30 +315,28 @@ def _build_monthly_count_table(
 
 
 def _build_monthly_status_table(
-    df: pd.DataFrame,
+    df: pd.DataFrame | _CompiledFrame,
     date_column: str,
     value_column: str,
     status_column: str,
     statuses: list[str],
     filters: dict | None = None,
 ) -> pd.DataFrame:
-    data = df.copy()
+    frame = _compiled(df)
 
     required_cols = [date_column, value_column, status_column]
     if filters:
         required_cols.extend(filters.keys())
 
-    _validate_required_columns(data, required_cols, context="_build_monthly_status_table")
+    _validate_required_columns(frame.df, required_cols, context="_build_monthly_status_table")
 
-    data = _prepare_date_parts(data, date_column)
-    data = _apply_filters(data, filters)
+    data = frame.select(date_column, filters, [value_column, status_column])
 
     data = data[
         data[value_column].notna() &
-        data[status_column].notna()
-    ].copy()
-
-    data = data[data[status_column].isin(statuses)].copy()
+        data[status_column].notna() &
+        data[status_column].isin(statuses)
+    ]
 
     result = (
         data.pivot_table(
@@ -297,152 +402,162 @@ def add_calculated_columns(df: pd.DataFrame) -> pd.DataFrame:
     return data
 
 
-# Customers that joined the program (enrollment date), does not matter how (email or cancelation flow)
+# Especificación declarativa de cada tabla del tracker. Las que tienen `status_column`
+# se pivotean por status (ver _build_monthly_status_table); el resto son conteos.
+FULL_CONTROL_METRICS = {
+    # Customers that joined the program (enrollment date), does not matter how (email or cancelation flow)
+    "customers_joined_program": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {"Unique Subscription Flag": 1},
+    },
+    # Customers that joined + bought same day EMAIL
+    "reactivation_renewals": {
+        "date_column": "renewal_date",
+        "value_column": "Is Reactivation Renewal",
+        "output_column_name": "count_is_reactivation_renewal",
+        "filters": {"Is Reactivation Renewal": 1},
+    },
+    # Customers that joined + bought same day EMAIL more than once
+    "enrolled_bought_same_day_and_bought_more_than_once": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": 2,
+            "Reactiv renewal 1": {"op": "notna"},
+        },
+    },
+    # Customers that joined + bought later on (different date vs. join)
+    "first_renewal_not_reactivation": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": 1,
+            "Is Reactivation Renewal": 0,
+        },
+    },
+    # Customers joined that never bought
+    "no_renewals_yet": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": 0,
+        },
+    },
+    # active (cohort) (active + processing)
+    "unique_subscriptions_active_processing": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "status_column": "subscription_status",
+        "statuses": ["ACTIVE", "PROCESSING"],
+        "filters": {
+            "Unique Subscription Flag": 1,
+        },
+    },
+    # active (cohort) (active + processing + on hold)
+    "unique_subscriptions_active_processing_onhold": {
+        "date_column": "full_control_starting_date",
+        "value_column": "subscription_id",
+        "status_column": "subscription_status",
+        "statuses": ["ACTIVE", "PROCESSING", "ON_HOLD"],
+        "filters": {
+            "Unique Subscription Flag": 1,
+        },
+    },
+    # Program Renewals (includes offer 1)
+    "all_renewals_after_enrollment": {
+        "date_column": "renewal_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": {"op": "ne", "value": 0},
+        },
+    },
+    # Renewals that correspond to customers that joined FC and had at least 2 renewals since then
+    "second_renewal": {
+        "date_column": "renewal_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": 2,
+        },
+    },
+    # Renewals 2+
+    "second_or_more_renewals": {
+        "date_column": "renewal_date",
+        "value_column": "subscription_id",
+        "output_column_name": "count_subscription_id",
+        "filters": {
+            "renewal_number": {"op": "gt", "value": 1},
+        },
+    },
+}
+
+
+def build_metric_table(df: pd.DataFrame | _CompiledFrame, metric_name: str) -> pd.DataFrame:
+    """
+    Genera la tabla mensual de una métrica de FULL_CONTROL_METRICS.
+    """
+    spec = FULL_CONTROL_METRICS[metric_name]
+
+    if "status_column" in spec:
+        return _build_monthly_status_table(df, **spec)
+    return _build_monthly_count_table(df, **spec)
+
+
 def customers_joined_program(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={"Unique Subscription Flag": 1},
-    )
+    return build_metric_table(df, "customers_joined_program")
 
 
-# Customers that joined + bought same day EMAIL
 def reactivation_renewals(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="renewal_date",
-        value_column="Is Reactivation Renewal",
-        output_column_name="count_is_reactivation_renewal",
-        filters={"Is Reactivation Renewal": 1},
-    )
+    return build_metric_table(df, "reactivation_renewals")
 
 
-# Customers that joined + bought same day EMAIL more than once
 def enrolled_bought_same_day_and_bought_more_than_once(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": 2,
-            "Reactiv renewal 1": {"op": "notna"},
-        },
-    )
+    return build_metric_table(df, "enrolled_bought_same_day_and_bought_more_than_once")
 
 
-# Customers that joined + bought later on (different date vs. join)
 def first_renewal_not_reactivation(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": 1,
-            "Is Reactivation Renewal": 0,
-        },
-    )
+    return build_metric_table(df, "first_renewal_not_reactivation")
 
 
-# Customers joined that never bought
 def no_renewals_yet(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": 0,
-        },
-    )
+    return build_metric_table(df, "no_renewals_yet")
 
 
-# active (cohort) (active + processing)
 def unique_subscriptions_active_processing(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_status_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        status_column="subscription_status",
-        statuses=["ACTIVE", "PROCESSING"],
-        filters={
-            "Unique Subscription Flag": 1,
-        },
-    )
+    return build_metric_table(df, "unique_subscriptions_active_processing")
 
 
-# active (cohort) (active + processing + on hold)
 def unique_subscriptions_active_processing_onhold(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_status_table(
-        df=df,
-        date_column="full_control_starting_date",
-        value_column="subscription_id",
-        status_column="subscription_status",
-        statuses=["ACTIVE", "PROCESSING", "ON_HOLD"],
-        filters={
-            "Unique Subscription Flag": 1,
-        },
-    )
+    return build_metric_table(df, "unique_subscriptions_active_processing_onhold")
 
 
-# Program Renewals (includes offer 1)
 def all_renewals_after_enrollment(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="renewal_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": {"op": "ne", "value": 0},
-        },
-    )
+    return build_metric_table(df, "all_renewals_after_enrollment")
 
 
-# Renewals that correspond to customers that joined FC and had at least 2 renewals since then
 def second_renewal(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="renewal_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": 2,
-        },
-    )
+    return build_metric_table(df, "second_renewal")
 
 
-# Renewals 2+
 def second_or_more_renewals(df: pd.DataFrame) -> pd.DataFrame:
-    return _build_monthly_count_table(
-        df=df,
-        date_column="renewal_date",
-        value_column="subscription_id",
-        output_column_name="count_subscription_id",
-        filters={
-            "renewal_number": {"op": "gt", "value": 1},
-        },
-    )
+    return build_metric_table(df, "second_or_more_renewals")
 
 
 def build_full_control_tables(prepared_df: pd.DataFrame) -> dict[str, pd.DataFrame]:
     """
     Genera todas las tablas necesarias para llenar el tracker.
+
+    Las partes de fecha y las máscaras de filtro se calculan una sola vez sobre
+    `prepared_df` y se comparten entre las 10 métricas.
     """
-    return {
-        "customers_joined_program": customers_joined_program(prepared_df),
-        "reactivation_renewals": reactivation_renewals(prepared_df),
-        "enrolled_bought_same_day_and_bought_more_than_once": enrolled_bought_same_day_and_bought_more_than_once(prepared_df),
-        "first_renewal_not_reactivation": first_renewal_not_reactivation(prepared_df),
-        "no_renewals_yet": no_renewals_yet(prepared_df),
-        "unique_subscriptions_active_processing": unique_subscriptions_active_processing(prepared_df),
-        "unique_subscriptions_active_processing_onhold": unique_subscriptions_active_processing_onhold(prepared_df),
-        "all_renewals_after_enrollment": all_renewals_after_enrollment(prepared_df),
-        "second_renewal": second_renewal(prepared_df),
-        "second_or_more_renewals": second_or_more_renewals(prepared_df),
-    }
+    frame = _CompiledFrame(prepared_df)
+    return {name: build_metric_table(frame, name) for name in FULL_CONTROL_METRICS}
 
 
 def _normalize_month_header_value(value) -> pd.Timestamp:
@@ -495,30 +610,111 @@ def _get_table_value_column(table_df: pd.DataFrame) -> str:
     return value_cols[0]
 
 
-def _table_to_month_value_map(table_df: pd.DataFrame) -> dict[tuple[int, int], float]:
+def _table_to_month_values(table_df: pd.DataFrame) -> pd.Series:
     """
-    Convierte una tabla mensual a un diccionario:
-    {(year, month): value}
+    Convierte una tabla mensual a una Series indexada por (year, month) con el valor a
+    escribir. Si un mes aparece repetido se queda el último, como antes con el dict.
     """
-    data = table_df.copy()
-    value_col = _get_table_value_column(data)
+    value_col = _get_table_value_column(table_df)
 
     _validate_required_columns(
-        data,
+        table_df,
         ["year", "month_number", value_col],
-        context="_table_to_month_value_map"
+        context="_table_to_month_values"
     )
 
-    data["year"] = pd.to_numeric(data["year"], errors="coerce").astype("Int64")
-    data["month_number"] = pd.to_numeric(data["month_number"], errors="coerce").astype("Int64")
-    data[value_col] = pd.to_numeric(data[value_col], errors="coerce").fillna(0)
+    index = pd.MultiIndex.from_arrays(
+        [
+            pd.to_numeric(table_df["year"], errors="coerce").to_numpy(),
+            pd.to_numeric(table_df["month_number"], errors="coerce").to_numpy(),
+        ],
+        names=["year", "month"],
+    )
+    values = pd.to_numeric(table_df[value_col], errors="coerce").fillna(0).astype(float)
+    values = pd.Series(values.to_numpy(), index=index)
 
-    month_value_map = {}
-    for _, row in data.iterrows():
-        key = (int(row["year"]), int(row["month_number"]))
-        month_value_map[key] = float(row[value_col])
+    return values[~values.index.duplicated(keep="last")]
 
-    return month_value_map
+
+def _build_tracker_matrix(
+    tables: dict[str, pd.DataFrame],
+    row_mapping: dict[str, int],
+    template_months: list[tuple[int, int, int]],
+) -> pd.DataFrame:
+    """
+    Matriz métrica × mes lista para escribir: índice = fila del template,
+    columnas = columna del template. Los meses sin dato quedan en 0.
+    """
+    month_keys = pd.MultiIndex.from_tuples([(year, month) for _, year, month in template_months])
+    month_cols = [col_idx for col_idx, _, _ in template_months]
+
+    rows = {
+        row_idx: _table_to_month_values(tables[table_name]).reindex(month_keys).fillna(0).to_numpy()
+        for table_name, row_idx in row_mapping.items()
+    }
+
+    return pd.DataFrame.from_dict(rows, orient="index", columns=month_cols)
+
+
+def _write_tracker_matrix(ws, matrix: pd.DataFrame) -> None:
+    """
+    Escribe cada fila de la matriz como un bloque contiguo de celdas del template.
+    """
+    first_col = int(matrix.columns.min())
+    last_col = int(matrix.columns.max())
+    matrix = matrix.reindex(columns=range(first_col, last_col + 1))
+
+    for row_idx, values in zip(matrix.index, matrix.to_numpy()):
+        row_cells = next(ws.iter_rows(min_row=row_idx, max_row=row_idx, min_col=first_col, max_col=last_col))
+        for cell, value in zip(row_cells, values):
+            if not np.isnan(value):
+                cell.value = float(value)
+
+
+def fill_tracker_sheets(
+    template_path: str,
+    output_path: str,
+    sheets: dict[str, tuple[dict[str, pd.DataFrame], dict[str, int]]],
+) -> str:
+    """
+    Llena varias hojas de tracker del mismo template con una sola apertura y un solo guardado.
+
+    `sheets` = {nombre de hoja: (tablas, {nombre de tabla: fila del template})}. Cada hoja
+    lee sus propios meses de la fila de headers.
+    """
+    wb = load_workbook(template_path)
+
+    for sheet_name, (tables, row_mapping) in sheets.items():
+        ws = wb[sheet_name]
+        template_months = _get_template_months(ws)
+        _write_tracker_matrix(ws, _build_tracker_matrix(tables, row_mapping, template_months))
+
+    # Forzar recálculo de fórmulas al abrir en Excel
+    wb.calculation.fullCalcOnLoad = True
+    wb.calculation.forceFullCalc = True
+
+    wb.save(output_path)
+    return output_path
+
+
+# Row mapping basado en los labels reales del template
+#
+# Importante:
+# - En el template recibido, la fila de 'active + processing + on hold' es la 26
+#   (la 25 es porcentaje)
+# - En el template recibido, la fila 42 es 'second_renewal' y la 43 es 'second_or_more_renewals'
+FULL_CONTROL_ROW_MAPPING = {
+    "customers_joined_program": 4,
+    "reactivation_renewals": 15,
+    "enrolled_bought_same_day_and_bought_more_than_once": 16,
+    "first_renewal_not_reactivation": 20,
+    "no_renewals_yet": 21,
+    "unique_subscriptions_active_processing": 24,
+    "unique_subscriptions_active_processing_onhold": 26,
+    "all_renewals_after_enrollment": 40,
+    "second_renewal": 42,
+    "second_or_more_renewals": 43,
+}
 
 
 def fill_full_control_tracker(
@@ -533,54 +729,262 @@ def fill_full_control_tracker(
     Meses:
     - Lee automáticamente los headers de B:Z en la fila 2
     - Si un mes no existe en la tabla, escribe 0
-
-    Importante:
-    - En el template recibido, la fila de 'active + processing + on hold' es la 26
-      (la 25 es porcentaje)
-    - En el template recibido, la fila 42 es 'second_renewal' y la 43 es 'second_or_more_renewals'
     """
     tables = build_full_control_tables(prepared_df)
 
-    wb = load_workbook(template_path)
-    ws = wb[sheet_name]
-
-    # Leer meses del template
-    template_months = _get_template_months(ws)
-
-    # Row mapping basado en los labels reales del template
-    row_mapping = {
-        "customers_joined_program": 4,
-        "reactivation_renewals": 15,
-        "enrolled_bought_same_day_and_bought_more_than_once": 16,
-        "first_renewal_not_reactivation": 20,
-        "no_renewals_yet": 21,
-        "unique_subscriptions_active_processing": 24,
-        "unique_subscriptions_active_processing_onhold": 26,   
-        "all_renewals_after_enrollment": 40,
-        "second_renewal": 42,                                  
-        "second_or_more_renewals": 43,                        
-    }
+    return fill_tracker_sheets(
+        template_path,
+        output_path,
+        {sheet_name: (tables, FULL_CONTROL_ROW_MAPPING)},
+    )
 
-    for table_name, row_idx in row_mapping.items():
-        month_value_map = _table_to_month_value_map(tables[table_name])
 
-        for col_idx, year, month in template_months:
-            value = month_value_map.get((year, month), 0)
-            ws.cell(row=row_idx, column=col_idx).value = float(value)
+# ---------------------------------------------------------------------------
+# Dataset FC incremental
+# ---------------------------------------------------------------------------
+# En lugar de ejecutar fc_query sobre todo el histórico, se guarda en Parquet una copia
+# local de sus dos fuentes (versiones de enrollment y renewals SUCCESS de suscripciones
+# FC) y del dataset final. En cada corrida solo se piden a la base de datos los cambios
+# posteriores al watermark y se recalculan las filas de las suscripciones afectadas.
+
+FC_SNAPSHOT_DIR = os.getenv("FC_SNAPSHOT_DIR", ".fc_snapshot")
+FC_START = "2023-01-01 08:00:00"
+FC_TIMEZONE = "America/Los_Angeles"
+
+# Margen hacia atrás del watermark, para no perder filas que se confirman tarde
+FC_WATERMARK_OVERLAP = pd.Timedelta(days=1)
+
+FC_COLUMNS = [
+    "full_control_starting_date",
+    "renewal_date",
+    "full_control_ending_date",
+    "subscription_id",
+    "renewal_number",
+    "full_control_active",
+    "subscription_status",
+]
+
+# Suscripciones FC cuya versión de enrollment o cuya suscripción cambió desde el watermark
+_fc_changed_subscriptions = """
+    SELECT v2.subscription_id
+    FROM prod_sales_and_subscriptions.first_sms_renewal_versions v2
+    JOIN prod_sales_and_subscriptions.subscriptions s2
+        ON s2.id = v2.subscription_id
+    WHERE v2.first_date_sms_renewal_true >= %s
+        OR v2.last_date_sms_renewal_true >= %s
+        OR s2.updatedAt >= %s
+"""
 
-    # Forzar recálculo de fórmulas al abrir en Excel
-    wb.calculation.fullCalcOnLoad = True
-    wb.calculation.forceFullCalc = True
+fc_versions_query = f"""
+SELECT
+    v.subscription_id,
+    v.first_date_sms_renewal_true,
+    v.last_date_sms_renewal_true,
+    s.additionalFields->>"$.sms_renewal" AS full_control_active,
+    s.status AS subscription_status,
+    s.updatedAt AS subscription_updated_at
+FROM prod_sales_and_subscriptions.first_sms_renewal_versions v
+JOIN prod_sales_and_subscriptions.subscriptions s
+    ON s.id = v.subscription_id
+WHERE
+    v.first_date_sms_renewal_true > '{FC_START}'
+"""
 
-    wb.save(output_path)
-    return output_path
+fc_renewals_query = f"""
+SELECT
+    r.id AS renewal_id,
+    r.subscriptionId AS subscription_id,
+    r.createdAt AS renewal_createdAt
+FROM prod_sales_and_subscriptions.renewals r
+WHERE r.status = 'SUCCESS'
+    AND r.subscriptionId IN (
+        SELECT v.subscription_id
+        FROM prod_sales_and_subscriptions.first_sms_renewal_versions v
+        WHERE v.first_date_sms_renewal_true > '{FC_START}'
+    )
+"""
+
+
+def _to_fc_date(series: pd.Series) -> pd.Series:
+    """
+    Equivalente a DATE(CONVERT_TZ(x, 'UTC', 'America/Los_Angeles')).
+    """
+    series = pd.to_datetime(series)
+    return series.dt.tz_localize("UTC").dt.tz_convert(FC_TIMEZONE).dt.tz_localize(None).dt.normalize()
+
+
+def _build_fc_rows(versions: pd.DataFrame, renewals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reproduce fc_query en pandas para las versiones y renewals recibidos.
+
+    Cada versión se une con los renewals de su suscripción entre el primer y el último
+    día del enrollment (LEFT JOIN: sin renewals queda una fila vacía). renewal_number
+    numera las filas de la suscripción por fecha de renewal, igual que el ROW_NUMBER de
+    fc_query (las filas sin renewal van primero y quedan con 0).
+    """
+    versions = versions.reset_index(drop=True)
+    versions["_version"] = np.arange(len(versions))
+
+    data = versions.merge(renewals[["subscription_id", "renewal_createdAt"]], on="subscription_id", how="inner")
+    renewal_day = data["renewal_createdAt"].dt.normalize()
+    last_day = data["last_date_sms_renewal_true"].dt.normalize()
+    data = data[
+        (renewal_day >= data["first_date_sms_renewal_true"].dt.normalize())
+        & (last_day.isna() | (renewal_day <= last_day))
+    ]
+
+    sin_renewals = versions[~versions["_version"].isin(data["_version"])].assign(renewal_createdAt=pd.NaT)
+    data = pd.concat([data, sin_renewals], ignore_index=True)
+    data["renewal_createdAt"] = pd.to_datetime(data["renewal_createdAt"])
+
+    data = data.sort_values(["subscription_id", "renewal_createdAt"], na_position="first", kind="stable")
+    row_number = data.groupby("subscription_id").cumcount() + 1
+
+    return pd.DataFrame({
+        "full_control_starting_date": _to_fc_date(data["first_date_sms_renewal_true"]),
+        "renewal_date": _to_fc_date(data["renewal_createdAt"]),
+        "full_control_ending_date": _to_fc_date(data["last_date_sms_renewal_true"]),
+        "subscription_id": data["subscription_id"],
+        "renewal_number": row_number.where(data["renewal_createdAt"].notna(), 0),
+        "full_control_active": data["full_control_active"],
+        "subscription_status": data["subscription_status"],
+    }).reset_index(drop=True)
+
+
+def _fc_snapshot_path(name: str) -> str:
+    return os.path.join(FC_SNAPSHOT_DIR, name)
+
+
+def _read_fc_snapshot() -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.Timestamp] | None:
+    try:
+        with open(_fc_snapshot_path("watermark.json"), "r", encoding="utf-8") as f:
+            watermark = pd.Timestamp(json.load(f)["watermark"])
+        versions = pd.read_parquet(_fc_snapshot_path("versions.parquet"))
+        renewals = pd.read_parquet(_fc_snapshot_path("renewals.parquet"))
+        dataset = pd.read_parquet(_fc_snapshot_path("fc_dataset.parquet"))
+    except (FileNotFoundError, KeyError, json.JSONDecodeError):
+        return None
+
+    return versions, renewals, dataset, watermark
+
+
+def _write_fc_snapshot(versions: pd.DataFrame, renewals: pd.DataFrame, dataset: pd.DataFrame, watermark: pd.Timestamp) -> None:
+    os.makedirs(FC_SNAPSHOT_DIR, exist_ok=True)
+    versions.to_parquet(_fc_snapshot_path("versions.parquet"), index=False)
+    renewals.to_parquet(_fc_snapshot_path("renewals.parquet"), index=False)
+    dataset.to_parquet(_fc_snapshot_path("fc_dataset.parquet"), index=False)
+
+    # El watermark se escribe al final: si algo falla antes, la próxima corrida repite el delta
+    tmp = _fc_snapshot_path("watermark.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"watermark": watermark.isoformat()}, f)
+    os.replace(tmp, _fc_snapshot_path("watermark.json"))
+
+
+def _fetch_fc_sources(since: pd.Timestamp | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Sin `since` trae todo el histórico. Con `since` trae las versiones completas de las
+    suscripciones que cambiaron, todos los renewals de esas suscripciones y los renewals
+    creados desde `since`.
+    """
+    if since is None:
+        versions = execute_query(fc_versions_query)
+        renewals = execute_query(fc_renewals_query)
+    else:
+        since = since.strftime("%Y-%m-%d %H:%M:%S")
+        versions = execute_query(
+            fc_versions_query + f"    AND v.subscription_id IN ({_fc_changed_subscriptions})",
+            params=(since, since, since),
+        )
+        renewals = execute_query(
+            fc_renewals_query + f"    AND (r.createdAt >= %s OR r.subscriptionId IN ({_fc_changed_subscriptions}))",
+            params=(since, since, since, since),
+        )
+
+    for col in ["first_date_sms_renewal_true", "last_date_sms_renewal_true", "subscription_updated_at"]:
+        versions[col] = pd.to_datetime(versions[col])
+    renewals["renewal_createdAt"] = pd.to_datetime(renewals["renewal_createdAt"])
+
+    return versions, renewals
+
+
+def _fc_watermark(versions: pd.DataFrame, renewals: pd.DataFrame, previous: pd.Timestamp | None = None) -> pd.Timestamp:
+    candidates = [
+        versions["first_date_sms_renewal_true"].max(),
+        versions["last_date_sms_renewal_true"].max(),
+        versions["subscription_updated_at"].max(),
+        renewals["renewal_createdAt"].max(),
+        previous,
+    ]
+    candidates = [value for value in candidates if value is not None and not pd.isna(value)]
+    if not candidates:
+        return pd.Timestamp(FC_START)
+
+    # Una fecha futura en los datos no debe adelantar el watermark más allá de ahora (UTC)
+    return min(max(candidates), pd.Timestamp.now(tz="UTC").tz_localize(None))
+
+
+def load_fc_dataset(rebuild: bool = False) -> pd.DataFrame:
+    """
+    Devuelve el mismo dataset que fc_query, manteniéndolo de forma incremental.
+
+    - Primera corrida (o `rebuild=True`): descarga las fuentes completas y crea la copia local
+    - Siguientes corridas: descarga solo lo posterior al watermark (menos FC_WATERMARK_OVERLAP),
+      reemplaza las versiones y renewals de las suscripciones afectadas y recalcula solo sus filas
+
+    Los renewals que dejan de estar en SUCCESS sin que cambie su suscripción no se detectan
+    en modo incremental; una reconstrucción periódica (`python fcReport.py --rebuild`) los corrige.
+    """
+    snapshot = None if rebuild else _read_fc_snapshot()
+
+    if snapshot is None:
+        versions, renewals = _fetch_fc_sources()
+        dataset = _build_fc_rows(versions, renewals)
+        _write_fc_snapshot(versions, renewals, dataset, _fc_watermark(versions, renewals))
+        print(f"Dataset FC reconstruido: {len(dataset)} filas")
+        return dataset
+
+    versions, renewals, dataset, watermark = snapshot
+    new_versions, new_renewals = _fetch_fc_sources(since=watermark - FC_WATERMARK_OVERLAP)
+
+    # Las suscripciones con versiones nuevas se reemplazan completas (versiones y renewals)
+    changed = set(new_versions["subscription_id"])
+    affected = changed | set(new_renewals["subscription_id"])
+
+    versions = pd.concat(
+        [versions[~versions["subscription_id"].isin(changed)], new_versions],
+        ignore_index=True,
+    )
+    renewals = pd.concat(
+        [renewals[~renewals["subscription_id"].isin(changed)], new_renewals],
+        ignore_index=True,
+    ).drop_duplicates("renewal_id", keep="last")
+
+    affected_rows = _build_fc_rows(
+        versions[versions["subscription_id"].isin(affected)],
+        renewals[renewals["subscription_id"].isin(affected)],
+    )
+    dataset = pd.concat(
+        [dataset[~dataset["subscription_id"].isin(affected)], affected_rows],
+        ignore_index=True,
+    )
+    # Las filas de cada suscripción ya vienen en orden de renewal; basta un orden estable por suscripción
+    dataset = dataset.sort_values("subscription_id", kind="stable").reset_index(drop=True)[FC_COLUMNS]
+
+    _write_fc_snapshot(versions, renewals, dataset, _fc_watermark(new_versions, new_renewals, watermark))
+    print(f"Dataset FC actualizado: {len(affected)} suscripciones recalculadas, {len(dataset)} filas")
+    return dataset
 
 
 if __name__ == "__main__":
     TEMPLATE_PATH = "Ecomm initiatives trackers.xlsx"
     OUTPUT_PATH = "Ecomm initiatives trackers - filled.xlsx"
 
-    raw_df = execute_query(fc_query)
+    # `--full-query` ejecuta fc_query sobre todo el histórico; `--rebuild` reconstruye la copia local
+    if "--full-query" in sys.argv:
+        raw_df = execute_query(fc_query, cache_ttl=ONE_DAY)
+    else:
+        raw_df = load_fc_dataset(rebuild="--rebuild" in sys.argv)
     prepared_df = add_calculated_columns(raw_df)
 
     # Tablas individuales (opcional)
@@ -10,22 +10,13 @@ from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
 from modules.database_queries import execute_query
+from modules.order_snapshot import get_order_snapshot, not_equal
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_dataframe_to_excel_orders
 from report import anotar_datos_excel
 
 def hear(start_date, end_date):
 
-    query_total_orders_new = f"""
-        SELECT distinct
-            fo.order_number, 
-            fo.created_at
-        FROM bi.fact_orders fo
-        where fo.status <> "CANCELLED"
-        and fo.created_at BETWEEN "{start_date}" AND "{end_date}"
-        and fo.is_first_order = 1;
-    """
-
     query_hear_answered = f"""
         SELECT * FROM prod_ecommerce.customer_acquisition_source c 
         WHERE c.createdAt > "{start_date}" AND c.createdAt < "{end_date}"
@@ -40,7 +31,14 @@ def hear(start_date, end_date):
     """
 
     ha = execute_query(query_hear_answered)
-    ton = execute_query(query_total_orders_new)
+    # Primeras órdenes no canceladas del periodo (BETWEEN: incluye end_date 00:00:00), sobre la foto compartida
+    snapshot = get_order_snapshot(start_date, end_date)
+    orders = snapshot.orders
+    ton = orders[
+        snapshot.between(end_inclusive=True)
+        & not_equal(orders['status'], 'CANCELLED')
+        & (orders['is_first_order'] == 1)
+    ].drop_duplicates(['order_number', 'created_at'])
     ho = execute_query(query_hear_options)
 
     total_orders_new = ton['order_number'].count()
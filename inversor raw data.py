@@ -2,6 +2,7 @@ import pandas as pd
 from pathlib import Path
 
 from modules.database_queries import execute_query
+from modules.diagnostic_fields import extract_diagnostic_fields, experience_with_color
 
 # =========================
 # CONFIG
@@ -25,7 +26,7 @@ MONTH_END = "2025-12-01"
 # QUERY
 # =========================
 query = f"""
-    SELECT c.id AS user_id,DATE(fs.first_sub_created_at) AS cohort,IFNULL(o.total_orders_up_today,0) AS total_orders_up_today,IFNULL(o.total_paid_up_today,0) AS total_paid_up_today,IFNULL(o.total_paid_up_today,0)-IFNULL(fs.first_sub_total_paid,0) AS repurchase_total_paid_up_today,(IFNULL(s.active_subs_count,0)>0) AS has_active_subscription,DATE(lo.last_order_created_at) AS last_order_date,DATE(lc.last_cancellation_created_at) AS last_cancellation_date,CASE WHEN exp.exp_code IN ('118','112') THEN 'Currently Dyed' WHEN exp.exp_code IN ('119','116') THEN 'I''ve colored' WHEN exp.exp_code IN ('120','114') THEN 'Never colored' ELSE NULL END AS experience_with_color
+    SELECT c.id AS user_id,DATE(fs.first_sub_created_at) AS cohort,IFNULL(o.total_orders_up_today,0) AS total_orders_up_today,IFNULL(o.total_paid_up_today,0) AS total_paid_up_today,IFNULL(o.total_paid_up_today,0)-IFNULL(fs.first_sub_total_paid,0) AS repurchase_total_paid_up_today,(IFNULL(s.active_subs_count,0)>0) AS has_active_subscription,DATE(lo.last_order_created_at) AS last_order_date,DATE(lc.last_cancellation_created_at) AS last_cancellation_date,IFNULL(s2.additionalFields->>"$.diagnostic",s3.additionalFields->>"$.diagnostic") AS diagnostic
     FROM prod_sales_and_subscriptions.customers c
     JOIN (SELECT t.customer_id AS user_id,t.first_sub_created_at,t.id,MAX(CASE WHEN t.created_at=t.first_sub_created_at THEN t.total ELSE 0 END) AS first_sub_total_paid FROM (SELECT fo.customer_id,fo.created_at,fo.total,fo.id,MIN(fo.created_at) OVER (PARTITION BY fo.customer_id) AS first_sub_created_at FROM bi.fact_orders fo WHERE fo.order_plan IN ('SUBSCRIPTION','MIXED') AND fo.status NOT IN ('CANCELLED','PAYMENT_ERROR')) t GROUP BY t.customer_id,t.first_sub_created_at) AS fs ON fs.user_id=c.id
     LEFT JOIN prod_sales_and_subscriptions.sales_order_items s2 ON s2.salesOrderId=fs.id AND s2.itemId LIKE "%0001004170%"
@@ -34,7 +35,6 @@ query = f"""
     LEFT JOIN (SELECT fo.customer_id AS user_id,MAX(fo.created_at) AS last_order_created_at FROM bi.fact_orders fo WHERE fo.status NOT IN ('CANCELLED','PAYMENT_ERROR') AND fo.order_plan='OTO' GROUP BY fo.customer_id) AS lo ON lo.user_id=c.id
     LEFT JOIN (SELECT s.customerId AS user_id,COUNT(*) AS active_subs_count FROM prod_sales_and_subscriptions.subscriptions s WHERE s.status<>'CANCELLED' GROUP BY s.customerId) AS s ON s.user_id=c.id
     LEFT JOIN (SELECT s.customerId AS user_id,MAX(fc.createdAt) AS last_cancellation_created_at FROM prod_sales_and_subscriptions.subscriptions s JOIN bi.fact_cancellations fc ON fc.subscriptionId=s.id GROUP BY s.customerId) AS lc ON lc.user_id=c.id
-    LEFT JOIN (SELECT d.user_id,COALESCE(d.v40_array,d.v40_obj,d.v36_array,d.v36_obj) AS exp_code FROM (SELECT fs2.user_id,(SELECT jt.val FROM JSON_TABLE(CAST(IFNULL(s2x.additionalFields->>"$.diagnostic",s3x.additionalFields->>"$.diagnostic") AS JSON),'$.values[*]' COLUMNS(var INT PATH '$.variable',val VARCHAR(255) PATH '$.value')) jt WHERE jt.var=40 LIMIT 1) AS v40_array,(SELECT jt.val FROM JSON_TABLE(CAST(IFNULL(s2x.additionalFields->>"$.diagnostic",s3x.additionalFields->>"$.diagnostic") AS JSON),'$.values.*' COLUMNS(var INT PATH '$.variable',val VARCHAR(255) PATH '$.value')) jt WHERE jt.var=40 LIMIT 1) AS v40_obj,(SELECT jt.val FROM JSON_TABLE(CAST(IFNULL(s2x.additionalFields->>"$.diagnostic",s3x.additionalFields->>"$.diagnostic") AS JSON),'$.values[*]' COLUMNS(var INT PATH '$.variable',val VARCHAR(255) PATH '$.value')) jt WHERE jt.var=36 LIMIT 1) AS v36_array,(SELECT jt.val FROM JSON_TABLE(CAST(IFNULL(s2x.additionalFields->>"$.diagnostic",s3x.additionalFields->>"$.diagnostic") AS JSON),'$.values.*' COLUMNS(var INT PATH '$.variable',val VARCHAR(255) PATH '$.value')) jt WHERE jt.var=36 LIMIT 1) AS v36_obj FROM (SELECT t.customer_id AS user_id,t.id FROM (SELECT fo.customer_id,fo.id,MIN(fo.created_at) OVER (PARTITION BY fo.customer_id) AS first_sub_created_at FROM bi.fact_orders fo WHERE fo.order_plan IN ('SUBSCRIPTION','MIXED') AND fo.status NOT IN ('CANCELLED','PAYMENT_ERROR')) t GROUP BY t.customer_id) fs2 LEFT JOIN prod_sales_and_subscriptions.sales_order_items s2x ON s2x.salesOrderId=fs2.id AND s2x.itemId LIKE "%0001004170%" LEFT JOIN prod_sales_and_subscriptions.sales_orders s3x ON s3x.id=fs2.id) d) AS exp ON exp.user_id=c.id
     WHERE DATE(fs.first_sub_created_at) BETWEEN '2021-01-01' AND '2026-01-01'
     ORDER BY cohort,user_id;
 """
@@ -42,6 +42,11 @@ query = f"""
 df = execute_query(query)
 df = df.drop_duplicates(subset=[COL_USER])
 
+# experience_with_color desde el diagnóstico de la primera suscripción (var 40; fallback var 36),
+# solo con las respuestas dentro de "values" como los JSON_TABLE anteriores
+diagnostic = extract_diagnostic_fields(df["diagnostic"], variables=(40, 36), wrapped_only=True)
+df[COL_EXPERIENCE] = experience_with_color(diagnostic, unknown=None)
+
 # =========================
 # VALIDATE + NORMALIZE
 # =========================
@@ -6,13 +6,15 @@ from exceptedRenewals import get_expected_renewals
 from fullContol import fullControl
 from ga4Funnels import get_funnel
 from howHearFromUs import hear
+from modules.database_queries import print_pool_stats
 from modules.date_selector import open_date_selector
+from modules.task_runner import TaskRunner
 from orders import get_orders
 from payments import get_payments
 from realRenewalFrecuency import realRenewalFrequency
 from refill import refill 
 from renewalsAndNoRecurrents import get_sales
-from report import anotar_datos_excel, seleccionar_donde_almacenar, seleccionar_tipo_de_reporte
+from report import ReportWriter, anotar_datos_excel, seleccionar_donde_almacenar, seleccionar_tipo_de_reporte
 from selectFiles import seleccionar_archivos_para_casos, seleccionar_archivos_stripe
 from subscriptions import subs
 from uploadCloud import upload_to_drive, upload_to_dropbox
@@ -25,6 +27,7 @@ folder_name = 'funnels'
 columna = 19
 dropbox_var = False
 drive_var = False
+reporte = None
 
 funnels_report, database_report, stripe_block_payments = seleccionar_tipo_de_reporte()
 
@@ -39,12 +42,50 @@ if database_report:
 
     dropbox_var, drive_var = seleccionar_donde_almacenar()
 
-    values, items, urls = get_orders(start_date, end_date, folder_name, unique_orders_var, dropbox_var, drive_var)
-
     date_obj = datetime.datetime.strptime(start_date, '%Y-%m-%d')
     month_number = date_obj.month
     actualMonth = calendar.month_name[month_number]
 
+    # Las consultas de cada sección son independientes: se lanzan en paralelo y
+    # solo la escritura en el Monthly Report se hace en serie, al final
+    runner = TaskRunner()
+    runner.add('orders', get_orders, start_date, end_date, folder_name, unique_orders_var, dropbox_var, drive_var)
+
+    if(sales_var == 1):
+        runner.add('sales', get_sales, start_date, end_date, folder_name, dropbox_var, drive_var)
+
+    if(payment_errors_var == 1):
+        runner.add('payments', get_payments, start_date, end_date, folder_name, dropbox_var, drive_var)
+
+    if(expected_renewals_var == 1):
+        runner.add('expected_renewals', get_expected_renewals, start_date, end_date, folder_name)
+
+    if(frequency_var == 1):
+        runner.add('frequency', realRenewalFrequency, start_date, end_date, folder_name)
+
+    if(full_control_var == 1):
+        runner.add('full_control', fullControl, start_date, end_date)
+
+    if(subs_var == 1):
+        runner.add('subs', subs, start_date, end_date)
+
+    if(refill_var == 1):
+        runner.add('refill', refill, start_date, end_date)
+
+    if(upsize_var == 1):
+        runner.add('upsize', upsize, start_date, end_date)
+
+    if(hear_var == 1):
+        runner.add('hear', hear, start_date, end_date)
+
+    results = runner.run()
+    runner.print_timings()
+
+    values, items, urls = results['orders']
+
+    # Todas las escrituras (incluidas las de los funnels) se acumulan y se guardan una sola vez
+    reporte = ReportWriter(actualMonth, primer_uso=True).activate()
+
     anotar_datos_excel(values, columna, 45+12, False, actualMonth, True)
     anotar_datos_excel(items, columna, 55+12, False, actualMonth)
 
@@ -53,27 +94,21 @@ if database_report:
         anotar_datos_excel(urls, columna, 55+12, True, actualMonth)
 
     if(sales_var == 1):
-        total_sales, urls = get_sales(start_date, end_date, folder_name, dropbox_var, drive_var)
+        total_sales, urls = results['sales']
         anotar_datos_excel(total_sales, columna, 67+12, False, actualMonth) 
 
         if(dropbox_var or drive_var):
             anotar_datos_excel(urls, columna, 67+12, True, actualMonth)
 
     if(payment_errors_var == 1):
-        total_payments, urls = get_payments(start_date, end_date, folder_name, dropbox_var, drive_var) 
+        total_payments, urls = results['payments']
         anotar_datos_excel(total_payments, columna, 72+12, False, actualMonth)
 
         if(dropbox_var or drive_var):
             anotar_datos_excel(urls, columna, 72+12, True, actualMonth)
 
-    if(expected_renewals_var == 1):
-        total_expected_renewals = get_expected_renewals(start_date, end_date, folder_name) 
-    
-    if(frequency_var == 1):
-        realRenewalFrequency(start_date, end_date, folder_name) 
-    
     if(full_control_var == 1):
-        fcList = fullControl(start_date, end_date)
+        fcList = results['full_control']
         fcRow = 89
         anotar_datos_excel(fcList, columna, fcRow, False, actualMonth)
 
@@ -83,7 +118,7 @@ if database_report:
         # anotar_datos_excel(renewalFC, columna, 78+12, False, actualMonth)
 
     if(subs_var == 1):
-        subsPercentage, subsNew, subsExisting, otherSubs = subs(start_date, end_date)
+        subsPercentage, subsNew, subsExisting, otherSubs = results['subs']
 
         subsRow = 100
 
@@ -99,11 +134,11 @@ if database_report:
         anotar_datos_excel(otherSubs, columna, subsRow, False, actualMonth)
 
     if(refill_var == 1):
-        refillData = refill(start_date, end_date)
+        refillData = results['refill']
         anotar_datos_excel(refillData, columna, 121, False, actualMonth)
     
     if(upsize_var == 1):
-        upsizeBeard, upsizeWipes, upsizeTotal, upsizeShampoo, upsizeConditioner = upsize(start_date, end_date)
+        upsizeBeard, upsizeWipes, upsizeTotal, upsizeShampoo, upsizeConditioner = results['upsize']
 
         upsizeRow = 133
         upsizeAvance = 5
@@ -123,7 +158,7 @@ if database_report:
         anotar_datos_excel(upsizeTotal, columna, upsizeRow, False, actualMonth)
 
     if(hear_var == 1):
-        hearTotal, hearList = hear(start_date, end_date)
+        hearTotal, hearList = results['hear']
 
         heareRowTotal = 159
         heareRow = 163
@@ -135,6 +170,8 @@ if database_report:
             anotar_datos_excel(h, columna, heareRow, False, actualMonth)
             heareRow = heareRow + hearAvance
 
+    print_pool_stats()
+
 if funnels_report:
     if archivos['Customized Kit - Funnel'] != None:
         get_funnel(archivos['Customized Kit - Funnel'], 'Customized Kit - Funnel.xlsx', columna, 5, folder_name, dropbox_var, drive_var, actualMonth)
@@ -235,6 +272,9 @@ if stripe_block_payments:
     if archivos['Blocked Payments'] != None and archivos['All Payments'] != None:
         get_blocked_payments(archivos['Blocked Payments'], archivos['All Payments'], 'Blocked payments', 'Stripe data')
 
+if reporte is not None:
+    reporte.close()
+
 nuevo_archivo = f'Monthly Report {actualMonth}.xlsx'
 
 if(dropbox_var):
@@ -1,5 +1,6 @@
 import pandas as pd
 from modules.database_queries import execute_query
+from modules.cancellation_cube import cancellation_cube, cancellation_fact, monthly_reason_counts, normalize_reasons, reason_share
 from datetime import datetime
 
 # Consulta SQL para obtener las cancelaciones del item específico
@@ -55,32 +56,18 @@ def mediumBrownCancellationReasons(query, fileName):
     # Convertir a DataFrame
     df = pd.DataFrame(data, columns=['subscriptionId', 'reason', 'createdAt'])
 
-    # Procesar las razones (tomar solo la parte antes del primer "->")
-    def simplificar_razon(razon):
-        if pd.isna(razon):
-            return "Sin razón especificada"
-        partes = razon.split("->")
-        partes = razon.split("-")
-        return partes[0].strip()
-
-    df['razon_simplificada'] = df['reason'].apply(simplificar_razon)
-
-    # Convertir createdAt a datetime y extraer año y mes
-    df['createdAt'] = pd.to_datetime(df['createdAt'])
-    df['año'] = df['createdAt'].dt.year
-    df['mes'] = df['createdAt'].dt.month
-    df['mes_nombre'] = df['createdAt'].dt.strftime('%B')
+    # Razón simplificada (solo la parte antes del primer "-") y cubo razón x año x mes
+    fact = cancellation_fact(
+        df['subscriptionId'],
+        normalize_reasons(df['reason'], separator='-'),
+        created_at=df['createdAt'],
+    )
+    cubo = cancellation_cube(fact, ['razon', 'año', 'mes'])
 
     # Crear el archivo Excel
     with pd.ExcelWriter(fileName, engine='xlsxwriter') as writer:
         # Calcular porcentajes históricos (promedio de todos los años)
-        pivot_historico = df.pivot_table(
-            index='razon_simplificada',
-            values='subscriptionId',
-            aggfunc='count',
-            fill_value=0
-        )
-        porcentaje_historico = (pivot_historico / pivot_historico.sum()).T
+        porcentaje_historico = reason_share(cubo)
         
         # Hoja Histórico
         porcentaje_historico.to_excel(writer, sheet_name='Histórico', index=False)
@@ -97,26 +84,10 @@ def mediumBrownCancellationReasons(query, fileName):
             ) + 2
             worksheet_historico.set_column(i, i, max_len, percent_format)
         
-        # Agrupar por año
-        for año, grupo_anual in df.groupby('año'):
-            # Hoja de cantidades
-            pivot_cantidades = grupo_anual.pivot_table(
-                index='mes_nombre',
-                columns='razon_simplificada',
-                values='subscriptionId',
-                aggfunc='count',
-                fill_value=0
-            ).reset_index()
-            
-            # Ordenar por mes cronológicamente
-            meses_orden = ['January', 'February', 'March', 'April', 'May', 'June', 
-                        'July', 'August', 'September', 'October', 'November', 'December']
-            pivot_cantidades['mes_nombre'] = pd.Categorical(
-                pivot_cantidades['mes_nombre'],
-                categories=meses_orden,
-                ordered=True
-            )
-            pivot_cantidades = pivot_cantidades.sort_values('mes_nombre')
+        # Una hoja de cantidades y una de porcentajes por año
+        for año in sorted(cubo.index.unique('año')):
+            # Hoja de cantidades (meses en orden cronológico)
+            pivot_cantidades = monthly_reason_counts(cubo, año)
             
             # Agregar fila de totales (solo para la hoja de cantidades)
             totales = pivot_cantidades.iloc[:, 1:].sum().to_frame().T
@@ -137,8 +108,8 @@ def mediumBrownCancellationReasons(query, fileName):
             
             # Hoja de porcentajes
             pivot_porcentajes = pivot_cantidades.copy()
-            pivot_porcentajes.iloc[:, 1:] = pivot_porcentajes.iloc[:, 1:].div(
-                pivot_porcentajes.iloc[:, 1:].sum(axis=1), axis=0
+            pivot_porcentajes[pivot_porcentajes.columns[1:]] = pivot_cantidades.iloc[:, 1:].div(
+                pivot_cantidades.iloc[:, 1:].sum(axis=1), axis=0
             )
             
             # Calcular promedios por razón
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+NO_REASON = "Sin razón especificada"
+
+# Columnas de las tablas por razón para cada etnia del diagnóstico (0 = sin etnia)
+ETHNICITY_COLUMNS = {13: 'caucasian', 14: 'african', 15: 'asian'}
+
+# Columnas de las tablas por razón para cada experience with color
+EXPERIENCE_COLUMNS = {
+    'Currently Dyed': 'currently_dyed',
+    "I've colored": 'ive_colored',
+    'Never colored': 'never_colored',
+    'Unknown': 'unknown',
+}
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+# Métricas aditivas del hecho; el resto de columnas (salvo shade_*) son dimensiones
+METRICS = ['cancelaciones', 'suscripcion_nueva', 'suscripcion_nueva_etnia']
+
+
+def normalize_reason(reason, separator='->', blank_as_missing=False):
+    """
+    Razón de cancelación simplificada: la parte antes del primer `separator`, sin espacios.
+    Las razones nulas (y las vacías si `blank_as_missing`) quedan como NO_REASON.
+    """
+    if pd.isna(reason) or (blank_as_missing and str(reason).strip() == ""):
+        return NO_REASON
+    return str(reason).split(separator)[0].strip()
+
+
+def normalize_reasons(reasons, separator='->', blank_as_missing=False):
+    """
+    normalize_reason sobre una Series de razones, devuelta como Categorical (categorías en
+    orden alfabético). Hay pocas razones distintas: cada una se normaliza una sola vez y los
+    groupbys posteriores trabajan sobre los códigos enteros.
+    """
+    codes, uniques = pd.factorize(reasons)
+    # Última posición: razones nulas (código -1 en factorize)
+    labels = pd.Index([normalize_reason(reason, separator, blank_as_missing) for reason in uniques] + [NO_REASON])
+    categories = labels.unique().sort_values()
+    categorical = pd.Categorical.from_codes(categories.get_indexer(labels)[codes], categories=categories)
+    return pd.Series(categorical, index=reasons.index, name=reasons.name)
+
+
+def shade_column(item_id):
+    return f"shade_{item_id[-4:]}"
+
+
+def shade_flags(item_ids, shades):
+    """
+    Indicador fila x shade (bool, una columna shade_XXXX por shade, en el orden de `shades`)
+    a partir de una Series de ids de item separados por comas (GROUP_CONCAT) o de un solo id.
+    Cada lista distinta se separa una sola vez y se comparan ids exactos, no subcadenas.
+    """
+    codes, lists = pd.factorize(item_ids)
+    items = pd.Series(lists).str.split(',').explode().str.strip()
+    columns = pd.Index(list(shades.keys())).get_indexer(items)
+    is_shade = columns >= 0
+
+    # Última fila: filas sin ítems (código -1 en factorize)
+    flags = np.zeros((len(lists) + 1, len(shades)), dtype=bool)
+    flags[items.index.to_numpy()[is_shade], columns[is_shade]] = True
+    return pd.DataFrame(flags[codes], index=item_ids.index, columns=[shade_column(item_id) for item_id in shades])
+
+
+def cancellation_fact(subscription_ids, reasons=None, ethnicity=None, experience=None, created_at=None, shades=None):
+    """
+    Hecho de cancelaciones: una fila por cada fila del extracto (Series alineadas), con
+    - dimensiones: `razon` (ya normalizada), `etnia` (13/14/15, 0 sin diagnóstico),
+      `experiencia`, `fecha`, `año` y `mes` (según los datos que se pasen)
+    - métricas: `cancelaciones` (1 por fila), `suscripcion_nueva` y `suscripcion_nueva_etnia`
+      (primera fila de cada suscripción por razón, y por razón + etnia, para contar
+      suscripciones únicas sumando el cubo) y las columnas shade_XXXX de `shades`
+    """
+    fact = pd.DataFrame({'cancelaciones': 1}, index=subscription_ids.index)
+
+    if reasons is not None:
+        fact['razon'] = reasons
+    if ethnicity is not None:
+        fact['etnia'] = ethnicity.fillna(0).astype(int)
+    if experience is not None:
+        fact['experiencia'] = experience.fillna('Unknown')
+    if created_at is not None:
+        created_at = pd.to_datetime(created_at)
+        fact['fecha'] = created_at.dt.date
+        fact['año'] = created_at.dt.year
+        fact['mes'] = created_at.dt.month
+
+    if reasons is not None:
+        claves = pd.DataFrame({'razon': fact['razon'], 'subscriptionId': subscription_ids})
+        fact['suscripcion_nueva'] = (~claves.duplicated()).astype(int)
+        if ethnicity is not None:
+            claves['etnia'] = fact['etnia']
+            fact['suscripcion_nueva_etnia'] = (~claves.duplicated()).astype(int)
+
+    if shades is not None:
+        fact = fact.join(shades.astype(int))
+    return fact
+
+
+def cancellation_cube(fact, dimensions):
+    """
+    Cubo de cancelaciones: las métricas del hecho sumadas por cada combinación presente de
+    `dimensions`, con un solo groupby. Las tablas de cada reporte salen de agregar el cubo
+    con rollup() en lugar de volver a recorrer las cancelaciones.
+    """
+    metrics = [column for column in fact.columns if column in METRICS or column.startswith('shade_')]
+    return fact.groupby(list(dimensions), observed=True)[metrics].sum()
+
+
+def rollup(cube, by, **filters):
+    """Agrega el cubo a las dimensiones `by`, quedándose antes con las celdas dimensión == valor."""
+    if filters:
+        mask = np.ones(len(cube), dtype=bool)
+        for dimension, value in filters.items():
+            mask &= cube.index.get_level_values(dimension) == value
+        cube = cube[mask]
+    return cube.groupby(level=by, observed=True).sum()
+
+
+def _percentages(values, total):
+    if total > 0:
+        return [f"{valor}%" for valor in (values / total * 100).round(2).tolist()]
+    return "0%"
+
+
+def _reason_table(por_razon, subscriptions, breakdown):
+    """
+    Layout común de las tablas por razón: razon_procesada, total_cancelaciones,
+    suscripciones_unicas, una columna por categoría de `breakdown` y sus porcentajes
+    (sobre el total de cada columna), ordenada por total de cancelaciones.
+    """
+    resultado = pd.DataFrame({
+        'total_cancelaciones': por_razon['cancelaciones'],
+        'suscripciones_unicas': por_razon[subscriptions],
+    }).join(breakdown)
+
+    for column in ['total_cancelaciones'] + list(breakdown.columns):
+        name = 'porcentaje_cancelaciones' if column == 'total_cancelaciones' else f'porcentaje_{column}'
+        resultado[name] = _percentages(resultado[column], resultado[column].sum())
+
+    resultado = resultado.rename_axis('razon_procesada').reset_index()
+    resultado['razon_procesada'] = resultado['razon_procesada'].astype(str)
+    return resultado.sort_values('total_cancelaciones', ascending=False)
+
+
+def _breakdown(cube, dimension, columns):
+    conteos = rollup(cube, ['razon', dimension])['cancelaciones'].unstack(dimension, fill_value=0)
+    return conteos.reindex(columns=list(columns), fill_value=0).rename(columns=columns)
+
+
+def reason_ethnicity_table(cube):
+    """Tabla 'Por Razon (Etnias)': cancelaciones por razón y por etnia. Cubo con `razon` y `etnia`."""
+    return _reason_table(rollup(cube, 'razon'), 'suscripcion_nueva', _breakdown(cube, 'etnia', ETHNICITY_COLUMNS))
+
+
+def reason_experience_table(cube):
+    """Tabla 'Por Razon (Experience)': cancelaciones por razón y experience with color."""
+    return _reason_table(rollup(cube, 'razon'), 'suscripcion_nueva', _breakdown(cube, 'experiencia', EXPERIENCE_COLUMNS))
+
+
+def reason_shade_table(cube, shades, ethnicity=None):
+    """
+    Tabla 'Por Razon (Shades)': cancelaciones por razón y shade (columnas con el nombre del
+    shade), de todas las etnias o solo de `ethnicity` (13/14/15).
+    """
+    if ethnicity is None:
+        por_razon, subscriptions = rollup(cube, 'razon'), 'suscripcion_nueva'
+    else:
+        por_razon, subscriptions = rollup(cube, 'razon', etnia=ethnicity), 'suscripcion_nueva_etnia'
+    breakdown = por_razon[[shade_column(item_id) for item_id in shades]]
+    return _reason_table(por_razon, subscriptions, breakdown.set_axis(list(shades.values()), axis=1))
+
+
+def reason_share(cube):
+    """Participación histórica de cada razón (una fila, una columna por razón en orden alfabético)."""
+    conteos = rollup(cube, 'razon')['cancelaciones']
+    return (conteos / conteos.sum()).to_frame().T
+
+
+def monthly_reason_counts(cube, year):
+    """
+    Cancelaciones de `year` por mes (columna `mes_nombre`, meses con datos en orden
+    cronológico) y razón (columnas en orden alfabético, solo las que aparecen ese año).
+    """
+    conteos = rollup(cube, ['mes', 'razon'], año=year)['cancelaciones'].unstack('razon', fill_value=0)
+    conteos.index = [MONTHS[mes - 1] for mes in conteos.index]
+    return conteos.rename_axis('mes_nombre').reset_index()
+
+
+def shade_counts(cube, shades, by):
+    """
+    Cancelaciones por `by` (dimensión del cubo o Series alineada con su índice, p. ej. el mes)
+    y shade, con una columna por cada shade que aparece en el cubo, en orden alfabético de
+    nombre.
+    """
+    columnas = [shade_column(item_id) for item_id in shades]
+    presentes = cube[columnas].sum() > 0
+    conteos = cube[columnas].groupby(by).sum().loc[:, presentes]
+    conteos.columns = [shades[item_id] for item_id, presente in zip(shades, presentes) if presente]
+    return conteos.sort_index(axis=1)
@@ -1,25 +1,274 @@
 import os
+import time
+import atexit
+import threading
 import pandas as pd
 import mysql.connector
+from mysql.connector import FieldType
 from tkinter import Tk, Label, Entry, Button
 from dotenv import load_dotenv
+from modules import query_cache
 
 load_dotenv()
 
 # Variables globales para la conexión
 database="bi"
 
-def execute_query(query):
-    """Ejecuta una consulta SQL y devuelve un DataFrame."""
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": database
-    }
-    connection = mysql.connector.connect(**db_config)
-    data = pd.read_sql(query, connection)
-    connection.close()
+# Configuración del pool de conexiones (se puede sobrescribir desde el .env)
+pool_size = int(os.getenv("DB_POOL_SIZE", "4"))
+pool_idle_timeout = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones MySQL reutilizables para un esquema.
+
+    Mantiene hasta `size` conexiones abiertas. Una conexión que lleva más de
+    `idle_timeout` segundos sin usarse se cierra en lugar de reutilizarse, para
+    no chocar con el `wait_timeout` del servidor.
+    """
+
+    def __init__(self, schema, size=pool_size, idle_timeout=pool_idle_timeout):
+        self.schema = schema
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # [(connection, ultimo_uso)]
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+        # Métricas para reportar el tiempo de handshake ahorrado
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+        self.reuses = 0
+
+    def _connect(self):
+        db_config = {
+            "host": os.getenv("DB_HOST"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "database": self.schema,
+            # Sin autocommit una conexión reutilizada seguiría leyendo el snapshot de su primera consulta
+            "autocommit": True
+        }
+        inicio = time.perf_counter()
+        connection = mysql.connector.connect(**db_config)
+        elapsed = time.perf_counter() - inicio
+
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_seconds += elapsed
+        return connection
+
+    def _take_idle(self):
+        """Devuelve una conexión ociosa válida, descartando las expiradas."""
+        ahora = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, ultimo_uso = self._idle.pop()
+
+            if ahora - ultimo_uso <= self.idle_timeout and connection.is_connected():
+                with self._lock:
+                    self.reuses += 1
+                return connection
+
+            try:
+                connection.close()
+            except mysql.connector.Error:
+                pass
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self._connect()
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        try:
+            if broken:
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except mysql.connector.Error:
+                pass
+
+    def saved_seconds(self):
+        """Tiempo de handshake estimado que se evitó al reutilizar conexiones."""
+        if self.handshakes == 0:
+            return 0.0
+        return self.reuses * (self.handshake_seconds / self.handshakes)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(schema=None):
+    """Devuelve el pool del esquema indicado (por defecto `database`), creándolo si no existe."""
+    schema = schema or database
+    with _pools_lock:
+        pool = _pools.get(schema)
+        if pool is None:
+            pool = ConnectionPool(schema)
+            _pools[schema] = pool
+        return pool
+
+
+def execute_query(query, schema=None, params=None, cache_ttl=None, chunksize=None):
+    """
+    Ejecuta una consulta SQL y devuelve un DataFrame.
+
+    Si se indica `cache_ttl` (segundos, o `query_cache.CACHE_FOREVER`), el resultado se
+    guarda en disco y las siguientes ejecuciones dentro de ese plazo no tocan la base de datos.
+
+    Con `chunksize` devuelve en su lugar un generador de DataFrames de hasta `chunksize`
+    filas (ver `iter_query`); en ese modo no se usa la caché.
+    """
+    if chunksize is not None:
+        return iter_query(query, chunksize, schema, params)
+
+    schema = schema or database
+    key = None
+    if cache_ttl is not None:
+        key = query_cache.cache_key(query, params, schema)
+        data = query_cache.load(key, cache_ttl)
+        if data is not None:
+            return data
+        query_cache.stats["misses"] += 1
+
+    pool = get_pool(schema)
+    connection = pool.acquire()
+    broken = False
+    inicio = time.perf_counter()
+    try:
+        data = pd.read_sql(query, connection, params=params)
+    except Exception:
+        broken = True
+        raise
+    finally:
+        pool.release(connection, broken)
+
+    if key is not None:
+        query_cache.store(key, data, time.perf_counter() - inicio)
     return data
 
 
+# Tipo pandas para cada tipo de columna MySQL, para que todos los chunks salgan con el mismo dtype
+_chunk_dtypes = {
+    FieldType.TINY: "Int64",
+    FieldType.SHORT: "Int64",
+    FieldType.INT24: "Int64",
+    FieldType.LONG: "Int64",
+    FieldType.LONGLONG: "Int64",
+    FieldType.YEAR: "Int64",
+    FieldType.FLOAT: "float64",
+    FieldType.DOUBLE: "float64",
+    FieldType.DECIMAL: "float64",
+    FieldType.NEWDECIMAL: "float64",
+    FieldType.DATE: "datetime64[ns]",
+    FieldType.NEWDATE: "datetime64[ns]",
+    FieldType.DATETIME: "datetime64[ns]",
+    FieldType.TIMESTAMP: "datetime64[ns]",
+}
+
+
+def _typed_chunk(rows, columns, dtypes):
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    for column, dtype in dtypes.items():
+        if dtype.startswith("datetime"):
+            chunk[column] = pd.to_datetime(chunk[column], errors="coerce")
+        else:
+            chunk[column] = chunk[column].astype(dtype)
+    return chunk
+
+
+def iter_query(query, chunksize=50000, schema=None, params=None):
+    """
+    Ejecuta una consulta SQL y va devolviendo el resultado en DataFrames de hasta `chunksize` filas.
+
+    Usa un cursor sin buffer, así que las filas se leen del servidor a medida que se consumen
+    y la memoria queda acotada al tamaño del chunk. La conexión queda ocupada hasta que se
+    termina de recorrer el generador; si se abandona a medias, la conexión se descarta.
+    """
+    pool = get_pool(schema)
+    connection = pool.acquire()
+    broken = True
+    try:
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+        columns = cursor.column_names
+        dtypes = {
+            description[0]: _chunk_dtypes[description[1]]
+            for description in cursor.description
+            if description[1] in _chunk_dtypes
+        }
+
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            yield _typed_chunk(rows, columns, dtypes)
+
+        cursor.close()
+        broken = False
+    finally:
+        pool.release(connection, broken)
+
+
+def pool_stats():
+    """Devuelve, por esquema, las conexiones abiertas, las reutilizadas y el tiempo ahorrado."""
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    stats = {}
+    for pool in pools:
+        queries = pool.handshakes + pool.reuses
+        stats[pool.schema] = {
+            "queries": queries,
+            "handshakes": pool.handshakes,
+            "reuses": pool.reuses,
+            "handshake_seconds": pool.handshake_seconds,
+            "saved_seconds": pool.saved_seconds(),
+        }
+    return stats
+
+
+def print_pool_stats():
+    """Imprime el resumen de uso de los pools frente a abrir una conexión por consulta."""
+    for schema, s in pool_stats().items():
+        print(
+            f"[pool {schema}] consultas: {s['queries']}, conexiones abiertas: {s['handshakes']}, "
+            f"reutilizadas: {s['reuses']}, handshake ahorrado: {s['saved_seconds']:.2f}s"
+        )
+    if query_cache.stats["hits"] or query_cache.stats["misses"]:
+        print(
+            f"[caché] aciertos: {query_cache.stats['hits']}, fallos: {query_cache.stats['misses']}, "
+            f"tiempo de consulta ahorrado: {query_cache.stats['saved_seconds']:.2f}s"
+        )
+
+
+def close_pools():
+    """Cierra todas las conexiones ociosas de todos los pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
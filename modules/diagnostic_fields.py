@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+from modules.payment_metadata import loads
+
+# Códigos de etnia en los values del diagnóstico (CAUCASIAN, AFRICAN, ASIAN)
+ETHNICITY_CODES = (13, 14, 15)
+
+# Values de "experience with color" (variable 40; variable 36 en diagnósticos antiguos)
+EXPERIENCE_WITH_COLOR = {
+    '118': 'Currently Dyed',
+    '112': 'Currently Dyed',
+    '119': "I've colored",
+    '116': "I've colored",
+    '120': 'Never colored',
+    '114': 'Never colored',
+}
+
+
+def diagnostic_items(raw, wrapped_only=False):
+    """
+    Respuestas (dicts con variable/value) de un diagnóstico en cualquiera de sus formatos:
+    lista, dict con keys numéricas, o cualquiera de los dos dentro de "values". Con
+    `wrapped_only` solo se lee el formato con "values" (lo único que leían los JSON_TABLE
+    sobre `$.diagnostic.values`); una lista o dict sueltos no tienen respuestas.
+    """
+    try:
+        data = loads(raw)
+    except (ValueError, TypeError):
+        return []
+
+    if isinstance(data, dict) and 'values' in data:
+        data = data['values']
+    elif wrapped_only:
+        return []
+    if isinstance(data, dict):
+        data = list(data.values())
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse(raw, variables, ethnicity_priority, wrapped_only):
+    values = {}
+    ethnicities = []
+    for item in diagnostic_items(raw, wrapped_only):
+        variable = _to_int(item.get('variable', item.get('var')))
+        if variable in variables and variable not in values:
+            value = item.get('value', item.get('val'))
+            values[variable] = None if value is None else str(value)
+
+        if 'value' in item:
+            code = _to_int(item['value'])
+            if code in ETHNICITY_CODES:
+                ethnicities.append(code)
+
+    if ethnicity_priority is None:
+        ethnicity = ethnicities[0] if ethnicities else np.nan
+    else:
+        ethnicity = next((code for code in ethnicity_priority if code in ethnicities), np.nan)
+    return [values.get(variable) for variable in variables], [variable in values for variable in variables], ethnicity
+
+
+def extract_diagnostic_fields(diagnostics, variables=(), ethnicity_priority=None, wrapped_only=False):
+    """
+    Extrae de una Series de diagnósticos (JSON) un DataFrame ancho con el mismo índice:
+    - `var_<n>`: primer value (texto) de cada variable de `variables`, o None
+    - `has_var_<n>`: si la variable aparece en el diagnóstico (aunque su value sea nulo)
+    - `ethnicity`: código 13/14/15 (float, NaN si no tiene). Es el primero que aparece, o el
+      primero de `ethnicity_priority` presente en el diagnóstico si se indica
+
+    `wrapped_only` se pasa a diagnostic_items.
+
+    Cada diagnóstico distinto se parsea una sola vez, con todas las variables a la vez.
+    """
+    variables = tuple(variables)
+    codes, uniques = pd.factorize(diagnostics)
+    # Última posición: filas sin diagnóstico (código -1 en factorize)
+    parsed = [_parse(raw, variables, ethnicity_priority, wrapped_only) for raw in uniques]
+    parsed.append(([None] * len(variables), [False] * len(variables), np.nan))
+
+    fields = {}
+    for i, variable in enumerate(variables):
+        values = np.empty(len(parsed), dtype=object)
+        values[:] = [found[i] for found, _, _ in parsed]
+        fields[f'var_{variable}'] = values[codes]
+        fields[f'has_var_{variable}'] = np.array([seen[i] for _, seen, _ in parsed], dtype=bool)[codes]
+    fields['ethnicity'] = np.array([ethnicity for _, _, ethnicity in parsed], dtype=float)[codes]
+
+    return pd.DataFrame(fields, index=diagnostics.index)
+
+
+def experience_code(fields, null_falls_back=True):
+    """
+    Código de experience with color de extract_diagnostic_fields: `var_40`, o `var_36` si no
+    hay 40. Con `null_falls_back=False` una variable 40 presente con value nulo no pasa a la
+    36 (el código queda nulo), como el extractor anterior de shadeCancelations.py.
+    """
+    has_40 = fields['var_40'].notna() if null_falls_back else fields['has_var_40']
+    return fields['var_40'].where(has_40, fields['var_36'])
+
+
+def experience_with_color(fields, unknown='Unknown', null_falls_back=True):
+    """
+    Etiqueta de experiencia con color a partir de experience_code; los códigos desconocidos
+    o ausentes quedan como `unknown`.
+    """
+    labels = experience_code(fields, null_falls_back).str.strip().map(EXPERIENCE_WITH_COLOR)
+    return labels if unknown is None else labels.fillna(unknown)
@@ -1,4 +1,10 @@
 import os
+import threading
+from functools import wraps
+import matplotlib
+# Los gráficos solo se guardan como imagen y se generan en hilos del TaskRunner de main.py:
+# con Agg pyplot nunca crea ventanas Tk fuera del hilo principal (donde corre la GUI)
+matplotlib.use("Agg")
 from matplotlib import pyplot as plt
 from openpyxl import Workbook
 from openpyxl.drawing.image import Image
@@ -16,6 +22,20 @@ from io import BytesIO
 from modules.colors import lighten_color
 from uploadCloud import upload_to_drive, upload_to_dropbox
 
+# Las imágenes temporales de los gráficos se escriben con nombres fijos, así que cuando los
+# reportes corren en paralelo la generación de cada Excel se hace de a uno
+excel_lock = threading.RLock()
+
+
+def with_excel_lock(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with excel_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@with_excel_lock
 def save_dataframe_to_excel(output_dir, output_file, data, sheet_name, columns_to_plot, colors, grafico_positions, dropbox_var=False, drive_var=False):
    
     if not os.path.exists(output_dir):
@@ -97,6 +117,7 @@ def line_chart(wb, sheet_name, data, columns_to_plot, colors, grafico_positions)
 
     return wb
 
+@with_excel_lock
 def save_error_reasons_with_chart(output_dir, file_name, error_reasons, is_payment, dropbox_var, drive_var):
     """
     Guarda las razones de error en una nueva hoja de Excel, pinta las celdas
@@ -205,6 +226,7 @@ def save_error_reasons_with_chart(output_dir, file_name, error_reasons, is_payme
     return urls
     
 
+@with_excel_lock
 def save_dataframe_to_excel_orders(output_dir, output_file, data, sheet_name, columns_to_plot, colors, grafico_positions, dropbox_var, drive_var):
 
     if not os.path.exists(output_dir):
@@ -230,6 +252,7 @@ def save_dataframe_to_excel_orders(output_dir, output_file, data, sheet_name, co
     return url
 
 
+@with_excel_lock
 def save_dataframe_to_excel_ga4(percentages_table, percentages_previous_step, final_table_spaced_with_previous, nombre_salida, carpeta_salida, dropbox_var, drive_var):
     # Crear la carpeta si no existe
     if not os.path.exists(carpeta_salida):
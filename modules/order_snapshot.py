@@ -0,0 +1,128 @@
+import threading
+import pandas as pd
+from modules.database_queries import execute_query
+
+# Ítem que no cuenta como unidad válida en orders.py (validItems)
+ITEM_EXCLUIDO_VALID_ITEMS = 'IT00000000000000000000000000000107'
+
+
+class OrderSnapshot:
+    """
+    Foto de `bi.fact_orders` y sus ítems para el periodo del reporte mensual.
+
+    Se extrae una sola vez (órdenes + ítems, en columnas tipadas) y cada módulo del
+    Monthly Report calcula sus métricas filtrando en memoria, en lugar de lanzar su
+    propia consulta sobre `fact_orders`. La ventana abarca de `start_date 00:00:00` a
+    `end_date 00:00:00`, ambos inclusive, para cubrir los `>`, `>=`, `<` y `BETWEEN`
+    de las consultas originales; cada módulo aplica después sus propios límites.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start = pd.Timestamp(start_date)
+        self.end = pd.Timestamp(end_date)
+        self.orders = None
+        self.items = None
+        self._order_items = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        query_orders = f"""
+        SELECT
+            fo.id,
+            fo.order_number,
+            fo.customer_id,
+            fo.subscription_id,
+            fo.created_at,
+            fo.status,
+            fo.is_first_order,
+            fo.recurrent,
+            fo.order_plan,
+            fo.units,
+            fo.total,
+            fc.id IS NOT NULL AS has_customer
+        FROM bi.fact_orders fo
+        LEFT JOIN bi.fact_customers fc ON fc.id = fo.customer_id
+        WHERE fo.created_at >= '{self.start:%Y-%m-%d} 00:00:00'
+        AND fo.created_at <= '{self.end:%Y-%m-%d} 00:00:00';
+        """
+
+        query_items = f"""
+        SELECT
+            fsoi.salesOrderId,
+            fsoi.itemId,
+            fsoi.category,
+            fsoi.quantity
+        FROM bi.fact_sales_order_items fsoi
+        JOIN bi.fact_orders fo ON fo.id = fsoi.salesOrderId
+        WHERE fo.created_at >= '{self.start:%Y-%m-%d} 00:00:00'
+        AND fo.created_at <= '{self.end:%Y-%m-%d} 00:00:00';
+        """
+
+        orders = execute_query(query_orders)
+        orders['created_at'] = pd.to_datetime(orders['created_at'])
+        orders['has_customer'] = orders['has_customer'].astype(bool)
+        for column in ['status', 'order_plan']:
+            orders[column] = orders[column].astype('category')
+
+        items = execute_query(query_items)
+        for column in ['itemId', 'category']:
+            items[column] = items[column].astype('category')
+
+        self.orders = orders
+        self.items = items
+        return self
+
+    def between(self, start_inclusive=True, end_inclusive=False, data=None):
+        """Máscara sobre `orders` (o `data`, p. ej. `order_items()`) para el periodo con los límites indicados."""
+        created_at = (self.orders if data is None else data)['created_at']
+        after_start = created_at >= self.start if start_inclusive else created_at > self.start
+        before_end = created_at <= self.end if end_inclusive else created_at < self.end
+        return after_start & before_end
+
+    def order_items(self):
+        """Ítems unidos con las columnas de su orden (se construye una vez y se reutiliza)."""
+        with self._lock:
+            if self._order_items is None:
+                self._order_items = self.items.merge(
+                    self.orders, left_on='salesOrderId', right_on='id', how='inner'
+                )
+            return self._order_items
+
+    def valid_items(self, orders):
+        """`units` de cada orden descontando las unidades del ítem excluido (ver orders.py)."""
+        excluded = self.items[self.items['itemId'] == ITEM_EXCLUIDO_VALID_ITEMS]
+        excluded_qty = excluded.groupby('salesOrderId', observed=True)['quantity'].sum()
+        descuento = orders['id'].map(excluded_qty)
+        return (orders['units'] - descuento).where(descuento.notna(), orders['units'])
+
+
+def first_item_per_order(order_items):
+    """Una fila por orden, como el `GROUP BY SO.id` de las consultas de refill/upsize."""
+    return order_items.drop_duplicates('salesOrderId')
+
+
+def not_equal(series, value):
+    """`series <> value` con la semántica de SQL: los NULL no cumplen la condición."""
+    return series.notna() & (series != value)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_order_snapshot(start_date, end_date):
+    """
+    Devuelve la foto de órdenes del periodo, extrayéndola la primera vez que se pide.
+    Es segura entre hilos: si varios reportes la piden a la vez, solo uno consulta.
+    """
+    key = (str(start_date), str(end_date))
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = OrderSnapshot(start_date, end_date)
+            _snapshots[key] = snapshot
+
+    with snapshot._lock:
+        if snapshot.orders is None:
+            snapshot.load()
+    return snapshot
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+import pandas as pd
+
+# orjson es opcional: si está instalado se usa para parsear, y json de la librería
+# estándar queda como respaldo para lo que orjson rechaza (NaN, Infinity, etc.)
+try:
+    import orjson
+    _fast_loads = orjson.loads
+except ImportError:
+    _fast_loads = None
+
+DECLINE_CODE_PATH = ('stripeError', 'error', 'decline_code')
+
+
+def loads(value):
+    """Parsea un JSON con orjson si está instalado, o con json si no (o si orjson lo rechaza)"""
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(value)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(value)
+
+
+def _extract(value, path, default, invalid):
+    try:
+        data = loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return invalid
+
+    for key in path[:-1]:
+        data = data.get(key, {})
+    return data.get(path[-1], default)
+
+
+def extract_metadata_field(metadata, path, default=None, invalid='invalid_metadata'):
+    """
+    Extrae el campo `path` (tupla de claves) del JSON de cada fila de una Series `metadata`.
+
+    Cada valor distinto se parsea una sola vez. Las filas con JSON inválido o sin valor
+    (None/NaN) devuelven `invalid`; si el JSON no tiene el campo, devuelven `default`.
+    """
+    codes, uniques = pd.factorize(metadata, use_na_sentinel=False)
+    valores = np.array([_extract(value, path, default, invalid) for value in uniques], dtype=object)
+    return pd.Series(valores[codes], index=metadata.index, dtype=object)
+
+
+def extract_decline_codes(metadata):
+    """`stripeError.error.decline_code` de cada fila de `payments.metadata`."""
+    return extract_metadata_field(metadata, DECLINE_CODE_PATH, default='unknown_error')
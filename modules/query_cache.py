@@ -0,0 +1,162 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+import pandas as pd
+
+# Carpeta y tamaño máximo de la caché (se pueden sobrescribir desde el .env)
+cache_dir = os.getenv("QUERY_CACHE_DIR", ".query_cache")
+cache_max_bytes = int(float(os.getenv("QUERY_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+# `python script.py --refresh` ignora lo guardado y vuelve a consultar la base de datos
+refresh = "--refresh" in sys.argv or os.getenv("QUERY_CACHE_REFRESH") == "1"
+
+# TTLs de uso común (en segundos)
+ONE_HOUR = 60 * 60
+ONE_DAY = 24 * ONE_HOUR
+CACHE_FOREVER = float("inf")
+
+_index_file = "index.json"
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+def normalize_sql(query):
+    """Quita comentarios `--` y espacios sobrantes para que el mismo SQL genere la misma clave."""
+    query = re.sub(r"--[^\n]*", " ", query)
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(";").strip()
+
+
+def cache_key(query, params=None, schema=None):
+    """Clave de la caché: hash del esquema, el SQL normalizado y los parámetros."""
+    payload = json.dumps([schema, normalize_sql(query), params], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ttl_for_window(end_date, open_ttl=ONE_HOUR):
+    """
+    TTL para una consulta acotada por fechas: si el periodo ya cerró (end_date < hoy)
+    el resultado no cambia y se guarda para siempre; si sigue abierto (incluida una ventana
+    que termina hoy, cuyas filas aún están llegando), solo `open_ttl`.
+
+    Solo sirve para consultas sobre hechos que no cambian: si el query lee columnas de estado
+    actual (status, snooze, frecuencia configurada, ...) usar un TTL fijo como ONE_DAY.
+    """
+    if pd.to_datetime(end_date).normalize() < pd.Timestamp.now().normalize():
+        return CACHE_FOREVER
+    return open_ttl
+
+
+def _path(name):
+    return os.path.join(cache_dir, name)
+
+
+def _read_index():
+    try:
+        with open(_path(_index_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_index(index):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = _path(_index_file + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, _path(_index_file))
+
+
+def load(key, ttl):
+    """Devuelve el DataFrame guardado para `key` si existe y no superó `ttl`; si no, None."""
+    if refresh:
+        return None
+
+    with _lock:
+        index = _read_index()
+        entry = index.get(key)
+        if entry is None:
+            return None
+
+        ahora = time.time()
+        if ahora - entry["created"] > ttl or not os.path.exists(_path(f"{key}.parquet")):
+            return None
+
+        entry["last_access"] = ahora
+        _write_index(index)
+
+    data = pd.read_parquet(_path(f"{key}.parquet"))
+    stats["hits"] += 1
+    stats["saved_seconds"] += entry.get("query_seconds", 0.0)
+    return data
+
+
+def store(key, data, query_seconds=0.0):
+    """Guarda el resultado en Parquet y aplica la expulsión LRU si se supera el tamaño máximo."""
+    os.makedirs(cache_dir, exist_ok=True)
+    file_path = _path(f"{key}.parquet")
+    tmp = file_path + ".tmp"
+    try:
+        data.to_parquet(tmp, index=False)
+    except (ValueError, TypeError, NotImplementedError, ImportError) as e:
+        # Columnas con tipos mixtos que Arrow no sabe serializar: se devuelve el dato sin cachear
+        print(f"No se pudo guardar la consulta en caché: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    os.replace(tmp, file_path)
+
+    with _lock:
+        index = _read_index()
+        ahora = time.time()
+        index[key] = {
+            "created": ahora,
+            "last_access": ahora,
+            "bytes": os.path.getsize(file_path),
+            "query_seconds": query_seconds,
+        }
+        _evict(index)
+        _write_index(index)
+
+
+def _evict(index):
+    """Borra las entradas usadas hace más tiempo hasta que la caché quepa en `cache_max_bytes`."""
+    total = sum(entry["bytes"] for entry in index.values())
+    for key in sorted(index, key=lambda k: index[k]["last_access"]):
+        if total <= cache_max_bytes:
+            break
+        total -= index[key]["bytes"]
+        del index[key]
+        try:
+            os.remove(_path(f"{key}.parquet"))
+        except FileNotFoundError:
+            pass
+
+
+def invalidate(query, params=None, schema=None):
+    """Elimina de la caché el resultado de una consulta concreta."""
+    key = cache_key(query, params, schema)
+    with _lock:
+        index = _read_index()
+        if index.pop(key, None) is not None:
+            _write_index(index)
+    try:
+        os.remove(_path(f"{key}.parquet"))
+    except FileNotFoundError:
+        pass
+
+
+def clear_cache():
+    """Vacía la caché completa."""
+    with _lock:
+        for key in _read_index():
+            try:
+                os.remove(_path(f"{key}.parquet"))
+            except FileNotFoundError:
+                pass
+        _write_index({})
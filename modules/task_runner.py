@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Número máximo de reportes ejecutándose a la vez (se puede sobrescribir desde el .env)
+max_workers = int(os.getenv("REPORT_MAX_WORKERS", "4"))
+
+
+class TaskRunner:
+    """
+    Ejecuta tareas de reporte en paralelo sobre un pool de hilos.
+
+    Cada tarea puede declarar de qué otras tareas depende (`depends_on`); solo se lanza
+    cuando todas ellas terminaron. Las tareas independientes corren a la vez, hasta
+    `max_workers` simultáneas, así que el tiempo total se acerca al de la tarea más lenta
+    en lugar de a la suma de todas.
+    """
+
+    def __init__(self, max_workers=max_workers):
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.timings = {}
+
+    def add(self, name, func, *args, depends_on=(), **kwargs):
+        """Registra la tarea `name`, que ejecutará `func(*args, **kwargs)`."""
+        if name in self.tasks:
+            raise ValueError(f"La tarea '{name}' ya está registrada.")
+        self.tasks[name] = (func, args, kwargs, tuple(depends_on))
+        return name
+
+    def run(self):
+        """Ejecuta todas las tareas y devuelve un dict {nombre: resultado}."""
+        for name, (_, _, _, depends_on) in self.tasks.items():
+            missing = [dep for dep in depends_on if dep not in self.tasks]
+            if missing:
+                raise ValueError(f"La tarea '{name}' depende de tareas inexistentes: {missing}")
+
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+        inicio = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                ready = [name for name, task in pending.items() if all(dep in results for dep in task[3])]
+                for name in ready:
+                    func, args, kwargs, _ = pending.pop(name)
+                    running[executor.submit(self._timed, func, args, kwargs)] = name
+
+                if not running:
+                    raise ValueError(f"Dependencias circulares entre las tareas: {list(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], self.timings[name] = future.result()
+
+        self.wall_seconds = time.perf_counter() - inicio
+        return results
+
+    @staticmethod
+    def _timed(func, args, kwargs):
+        inicio = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - inicio
+
+    def print_timings(self):
+        """Imprime el tiempo de cada tarea y el total frente a ejecutarlas una detrás de otra."""
+        for name, seconds in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            print(f"[{name}] {seconds:.1f}s")
+        print(f"Tiempo total: {self.wall_seconds:.1f}s (en serie habría sido {sum(self.timings.values()):.1f}s)")
@@ -1,10 +1,10 @@
 import os
 import pandas as pd
 import numpy as np
-import json
 import re
 from modules.database_queries import execute_query
-from datetime import datetime, timedelta
+from modules.payment_metadata import loads
+from modules.query_cache import ONE_DAY
 from uploadCloud import upload_to_drive, upload_to_dropbox
 
 def extract_weeks_from_frequency(freq_str):
@@ -19,43 +19,78 @@ def extract_weeks_from_frequency(freq_str):
     except:
         return None
 
-def calculate_frequency_change_difference(frequencies_dict):
-    """Calcula la diferencia entre los dos últimos cambios de frecuencia válidos"""
-    try:
-        if not frequencies_dict:
-            return None
-        
-        # Convertir a lista de tuplas (frecuencia, fecha) y ordenar por fecha, filtrando solo cambios válidos
-        freq_changes = []
-        for freq, date_str in frequencies_dict.items():
-            weeks = extract_weeks_from_frequency(freq)
-            if weeks is not None:  # Solo incluir cambios con formato "Every X weeks"
-                try:
-                    date = datetime.strptime(date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                    freq_changes.append((weeks, date))
-                except:
-                    continue
-        
-        # Ordenar por fecha (más reciente primero)
-        freq_changes.sort(key=lambda x: x[1], reverse=True)
-        
-        # Tomar las dos frecuencias más recientes que sean válidas
-        valid_changes = [fc for fc in freq_changes if fc[0] is not None]
-        if len(valid_changes) >= 2:
-            recent_weeks = valid_changes[0][0]
-            previous_weeks = valid_changes[1][0]
-            return recent_weeks - previous_weeks
-        
-        return None
-    except:
-        return None
+def frequency_change_history(frequency_changes_json):
+    """
+    Historial de cambios de frecuencia en formato largo a partir de la Series de JSON
+    {"<frecuencia>": "<fecha>", ...}: una fila por cambio "Every N weeks" con fecha válida,
+    con `row` (posición de la fila en la Series), `weeks`, `changed_at` y `position` (orden
+    del cambio dentro del JSON). Cada JSON distinto se parsea una sola vez.
+    """
+    codes, uniques = pd.factorize(frequency_changes_json)
+    json_codes, frequencies, dates, positions = [], [], [], []
+    for code, raw in enumerate(uniques):
+        try:
+            changes = loads(raw)
+        except (ValueError, TypeError):
+            continue
+        if not isinstance(changes, dict):
+            continue
+        json_codes.extend([code] * len(changes))
+        frequencies.extend(changes.keys())
+        dates.extend(changes.values())
+        positions.extend(range(len(changes)))
 
-def renewalFrequency(query_main, fileName):
-    # Obtener datos desde la base de datos para el query principal
-    print("Ejecutando query principal...")
-    data_main = execute_query(query_main)
-    print(f"Query principal retornó {len(data_main)} registros")
-    
+    # Pocas frecuencias distintas: el regex corre una vez por cada una
+    frequency_codes, frequency_uniques = pd.factorize(pd.Series(frequencies, dtype=object))
+    weeks = np.array([extract_weeks_from_frequency(freq) for freq in frequency_uniques] + [None], dtype=float)
+    changed_at = pd.to_datetime(
+        pd.Series([date.split('.')[0] if isinstance(date, str) else None for date in dates], dtype=object),
+        format='%Y-%m-%d %H:%M:%S', errors='coerce'
+    )
+    history = pd.DataFrame({
+        'code': np.array(json_codes, dtype=int),
+        'weeks': weeks[frequency_codes],
+        'changed_at': changed_at,
+        'position': np.array(positions, dtype=int),
+    })
+    history = history[history['weeks'].notna() & history['changed_at'].notna()].astype({'weeks': int})
+
+    # Del JSON distinto a cada fila que lo tiene
+    rows = pd.DataFrame({'row': np.arange(len(codes)), 'code': codes})
+    return rows.merge(history, on='code').drop(columns='code')
+
+
+def analyze_frequency_changes(df_main):
+    """
+    Cambios de frecuencia válidos de cada suscripción de `df_main`:
+    - Series bool: algún cambio entre la penúltima y la última orden (ambas incluidas)
+    - lista con la diferencia en semanas entre los dos últimos cambios (el más reciente menos
+      el anterior) de las suscripciones con cambio en el período y al menos dos cambios
+    """
+    history = frequency_change_history(df_main['frequency_changes_json'])
+    orders = df_main[['second_last_order_date', 'last_order_date']].reset_index(drop=True)
+    history = history.join(orders, on='row')
+
+    in_period = history['changed_at'].between(history['second_last_order_date'], history['last_order_date'])
+    has_valid_frequency_change = np.zeros(len(df_main), dtype=bool)
+    has_valid_frequency_change[history.loc[in_period, 'row'].unique()] = True
+
+    # Dos últimos cambios por fecha; a igual fecha, el que aparece antes en el JSON
+    ordered = history.sort_values(['row', 'changed_at', 'position'], ascending=[True, False, True])
+    recientes = ordered.groupby('row').nth(0).set_index('row')['weeks']
+    anteriores = ordered.groupby('row').nth(1).set_index('row')['weeks']
+    differences = recientes.reindex(anteriores.index) - anteriores
+    differences = differences[has_valid_frequency_change[differences.index]]
+
+    return pd.Series(has_valid_frequency_change, index=df_main.index), differences.tolist()
+
+
+def load_full_history_tables():
+    """
+    Payment errors (entre las dos últimas órdenes de cada suscripción) y cambios de frecuencia
+    de todo el historial: no dependen de la ventana ni del filtro FC del reporte, así que se
+    cargan una vez y sirven para todas las variantes.
+    """
     # Query para payment errors
     query_payment_errors = """
     WITH last_orders AS (
@@ -150,24 +185,14 @@ def renewalFrequency(query_main, fileName):
     
     # Ejecutar queries adicionales
     print("Ejecutando query de payment errors...")
-    data_payment_errors = execute_query(query_payment_errors)
+    data_payment_errors = execute_query(query_payment_errors, cache_ttl=ONE_DAY)
     print(f"Query payment errors retornó {len(data_payment_errors)} registros")
     
     print("Ejecutando query de cambios de frecuencia...")
-    data_frequency_changes = execute_query(query_frequency_changes)
+    data_frequency_changes = execute_query(query_frequency_changes, cache_ttl=ONE_DAY)
     print(f"Query cambios de frecuencia retornó {len(data_frequency_changes)} registros")
     
     # Convertir a DataFrames
-    df_main = pd.DataFrame(data_main, columns=[
-        'subscription_id', 
-        'legacy_category', 
-        'delivery_frequency',
-        'snooze',
-        'last_order_date',
-        'second_last_order_date',
-        'days_diff'
-    ])
-    
     df_payment_errors = pd.DataFrame(data_payment_errors, columns=['subscriptionId', 'payment_errors'])
     
     # Convertir frequency changes
@@ -185,18 +210,47 @@ def renewalFrequency(query_main, fileName):
     else:
         df_frequency_changes = pd.DataFrame(columns=['subscriptionId', 'frequency_changes_json'])
     
+    # Asegurarnos de que los tipos de datos sean consistentes
+    if not df_frequency_changes.empty:
+        df_frequency_changes['subscriptionId'] = df_frequency_changes['subscriptionId'].astype(str)
+    df_payment_errors['subscriptionId'] = df_payment_errors['subscriptionId'].astype(str)
+    
+    return df_payment_errors, df_frequency_changes
+
+
+def renewalFrequency(query_main, fileName, main_ttl=None, full_history=None):
+    # Obtener datos desde la base de datos para el query principal
+    print("Ejecutando query principal...")
+    data_main = execute_query(query_main, cache_ttl=main_ttl)
+    print(f"Query principal retornó {len(data_main)} registros")
+    
+    renewal_frequency_report(data_main, fileName, full_history or load_full_history_tables())
+
+
+def renewal_frequency_report(data_main, fileName, full_history):
+    """Genera el Excel de frecuencia de renovación a partir de las dos últimas órdenes de cada suscripción"""
+    df_payment_errors, df_frequency_changes = full_history
+    
+    # Convertir a DataFrames
+    df_main = pd.DataFrame(data_main, columns=[
+        'subscription_id', 
+        'legacy_category', 
+        'delivery_frequency',
+        'snooze',
+        'last_order_date',
+        'second_last_order_date',
+        'days_diff'
+    ])
+    
     # Convertir fechas en df_main
     df_main['last_order_date'] = pd.to_datetime(df_main['last_order_date'])
     df_main['second_last_order_date'] = pd.to_datetime(df_main['second_last_order_date'])
     
     # Asegurarnos de que los tipos de datos sean consistentes
     df_main['subscription_id'] = df_main['subscription_id'].astype(str)
-    if not df_frequency_changes.empty:
-        df_frequency_changes['subscriptionId'] = df_frequency_changes['subscriptionId'].astype(str)
     
     # Unir los datos
     # Unir payment errors
-    df_payment_errors['subscriptionId'] = df_payment_errors['subscriptionId'].astype(str)
     df_main = df_main.merge(
         df_payment_errors, 
         left_on='subscription_id', 
@@ -220,58 +274,12 @@ def renewalFrequency(query_main, fileName):
     df_main['frequency_changes_json'] = df_main['frequency_changes_json'].fillna('{}')
     
     # ANALIZAR CAMBIOS DE FRECUENCIA VÁLIDOS (entre penúltima y última orden)
-    frequency_changes_data = []  # True/False si tiene cambio válido en el período
-    frequency_change_differences = []  # Diferencia en semanas entre los dos últimos cambios válidos
-    
     print("Analizando cambios de frecuencia válidos...")
-    valid_changes_count = 0
-    
-    for idx, row in df_main.iterrows():
-        has_valid_frequency_change = False
-        frequency_change_diff = None
-        
-        try:
-            freq_json = row['frequency_changes_json']
-            if freq_json and freq_json != '{}':
-                frequencies_dict = json.loads(freq_json)
-                
-                if frequencies_dict:
-                    # Filtrar solo cambios con formato "Every X weeks"
-                    valid_changes = {}
-                    for freq, date_str in frequencies_dict.items():
-                        weeks = extract_weeks_from_frequency(freq)
-                        if weeks is not None:  # Solo incluir cambios válidos
-                            try:
-                                change_date = datetime.strptime(date_str.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                                valid_changes[freq] = date_str
-                                
-                                # Verificar si este cambio está entre la penúltima y última orden
-                                if (pd.notna(row['second_last_order_date']) and 
-                                    pd.notna(row['last_order_date']) and
-                                    row['second_last_order_date'] <= change_date <= row['last_order_date']):
-                                    has_valid_frequency_change = True
-                                
-                            except:
-                                continue
-                    
-                    # Si encontramos cambios válidos en el período
-                    if has_valid_frequency_change:
-                        valid_changes_count += 1
-                        
-                        # Calcular diferencia entre los dos últimos cambios válidos
-                        frequency_change_diff = calculate_frequency_change_difference(valid_changes)
-                        if frequency_change_diff is not None:
-                            frequency_change_differences.append(frequency_change_diff)
-                
-        except (json.JSONDecodeError, ValueError):
-            pass
-        
-        frequency_changes_data.append(has_valid_frequency_change)
-    
-    print(f"Total de cambios de frecuencia válidos en el período: {valid_changes_count}")
+    has_valid_frequency_change, frequency_change_differences = analyze_frequency_changes(df_main)
+    print(f"Total de cambios de frecuencia válidos en el período: {has_valid_frequency_change.sum()}")
     
     # Agregar columna de cambios de frecuencia válidos (ELIMINAMOS days_since_last_frequency_change)
-    df_main['has_valid_frequency_change'] = frequency_changes_data
+    df_main['has_valid_frequency_change'] = has_valid_frequency_change
     
     # Convertir snooze a numérico (1 = snooze, 0 = no snooze)
     df_main['snooze'] = df_main['snooze'].apply(lambda x: 1 if str(x).strip() == '1' else 0)
@@ -532,18 +540,115 @@ def realRenewalFrequency(start_date, end_date, folder_name, fc, name):
         su.additionalFields->>"$.snooze"
     """
 
-    saveFile(folder_name, f'renewal_frequency_paymetErrors_{name}.xlsx', query_main)
+    # snooze, delivery_frequency y fo.status son estado actual: cambian aunque la ventana ya haya cerrado
+    saveFile(folder_name, f'renewal_frequency_paymetErrors_{name}.xlsx', query_main, ONE_DAY)
 
-def saveFile(folder_name, file_name, query_main):
+def saveFile(folder_name, file_name, query_main, main_ttl=None):
     if not os.path.exists(folder_name):
         os.makedirs(folder_name)
 
     # Construir la ruta completa del archivo
     full_path = os.path.join(folder_name, file_name)
-    renewalFrequency(query_main, full_path)
+    renewalFrequency(query_main, full_path, main_ttl)
     #upload_to_drive(full_path, folder_id="1F1VZxlp5IxkQEo4WD0Bt8VEJZ28OhGut")
     #upload_to_dropbox(full_path, dropbox_path=f"/MyReports/{folder_name}/{file_name}")
 
+def query_renewal_orders(start_date, end_date):
+    """
+    Extracto de realRenewalFrequencies para la ventana (start_date, end_date):
+    - órdenes no canceladas con su segmento Full Control ('fc' / 'no_fc', las mismas
+      condiciones de sms_renewal que fullControl / noFullControl)
+    - legacy_category, delivery_frequency y snooze de las suscripciones con órdenes en la ventana
+    """
+    query_orders = f"""
+    SELECT
+        fo.subscription_id,
+        fo.created_at,
+        CASE
+            WHEN so.additionalFields ->> "$.sms_renewal" = "true" THEN 'fc'
+            WHEN so.additionalFields ->> "$.sms_renewal" = "false"
+                OR so.additionalFields ->> "$.sms_renewal" IS NULL THEN 'no_fc'
+        END AS full_control
+    FROM bi.fact_orders fo
+    JOIN prod_sales_and_subscriptions.sales_orders so ON fo.id = so.id
+    WHERE fo.status != 'CANCELLED'
+    AND fo.created_at > '{start_date}'
+    AND fo.created_at < '{end_date}'
+    """
+
+    query_subscriptions = f"""
+    SELECT DISTINCT
+        su.id as subscription_id,
+        sv.legacy_category,
+        sv.delivery_frequency,
+        su.additionalFields->>"$.snooze" AS snooze
+    FROM prod_sales_and_subscriptions.subscriptions su
+    JOIN prod_sales_and_subscriptions.subscriptions_view sv 
+        ON su.id = sv.subscription_id
+    WHERE su.id IN (
+        SELECT fo.subscription_id
+        FROM bi.fact_orders fo
+        JOIN prod_sales_and_subscriptions.sales_orders so ON fo.id = so.id
+        WHERE fo.status != 'CANCELLED'
+        AND fo.created_at > '{start_date}'
+        AND fo.created_at < '{end_date}'
+    )
+    """
+
+    print(f"Ejecutando extracto de órdenes ({start_date} - {end_date})...")
+    # Un día, como las queries de historial completo: fo.status, snooze y la frecuencia
+    # configurada cambian aunque la ventana ya haya cerrado
+    orders = execute_query(query_orders, cache_ttl=ONE_DAY)
+    subscriptions = execute_query(query_subscriptions, cache_ttl=ONE_DAY)
+    print(f"Extracto retornó {len(orders)} órdenes de {subscriptions['subscription_id'].nunique()} suscripciones")
+
+    orders['created_at'] = pd.to_datetime(orders['created_at'])
+    return orders, subscriptions
+
+def last_two_orders(orders, subscriptions, start_date, end_date, full_control=None):
+    """
+    Lo mismo que query_main de realRenewalFrequency, calculado sobre el extracto: última y
+    penúltima orden de cada suscripción en la ventana (solo del segmento `full_control` si se
+    indica) y los días entre ellas, contados por fecha como DATEDIFF.
+    """
+    mask = (orders['created_at'] > pd.Timestamp(start_date)) & (orders['created_at'] < pd.Timestamp(end_date))
+    if full_control is not None:
+        mask &= orders['full_control'] == full_control
+
+    ordered = orders[mask].sort_values(['subscription_id', 'created_at'], ascending=[True, False])
+    last = ordered.groupby('subscription_id').nth(0).set_index('subscription_id')['created_at']
+    second_last = ordered.groupby('subscription_id').nth(1).set_index('subscription_id')['created_at']
+
+    dates = pd.DataFrame({'last_order_date': last, 'second_last_order_date': second_last.reindex(last.index)})
+    dates['days_diff'] = (dates['last_order_date'].dt.normalize() - dates['second_last_order_date'].dt.normalize()).dt.days
+
+    data_main = dates.rename_axis('subscription_id').reset_index().merge(subscriptions, on='subscription_id')
+    return data_main[[
+        'subscription_id', 'legacy_category', 'delivery_frequency', 'snooze',
+        'last_order_date', 'second_last_order_date', 'days_diff'
+    ]]
+
+def realRenewalFrequencies(variants, folder_name):
+    """
+    Un Excel por variante (start_date, end_date, full_control, name), con full_control 'fc',
+    'no_fc' o None para todas las órdenes. Las queries de historial completo y el extracto de
+    órdenes (una ventana que cubre todas las variantes) se ejecutan una sola vez; cada variante
+    se recorta en memoria.
+    """
+    if not os.path.exists(folder_name):
+        os.makedirs(folder_name)
+
+    full_history = load_full_history_tables()
+    start_date = min(variant[0] for variant in variants)
+    end_date = max(variant[1] for variant in variants)
+    orders, subscriptions = query_renewal_orders(start_date, end_date)
+
+    for variant_start, variant_end, full_control, name in variants:
+        print(f"Variante {name}: {variant_start} - {variant_end}")
+        data_main = last_two_orders(orders, subscriptions, variant_start, variant_end, full_control)
+        full_path = os.path.join(folder_name, f'renewal_frequency_paymetErrors_{name}.xlsx')
+        renewal_frequency_report(data_main, full_path, full_history)
+
 noFullControl = f"""
     AND (
         so.additionalFields ->> "$.sms_renewal" = "false" 
@@ -555,14 +660,17 @@ fullControl = f"""
     AND so.additionalFields ->> "$.sms_renewal" = "true"      
 """
 
-realRenewalFrequency('2023-01-01', '2024-01-01', 'rw', noFullControl, 'no_fc_2023')
-realRenewalFrequency('2023-01-01', '2024-01-01', 'rw', fullControl, 'fc_2023')
-realRenewalFrequency('2023-01-01', '2024-01-01', 'rw', "", "2023")
+if __name__ == "__main__":
+    realRenewalFrequencies([
+        ('2023-01-01', '2024-01-01', 'no_fc', 'no_fc_2023'),
+        ('2023-01-01', '2024-01-01', 'fc', 'fc_2023'),
+        ('2023-01-01', '2024-01-01', None, '2023'),
 
-realRenewalFrequency('2024-01-01', '2025-01-01', 'rw', noFullControl, 'no_fc_2024')
-realRenewalFrequency('2024-01-01', '2025-01-01', 'rw', fullControl, 'fc_2024')
-realRenewalFrequency('2024-01-01', '2025-01-01', 'rw', "", "2024")
+        ('2024-01-01', '2025-01-01', 'no_fc', 'no_fc_2024'),
+        ('2024-01-01', '2025-01-01', 'fc', 'fc_2024'),
+        ('2024-01-01', '2025-01-01', None, '2024'),
 
-realRenewalFrequency('2025-01-01', '2025-11-01', 'rw', noFullControl, 'no_fc_2025')
-realRenewalFrequency('2025-01-01', '2025-11-01', 'rw', fullControl, 'fc_2025')
-realRenewalFrequency('2025-01-01', '2025-11-01', 'rw', "", "2025")
\ No newline at end of file
+        ('2025-01-01', '2025-11-01', 'no_fc', 'no_fc_2025'),
+        ('2025-01-01', '2025-11-01', 'fc', 'fc_2025'),
+        ('2025-01-01', '2025-11-01', None, '2025'),
+    ], 'rw')
@@ -9,67 +9,76 @@ from tkinter import Tk, Label, Button, Entry
 from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
-from modules.database_queries import execute_query
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_dataframe_to_excel_orders
+from modules.order_snapshot import get_order_snapshot, not_equal
 from report import anotar_datos_excel
 
 def consulta(start_date, end_date):
 
-    query_orders = f"""
-    SELECT 
-        fo.*,
-        CASE
-            WHEN MAX(CASE WHEN fsoi.itemId = 'IT00000000000000000000000000000107' THEN 1 ELSE 0 END) = 1 
-            THEN fo.units - SUM(CASE WHEN fsoi.itemId = 'IT00000000000000000000000000000107' THEN fsoi.quantity ELSE 0 END)
-            ELSE fo.units
-        END AS validItems
-    FROM 
-        bi.fact_orders fo
-    LEFT JOIN 
-        bi.fact_sales_order_items fsoi ON fsoi.salesOrderId = fo.id
-    WHERE
-        fo.created_at >= '{start_date} 00:00:00' 
-        AND fo.created_at < '{end_date} 00:00:00' 
-        AND fo.status NOT IN ('CANCELLED', 'PAYMENT_ERROR') 
-    GROUP BY 
-        fo.id, fo.order_number, fo.units;  
+    # Órdenes del periodo sin CANCELLED ni PAYMENT_ERROR, sobre la foto compartida de fact_orders
+    snapshot = get_order_snapshot(start_date, end_date)
+    orders = snapshot.orders
+    sO = orders[
+        snapshot.between()
+        & not_equal(orders['status'], 'CANCELLED')
+        & not_equal(orders['status'], 'PAYMENT_ERROR')
+    ].copy()
+    sO['validItems'] = snapshot.valid_items(sO)
+
+    return sO
+
+# Segmentos del reporte: (nombre del archivo, recurrent, is_first_order, order_plan).
+# None significa que esa dimensión no se filtra. El orden es el de unique_orders_var.
+SEGMENTOS = [
+    ('New users - SUBS', 0, 1, 'SUBSCRIPTION'),
+    ('New users - OTO', 0, 1, 'OTO'),
+    ('New users - MIX', 0, 1, 'MIXED'),
+    ('New users - ALL', 0, 1, None),
+    ('Non recurrent orders of existing users - SUBS', 0, 0, 'SUBSCRIPTION'),
+    ('Non recurrent orders of existing users - OTO', 0, 0, 'OTO'),
+    ('Non recurrent orders of existing users - MIX', 0, 0, 'MIXED'),
+    ('Non recurrent orders of existing users - ALL', 0, 0, None),
+    ('Recurrent Orders (ALL)', 1, None, None),
+]
+
+def build_segment_cube(sO):
     """
+    Agrega las órdenes una sola vez por (date, is_first_order, order_plan, recurrent).
+    Cada segmento del reporte se obtiene después filtrando filas de este cubo, en lugar
+    de copiar y agrupar el DataFrame completo por cada segmento.
+    """
+    created_at = pd.to_datetime(sO['created_at'])
 
-    sO = execute_query(query_orders)
-
-    sO_sin_recurrentes = sO[sO['recurrent'] == 0]
-    
-    # Crear grupos por tipo de usuario
-    usuarios_nuevos = sO_sin_recurrentes[sO_sin_recurrentes['is_first_order'] == 1]
-    usuarios_antiguos = sO_sin_recurrentes[sO_sin_recurrentes['is_first_order'] == 0]
-
-    usuarios_nuevos_sub = usuarios_nuevos[usuarios_nuevos['order_plan'] == 'SUBSCRIPTION']
-    usuarios_nuevos_oto = usuarios_nuevos[usuarios_nuevos['order_plan'] == 'OTO']
-    usuarios_nuevos_mix = usuarios_nuevos[usuarios_nuevos['order_plan'] == 'MIXED']
-    
-    usuarios_antiguos_sub = usuarios_antiguos[usuarios_antiguos['order_plan'] == 'SUBSCRIPTION']
-    usuarios_antiguos_oto = usuarios_antiguos[usuarios_antiguos['order_plan'] == 'OTO']
-    usuarios_antiguos_mix = usuarios_antiguos[usuarios_antiguos['order_plan'] == 'MIXED']
+    cube = sO.assign(date=created_at.dt.date).groupby(
+        ['date', 'is_first_order', 'order_plan', 'recurrent'], dropna=False
+    ).agg(
+        total_revenue=('total', 'sum'),
+        total_sales=('order_number', 'count'),
+        total_items=('validItems', 'sum'),
+        total_count=('total', 'count'),
+    ).reset_index()
 
-    sO_con_recurrentes = sO[sO['recurrent'] == 1]
+    return cube
 
-    return usuarios_nuevos_sub, usuarios_nuevos_oto, usuarios_nuevos_mix, usuarios_antiguos_sub, usuarios_antiguos_oto, usuarios_antiguos_mix, sO_con_recurrentes, usuarios_antiguos, usuarios_nuevos
+def segment_slice(cube, recurrent, is_first_order=None, order_plan=None):
+    mask = cube['recurrent'] == recurrent
+    if is_first_order is not None:
+        mask &= cube['is_first_order'] == is_first_order
+    if order_plan is not None:
+        mask &= cube['order_plan'] == order_plan
+    return cube[mask]
 
 def process_data(metrica, start_date, end_date):
-    # Convertir fechas
-    metrica['created_at'] = pd.to_datetime(metrica['created_at'])
-    metrica['date'] = metrica['created_at'].dt.date
-
     # Crear un rango completo de fechas
     all_dates = pd.date_range(start=start_date, end=end_date).date
     all_dates_df = pd.DataFrame({'date': all_dates})
 
-    # Cálculo de valores diarios
+    # Cálculo de valores diarios (sumando las filas del cubo de cada día)
     daily_summary = metrica.groupby('date').agg(
-        total_revenue=('total', 'sum'),
-        total_sales=('order_number', 'count'),
-        total_items=('validItems', 'sum'),
+        total_revenue=('total_revenue', 'sum'),
+        total_sales=('total_sales', 'sum'),
+        total_items=('total_items', 'sum'),
     ).reset_index()
 
     # Fusionar con todas las fechas
@@ -85,9 +94,9 @@ def process_data(metrica, start_date, end_date):
     ).where(daily_summary['total_sales'] > 0, 0)  # Forzar a 0 si total_sales es 0
 
     # Cálculo de totales generales
-    suma_total = metrica['total'].sum()
-    total_ventas = metrica['total'].count()
-    total_items = metrica['validItems'].sum()
+    suma_total = metrica['total_revenue'].sum()
+    total_ventas = metrica['total_count'].sum()
+    total_items = metrica['total_items'].sum()
     average_items = total_items / total_ventas if total_ventas > 0 else 0
     average_value = suma_total / total_ventas if total_ventas > 0 else 0
 
@@ -118,7 +127,7 @@ def documento(resumeData, file_name, folder_name, dropbox_var, drive_var):
 
 def get_orders(start_date, end_date, folder_name, unique_orders_var, dropbox_var, drive_var):
 
-    usuarios_nuevos_sub, usuarios_nuevos_oto, usuarios_nuevos_mix, usuarios_antiguos_sub, usuarios_antiguos_oto, usuarios_antiguos_mix, recurrentes, usuarios_antiguos, usuarios_nuevos = consulta(start_date, end_date)
+    cube = build_segment_cube(consulta(start_date, end_date))
 
     #------------------------------------------------------------------------------------------------
 
@@ -129,71 +138,13 @@ def get_orders(start_date, end_date, folder_name, unique_orders_var, dropbox_var
     values = []
     urls = []
 
-    if(unique_orders_var[0] == 1):
-        data_usuarios_nuevos_sub, average_items, average_value = process_data(usuarios_nuevos_sub, start_date, new_end_date)
-        url = documento(data_usuarios_nuevos_sub, f'New users - SUBS', folder_name, dropbox_var, drive_var)
-        items.insert(0, average_items)
-        values.insert(0, average_value)
-        urls.insert(0, url)    
-
-    if(unique_orders_var[1] == 1):
-        data_usuarios_nuevos_oto, average_items, average_value = process_data(usuarios_nuevos_oto, start_date, new_end_date)
-        url = documento(data_usuarios_nuevos_oto, f'New users - OTO', folder_name, dropbox_var, drive_var)
-        items.insert(1, average_items)
-        values.insert(1, average_value)
-        urls.insert(1, url)
-
-    if(unique_orders_var[2] == 1):
-        data_usuarios_nuevos_mix, average_items, average_value = process_data(usuarios_nuevos_mix, start_date, new_end_date)
-        url = documento(data_usuarios_nuevos_mix, f'New users - MIX', folder_name, dropbox_var, drive_var)
-        items.insert(2, average_items)
-        values.insert(2, average_value)
-        urls.insert(2, url)
-
-    if(unique_orders_var[3] == 1):
-        data_usuarios_nuevos, average_items, average_value = process_data(usuarios_nuevos, start_date, new_end_date)
-        url = documento(data_usuarios_nuevos, f'New users - ALL', folder_name, dropbox_var, drive_var)
-        items.insert(3, average_items)
-        values.insert(3, average_value)
-        urls.insert(3, url)
-
-    if(unique_orders_var[4] == 1):
-        data_usuarios_antiguos_sub, average_items, average_value = process_data(usuarios_antiguos_sub, start_date, new_end_date)
-        url = documento(data_usuarios_antiguos_sub, f'Non recurrent orders of existing users - SUBS', folder_name, dropbox_var, drive_var)
-        items.insert(4, average_items)
-        values.insert(4, average_value)
-        urls.insert(4, url)
-
-    if(unique_orders_var[5] == 1):
-        data_usuarios_antiguos_oto, average_items, average_value = process_data(usuarios_antiguos_oto, start_date, new_end_date)
-        url = documento(data_usuarios_antiguos_oto, f'Non recurrent orders of existing users - OTO', folder_name, dropbox_var, drive_var)
-        items.insert(5, average_items)
-        values.insert(5, average_value)
-        urls.insert(5, url)
-
-    if(unique_orders_var[6] == 1):
-        data_usuarios_antiguos_mix, average_items, average_value = process_data(usuarios_antiguos_mix, start_date, new_end_date)
-        url = documento(data_usuarios_antiguos_mix, f'Non recurrent orders of existing users - MIX', folder_name, dropbox_var, drive_var)
-        items.insert(6, average_items)
-        values.insert(6, average_value)
-        urls.insert(6, url)
-
-    if(unique_orders_var[7] == 1):
-        data_usuarios_antiguos, average_items, average_value = process_data(usuarios_antiguos, start_date, new_end_date)
-        url = documento(data_usuarios_antiguos, f'Non recurrent orders of existing users - ALL', folder_name, dropbox_var, drive_var)
-        items.insert(7, average_items)
-        values.insert(7, average_value)
-        urls.insert(7, url)
-
-    if(unique_orders_var[8] == 1):
-        data_recurrentes, average_items, average_value = process_data(recurrentes, start_date, new_end_date)
-        url = documento(data_recurrentes, f'Recurrent Orders (ALL)', folder_name, dropbox_var, drive_var)
-        items.insert(8, average_items)
-        values.insert(8, average_value)
-        urls.insert(8, url)
+    for i, (file_name, recurrent, is_first_order, order_plan) in enumerate(SEGMENTOS):
+        if(unique_orders_var[i] == 1):
+            metrica = segment_slice(cube, recurrent, is_first_order, order_plan)
+            data, average_items, average_value = process_data(metrica, start_date, new_end_date)
+            url = documento(data, file_name, folder_name, dropbox_var, drive_var)
+            items.append(average_items)
+            values.append(average_value)
+            urls.append(url)
 
     return values, items, urls
-
-
-
-
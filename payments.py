@@ -1,12 +1,37 @@
 import pandas as pd
-import json
 from modules.database_queries import execute_query
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_error_reasons_with_chart
+from modules.payment_metadata import extract_decline_codes
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill
 from openpyxl.utils.dataframe import dataframe_to_rows
 
+def payment_lifecycle(sP):
+    """
+    Ciclo de errores de pago por entityId, sin recorrer los grupos en Python.
+
+    - first_error_date: día del primer pago de la entidad, solo si ese primer pago falló
+    - resolved_date: día del primer pago exitoso, solo si la entidad tuvo algún fallo
+    - metadata: metadatos del primer pago cuando es un fallo
+    """
+    pagos = sP[sP['entityId'].notna()].sort_values('createdAt', kind='stable')
+
+    # Primer pago de cada entidad
+    primeros = pagos.drop_duplicates('entityId').set_index('entityId')
+    primer_fallo = primeros[primeros['status'] == 'FAILED']
+
+    # Primer pago exitoso de las entidades con algún fallo
+    con_fallo = pagos.loc[pagos['status'] == 'FAILED', 'entityId'].unique()
+    exitos = pagos[(pagos['status'] == 'SUCCESS') & pagos['entityId'].isin(con_fallo)]
+    primer_exito = exitos.drop_duplicates('entityId').set_index('entityId')
+
+    grouped = pd.DataFrame(index=primeros.index.sort_values())
+    grouped['first_error_date'] = primer_fallo['createdAt'].dt.normalize()
+    grouped['resolved_date'] = primer_exito['createdAt'].dt.normalize()
+    grouped['metadata'] = primer_fallo['metadata']
+    return grouped
+
 def process_data(start_date, end_date):
 
     start_date = pd.to_datetime(start_date)
@@ -25,34 +50,12 @@ def process_data(start_date, end_date):
     sP['createdAt'] = pd.to_datetime(sP['createdAt'])
     sP['date'] = sP['createdAt'].dt.date
 
-    # Agrupar por entityId para procesar métricas
-    def calculate_metrics(group):
-        group = group.sort_values('createdAt')
+    # Métricas por entityId (primer error, resolución y metadatos del primer error)
+    grouped = payment_lifecycle(sP)
 
-        # Identificar el primer pago fallido
-        first_failed = group.iloc[0] if group.iloc[0]['status'] == 'FAILED' else None
-
-        # Identificar el primer pago exitoso después de un fallo
-        resolved_date = None
-        if 'FAILED' in group['status'].values and 'SUCCESS' in group['status'].values:
-            success_row = group[group['status'] == 'SUCCESS'].iloc[0]
-            resolved_date = success_row['createdAt'].date()
-
-        return pd.Series({
-            'first_error_date': first_failed['createdAt'].date() if first_failed is not None else None,
-            'resolved_date': resolved_date,
-            'metadata': first_failed['metadata'] if first_failed is not None else None  # Guardar metadatos del primer error
-        })
-
-    grouped = sP.groupby('entityId').apply(calculate_metrics)
-
-    # Filtrar grupos con errores válidos según el rango de fechas
-    grouped['is_error_in_range'] = grouped['first_error_date'].apply(
-        lambda x: 1 if x and x >= start_date.date() else 0
-    )
-    grouped['is_resolved_in_range'] = grouped['resolved_date'].apply(
-        lambda x: 1 if x and x >= start_date.date() else 0
-    )
+    # Filtrar grupos con errores válidos según el rango de fechas (NaT nunca cumple)
+    grouped['is_error_in_range'] = (grouped['first_error_date'] >= start_date).astype(int)
+    grouped['is_resolved_in_range'] = (grouped['resolved_date'] >= start_date).astype(int)
 
     # Contar grupos válidos
     error_group_count = grouped['is_error_in_range'].sum()
@@ -60,7 +63,7 @@ def process_data(start_date, end_date):
     # Crear un DataFrame para métricas diarias de errores
     errors_by_day = (
         grouped[grouped['is_error_in_range'] == 1]
-        .groupby('first_error_date')
+        .groupby(grouped['first_error_date'].dt.date.rename('first_error_date'))
         .size()
         .reset_index(name='daily_errors')
         .rename(columns={'first_error_date': 'date'})
@@ -69,7 +72,7 @@ def process_data(start_date, end_date):
     # Crear un DataFrame para métricas diarias de resoluciones
     resolved_by_day = (
         grouped[grouped['is_resolved_in_range'] == 1]
-        .groupby('resolved_date')
+        .groupby(grouped['resolved_date'].dt.date.rename('resolved_date'))
         .size()
         .reset_index(name='daily_resolved')
         .rename(columns={'resolved_date': 'date'})
@@ -95,17 +98,9 @@ def process_data(start_date, end_date):
     # Concatenar resumen total con los datos diarios
     daily_summary = pd.concat([daily_summary, totals_row], ignore_index=True)
 
-    # Calcular razones de error basadas en el primer fallo de cada grupo dentro del rango
-    def extract_decline_code(metadata):
-        try:
-            metadata_dict = json.loads(metadata)
-            return metadata_dict.get('stripeError', {}).get('error', {}).get('decline_code', 'unknown_error')
-        except (json.JSONDecodeError, TypeError):
-            return 'invalid_metadata'
-
-    # Filtrar solo los primeros errores de cada grupo en el rango
-    first_errors_in_range = grouped[grouped['is_error_in_range'] == 1]
-    first_errors_in_range['decline_code'] = first_errors_in_range['metadata'].apply(extract_decline_code)
+    # Filtrar solo los primeros errores de cada grupo en el rango y extraer su razón de error
+    first_errors_in_range = grouped[grouped['is_error_in_range'] == 1].copy()
+    first_errors_in_range['decline_code'] = extract_decline_codes(first_errors_in_range['metadata'])
 
     # Contar razones de error
     error_reasons = first_errors_in_range['decline_code'].value_counts().reset_index()
@@ -235,8 +235,7 @@ def realRenewalFrequency(start_date, end_date, folder_name):
 
 def saveFile(folder_name, file_name, query):
 
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
+    os.makedirs(folder_name, exist_ok=True)
 
     # Construir la ruta completa del archivo
     full_path = os.path.join(folder_name, file_name)
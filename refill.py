@@ -9,43 +9,30 @@ from tkinter import Tk, Label, Button, Entry
 from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
-from modules.database_queries import execute_query
+from modules.order_snapshot import get_order_snapshot, first_item_per_order, not_equal
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_dataframe_to_excel_orders
 from report import anotar_datos_excel
 
 def refill(start_date, end_date):
 
-    query_refill = f"""
-        SELECT SI.itemId, SO.order_number, SO.status, SO.created_at, SO.is_first_order, SI.quantity, SO.units
-        FROM bi.fact_orders SO
-        JOIN bi.fact_customers CU ON CU.id = SO.customer_id
-        RIGHT JOIN bi.fact_sales_order_items SI 
-            ON SI.salesOrderId = SO.id
-        WHERE SI.category in ('IG00000000000000000000000000000044', 'IG00000000000000000000000000000043', 'IG00000000000000000000000000000041')
-        AND SO.created_at > "{start_date}" AND SO.created_at < "{end_date}"
-        AND SO.status <> "CANCELLED"
-        AND SO.recurrent = false
-        GROUP BY SO.id
-        ORDER BY SO.created_at DESC;
-    """
-
-    query_total_oto_beard = f"""
-        SELECT distinct
-            fo.order_number, 
-            fo.created_at, 
-            so.category, 
-            fo.is_first_order
-        FROM bi.fact_orders fo
-        JOIN bi.fact_sales_order_items so ON fo.id = so.salesOrderId
-        where fo.status <> "CANCELLED"
-        and fo.created_at > "{start_date}" AND fo.created_at < "{end_date}"
-        and fo.order_plan = "OTO"
-        and so.category in ("IG00000000000000000000000000000029");
-    """
-
-    rt = execute_query(query_refill)
-    otob = execute_query(query_total_oto_beard)
+    # Ítems de órdenes no canceladas del periodo (created_at > start y < end), sobre la foto compartida
+    snapshot = get_order_snapshot(start_date, end_date)
+    items = snapshot.order_items()
+    items = items[snapshot.between(start_inclusive=False, data=items) & not_equal(items['status'], 'CANCELLED')]
+
+    # Órdenes no recurrentes con algún refill (una fila por orden)
+    rt = first_item_per_order(items[
+        items['has_customer']
+        & items['category'].isin(['IG00000000000000000000000000000044', 'IG00000000000000000000000000000043', 'IG00000000000000000000000000000041'])
+        & (items['recurrent'] == 0)
+    ])
+
+    # Órdenes OTO con productos de barba
+    otob = items[
+        (items['order_plan'] == 'OTO')
+        & (items['category'] == 'IG00000000000000000000000000000029')
+    ].drop_duplicates(['order_number', 'created_at', 'category', 'is_first_order'])
 
     total_orders = rt['order_number'].count()
     new_customers = rt['is_first_order'].sum()
@@ -9,21 +9,21 @@ from tkinter import Tk, Label, Button, Entry
 from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
-from modules.database_queries import execute_query
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel
+from modules.order_snapshot import get_order_snapshot, not_equal
 
 def process_data(start_date, end_date):
 
-    query_orders = f"""
-    SELECT *
-    FROM bi.fact_orders
-    WHERE created_at >= '{start_date} 00:00:00' -- Fecha de inicio
-    AND created_at < '{end_date} 00:00:00' -- Fecha actual
-    AND status NOT IN ('CANCELLED', 'PAYMENT_ERROR')
-    AND is_first_order <> 1;
-    """
-    sO = execute_query(query_orders)
+    # Órdenes que no son primera compra, sin CANCELLED ni PAYMENT_ERROR (foto compartida de fact_orders)
+    snapshot = get_order_snapshot(start_date, end_date)
+    orders = snapshot.orders
+    sO = orders[
+        snapshot.between()
+        & not_equal(orders['status'], 'CANCELLED')
+        & not_equal(orders['status'], 'PAYMENT_ERROR')
+        & not_equal(orders['is_first_order'], 1)
+    ].copy()
 
     sO_sin_recurrentes = sO[sO['recurrent'] == 0]
     sO_con_recurrentes = sO[sO['recurrent'] == 1]
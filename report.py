@@ -10,42 +10,147 @@ hoja_report = "Report"
 hoja_files = "Files" 
 
 
-def anotar_datos_excel(datos, columna_inicio, fila_inicio, urls=False, month = '', primer_uso=False):
-    
-    archivo_excel = 'Monthly Report.xlsx'
-    nuevo_archivo = f'Monthly Report {month}.xlsx'
+class ReportWriter:
+    """
+    Sesión de escritura sobre el Monthly Report.
 
-    if primer_uso == False:
-        archivo_excel = nuevo_archivo
+    Abre el libro una sola vez, acumula las escrituras (hoja, fila, columna, valores) y
+    las vuelca todas con un único `wb.save` al llamar a `flush()`/`close()`. Mientras la
+    sesión está activa, `anotar_datos_excel` encola en ella en lugar de abrir y guardar
+    el archivo en cada llamada.
+    """
 
-    try:
-        # Intentar cargar el archivo Excel existente
-        wb = load_workbook(archivo_excel)
-    except FileNotFoundError:
-        print(f"El archivo '{archivo_excel}' no existe.")
-        return
+    def __init__(self, month='', primer_uso=False):
+        archivo_excel = 'Monthly Report.xlsx'
+        self.nuevo_archivo = f'Monthly Report {month}.xlsx'
 
-    # Seleccionar o crear la hoja donde escribirás los datos
-    if(urls):
-        ws = wb[hoja_files]
-    else:
-        ws = wb[hoja_report]
+        if primer_uso == False:
+            archivo_excel = self.nuevo_archivo
+
+        self.month = month
+        self.pendientes = []
+        self.indices = {}
 
-    # Escribir los datos en las celdas
-    for i, valor in enumerate(datos, start=fila_inicio):
         try:
-            ws.cell(row=i, column=columna_inicio, value=valor)
-        except AttributeError:
-            cell = ws.cell(row=i, column=columna_inicio)
-            for merged_range in ws.merged_cells.ranges:
-                if cell.coordinate in merged_range:
-                    # Encontrar la celda principal (superior izquierda) del rango combinado
-                    top_left_cell = ws.cell(row=merged_range.min_row, column=merged_range.min_col)
-                    top_left_cell.value = valor
-                    break
-
-    # Guardar los cambios en el archivo (nuevo o existente)
-    wb.save(nuevo_archivo)
+            # Intentar cargar el archivo Excel existente
+            self.wb = load_workbook(archivo_excel)
+        except FileNotFoundError:
+            print(f"El archivo '{archivo_excel}' no existe.")
+            self.wb = None
+
+    def write(self, datos, columna_inicio, fila_inicio, urls=False):
+        """Encola los valores de `datos` hacia abajo desde (fila_inicio, columna_inicio)."""
+        hoja = hoja_files if urls else hoja_report
+        self.pendientes.append((hoja, fila_inicio, columna_inicio, list(datos)))
+
+    def flush(self):
+        """Aplica las escrituras pendientes y guarda el archivo una sola vez."""
+        if self.wb is None or not self.pendientes:
+            self.pendientes = []
+            return
+
+        for hoja, fila_inicio, columna_inicio, datos in self.pendientes:
+            ws = self.wb[hoja]
+            if hoja not in self.indices:
+                self.indices[hoja] = MergedCellIndex(ws)
+            for i, valor in enumerate(datos, start=fila_inicio):
+                _escribir_celda(ws, i, columna_inicio, valor, self.indices[hoja])
+        self.pendientes = []
+
+        # Guardar los cambios en el archivo (nuevo o existente)
+        self.wb.save(self.nuevo_archivo)
+
+    def activate(self):
+        """Hace que `anotar_datos_excel` encole en esta sesión."""
+        global _sesion_activa
+        _sesion_activa = self
+        return self
+
+    def close(self):
+        """Guarda los cambios pendientes y desactiva la sesión."""
+        self.flush()
+        self._deactivate()
+
+    def _deactivate(self):
+        global _sesion_activa
+        if _sesion_activa is self:
+            _sesion_activa = None
+
+    def __enter__(self):
+        return self.activate()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self._deactivate()
+
+
+_sesion_activa = None
+
+
+class MergedCellIndex:
+    """
+    Índice (fila, columna) -> rango combinado para las celdas de una hoja.
+
+    Se construye una vez por hoja para no recorrer `ws.merged_cells.ranges` en cada
+    escritura. Antes de usar una entrada se comprueba que el rango siga combinado; si
+    las combinaciones cambiaron, el índice se reconstruye.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._rebuild()
+
+    def _rebuild(self):
+        self.rangos = {}
+        for merged_range in self.ws.merged_cells.ranges:
+            for fila in range(merged_range.min_row, merged_range.max_row + 1):
+                for columna in range(merged_range.min_col, merged_range.max_col + 1):
+                    self.rangos[(fila, columna)] = merged_range
+
+    def _vigente(self, merged_range, fila, columna):
+        return (
+            merged_range is not None
+            and merged_range in self.ws.merged_cells.ranges
+            and merged_range.min_row <= fila <= merged_range.max_row
+            and merged_range.min_col <= columna <= merged_range.max_col
+        )
+
+    def top_left(self, fila, columna):
+        """Devuelve (fila, columna) de la celda principal del rango que contiene la celda, o None."""
+        merged_range = self.rangos.get((fila, columna))
+        if not self._vigente(merged_range, fila, columna):
+            self._rebuild()
+            merged_range = self.rangos.get((fila, columna))
+            if merged_range is None:
+                return None
+        return merged_range.min_row, merged_range.min_col
+
+
+def _escribir_celda(ws, fila, columna, valor, indice=None):
+    try:
+        ws.cell(row=fila, column=columna, value=valor)
+    except AttributeError:
+        # Celda combinada: se escribe en la celda principal (superior izquierda) del rango
+        if indice is None:
+            indice = MergedCellIndex(ws)
+        anchor = indice.top_left(fila, columna)
+        if anchor is not None:
+            ws.cell(row=anchor[0], column=anchor[1]).value = valor
+
+
+def anotar_datos_excel(datos, columna_inicio, fila_inicio, urls=False, month = '', primer_uso=False):
+    """
+    Escribe `datos` en el Monthly Report. Si hay una `ReportWriter` activa solo encola la
+    escritura; si no, abre el archivo, escribe y guarda en el momento.
+    """
+    if _sesion_activa is not None:
+        _sesion_activa.write(datos, columna_inicio, fila_inicio, urls)
+        return
+
+    reporte = ReportWriter(month, primer_uso)
+    reporte.write(datos, columna_inicio, fila_inicio, urls)
+    reporte.flush()
 
 def seleccionar_tipo_de_reporte():
     """
@@ -1,6 +1,6 @@
 import pandas as pd
+import numpy as np
 import json
-from collections import defaultdict
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 import tkinter as tk
@@ -362,143 +362,296 @@ def ajustar_ancho_columnas(archivo_excel):
     except Exception as e:
         print(f"Error ajustando el ancho de columnas: {e}")
 
-def procesar_datos_diagnostico(df, filtro_items=None):
+def _expandir(codigos, listas):
+    """
+    Expande listas parseadas una vez por valor distinto (`listas[codigo]`) a una fila por
+    elemento y por fila del DataFrame. Devuelve (posición de la fila, posición del elemento
+    en la lista aplanada), en el orden original de filas y de elementos.
+    """
+    longitudes = np.array([len(lista) for lista in listas], dtype=np.int64)
+    inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1]))
+
+    filas = np.flatnonzero(codigos >= 0)
+    codigos = codigos[filas]
+    repeticiones = longitudes[codigos]
+    total = int(repeticiones.sum())
+
+    fila = np.repeat(filas, repeticiones)
+    desplazamiento = np.repeat(inicios[codigos] - (np.cumsum(repeticiones) - repeticiones), repeticiones)
+    return fila, desplazamiento + np.arange(total)
+
+def construir_indice_diagnostico(df):
+    """
+    Parsea una sola vez los diagnósticos y los ítems de la primera orden de `df` (cada
+    JSON distinto se parsea una vez) y devuelve dos tablas largas:
+    - 'diagnostico': una fila por variable:value del diagnóstico de cada cliente, con el
+      producto traducido y si recompró, en el mismo orden en que aparecen en `df`
+    - 'items': una fila por ítem de la primera orden de cada cliente
+    La columna `fila` es la posición del cliente en `df`.
+    """
+    recompro = (df['total_custom_orders'] > 1).to_numpy(dtype=bool)
+
+    codigos, diagnosticos = pd.factorize(df['diagnostic'])
+    traducciones = {}
+    listas = []
+    for diagnostico in diagnosticos:
+        productos = []
+        for variable, value in parse_diagnostico(diagnostico):
+            clave = (variable, value)
+            if clave not in traducciones:
+                traducciones[clave] = traducir_producto(variable, value)
+            productos.append(clave)
+        listas.append(productos)
+
+    fila, posicion = _expandir(codigos, listas)
+    claves = [clave for productos in listas for clave in productos]
+    variables = np.array([variable for variable, _ in claves], dtype=np.int64)
+    valores = np.array([value for _, value in claves], dtype=object)
+    productos = np.array([traducciones[clave] for clave in claves], dtype=object)
+
+    indice_diagnostico = pd.DataFrame({
+        'fila': fila,
+        'customer_id': df['customer_id'].to_numpy()[fila],
+        'variable': variables[posicion],
+        'value': valores[posicion],
+        'producto': productos[posicion],
+        'recompro': recompro[fila],
+    })
+
+    codigos, items_json = pd.factorize(df['first_order_items'])
+    listas = [parse_items(items) for items in items_json]
+    fila, posicion = _expandir(codigos, listas)
+    items = np.empty(sum(len(lista) for lista in listas), dtype=object)
+    items[:] = [item for lista in listas for item in lista]
+
+    indice_items = pd.DataFrame({'fila': fila, 'item': items[posicion]})
+
+    return {'diagnostico': indice_diagnostico, 'items': indice_items}
+
+def procesar_datos_diagnostico(df, filtro_items=None, indice=None):
     """
     Procesa el DataFrame y genera el análisis de recompra por producto del diagnóstico
     Si se proporciona filtro_items, solo incluye órdenes que contengan ese item
+    `indice` es el de construir_indice_diagnostico(df), para no volver a parsear los JSON
     """
-    # Filtrar el DataFrame si se especifica un item
+    if indice is None:
+        indice = construir_indice_diagnostico(df)
+    productos = indice['diagnostico']
+
+    # Filtrar los clientes si se especifica un item
     if filtro_items:
-        df_filtrado = df[df['first_order_items'].apply(
-            lambda x: filtro_items in parse_items(x) if pd.notna(x) else False
-        )]
-    else:
-        df_filtrado = df
-    
-    # Diccionario para almacenar resultados
-    resultados = defaultdict(lambda: {'recompraron': 0, 'no_recompraron': 0})
-    
-    if df_filtrado.size == 0:
+        items = indice['items']
+        filas = items.loc[items['item'] == filtro_items, 'fila'].unique()
+        if len(filas) == 0:
+            return pd.DataFrame()
+        productos = productos[productos['fila'].isin(filas)]
+    elif df.size == 0:
         return pd.DataFrame()
-    
-    for _, row in df_filtrado.iterrows():
-        diagnostico = row['diagnostic']
-        total_compras = row['total_custom_orders']
-        
-        # Saltar si no hay diagnóstico
-        if pd.isna(diagnostico):
-            continue
-            
-        # Parsear el diagnóstico
-        productos_raw = parse_diagnostico(diagnostico)
-        
-        # Procesar cada producto del diagnóstico
-        for variable, value in productos_raw:
-            # Excluir variables relacionadas con USER FIRST NAME (variable 27)
-            if variable == 27:
-                continue
-                
-            producto = traducir_producto(variable, value)
-            
-            # Contar recompra o no recompra
-            if total_compras > 1:
-                resultados[producto]['recompraron'] += 1
-            else:
-                resultados[producto]['no_recompraron'] += 1
-    
-    # Convertir a DataFrame
-    df_resultado = pd.DataFrame([
-        {
-            'Producto': producto,
-            'Usuarios que recompraron': stats['recompraron'],
-            'Usuarios que no recompraron': stats['no_recompraron'],
-            'Total de usuarios': stats['recompraron'] + stats['no_recompraron'],
-            'Porcentaje de recompra': (stats['recompraron'] / (stats['recompraron'] + stats['no_recompraron'])) * 100 
-            if (stats['recompraron'] + stats['no_recompraron']) > 0 else 0
-        }
-        for producto, stats in resultados.items()
-    ])
+
+    # Excluir variables relacionadas con USER FIRST NAME (variable 27)
+    productos = productos[productos['variable'] != 27]
+
+    # Contar recompra o no recompra por producto, en orden de aparición
+    conteo = productos.groupby('producto', sort=False)['recompro'].agg(['sum', 'size'])
+    recompraron = conteo['sum'].to_numpy(dtype=np.int64)
+    total = conteo['size'].to_numpy(dtype=np.int64)
+
+    df_resultado = pd.DataFrame({
+        'Producto': conteo.index,
+        'Usuarios que recompraron': recompraron,
+        'Usuarios que no recompraron': total - recompraron,
+        'Total de usuarios': total,
+        'Porcentaje de recompra': recompraron / total * 100,
+    })
     
     # Ordenar por total de usuarios (descendente)
     df_resultado = df_resultado.sort_values('Total de usuarios', ascending=False)
     
     return df_resultado
 
-def procesar_datos_combinaciones_diagnostico(df, combinaciones):
+# Variables que nunca se cruzan en el escaneo de combinaciones (datos personales)
+VARIABLES_EXCLUIDAS_ESCANEO = {27, 29, 35}
+
+def matriz_diagnostico(indice, n_filas, tokens):
+    """
+    Matriz booleana clientes x tokens `variable:value` (producto traducido) a partir del
+    índice de construir_indice_diagnostico. Solo se crean columnas para `tokens`, para no
+    materializar los de alta cardinalidad (nombres, emails...).
+    """
+    tokens = pd.Index(tokens)
+    productos = indice['diagnostico']
+    columnas = tokens.get_indexer(productos['producto'])
+    presentes = columnas >= 0
+
+    matriz = np.zeros((n_filas, len(tokens)), dtype=bool)
+    matriz[productos['fila'].to_numpy()[presentes], columnas[presentes]] = True
+    return matriz
+
+def _tabla_combinaciones(nombres, variables, recompraron, total):
+    recompraron = np.asarray(recompraron, dtype=np.int64)
+    total = np.asarray(total, dtype=np.int64)
+    df_resultado = pd.DataFrame({
+        'Combinación': nombres,
+        'Variables': variables,
+        'Usuarios que recompraron': recompraron,
+        'Usuarios que no recompraron': total - recompraron,
+        'Total de usuarios': total,
+        'Porcentaje de recompra': recompraron / total * 100,
+    })
+
+    # Ordenar por total de usuarios (descendente)
+    return df_resultado.sort_values('Total de usuarios', ascending=False)
+
+def procesar_datos_combinaciones_diagnostico(df, combinaciones, indice=None):
     """
     Procesa el DataFrame y genera el análisis de recompra por combinaciones de variables:values
+    Cada combinación es un AND de columnas de la matriz clientes x tokens del diagnóstico
     """
-    # Diccionario para almacenar resultados
-    resultados = defaultdict(lambda: {'recompraron': 0, 'no_recompraron': 0})
-    
     if df.size == 0:
         return pd.DataFrame()
-    
-    for _, row in df.iterrows():
-        diagnostico = row['diagnostic']
-        total_compras = row['total_custom_orders']
-        
-        # Saltar si no hay diagnóstico
-        if pd.isna(diagnostico):
-            continue
-            
-        # Parsear el diagnóstico
-        productos_raw = parse_diagnostico(diagnostico)
-        diagnostico_traducido = [traducir_producto(variable, value) for variable, value in productos_raw]
-        
-        # Verificar cada combinación
-        for nombre_combinacion, variables_combinacion in combinaciones.items():
-            # Verificar si todos los elementos de la combinación están en el diagnóstico
-            todos_presentes = all(variable in diagnostico_traducido for variable in variables_combinacion)
-            
-            if todos_presentes:
-                # Contar recompra o no recompra para esta combinación
-                if total_compras > 1:
-                    resultados[nombre_combinacion]['recompraron'] += 1
-                else:
-                    resultados[nombre_combinacion]['no_recompraron'] += 1
-    
-    # Convertir a DataFrame
-    df_resultado = pd.DataFrame([
-        {
-            'Combinación': combinacion,
-            'Variables': ', '.join(combinaciones[combinacion]),
-            'Usuarios que recompraron': stats['recompraron'],
-            'Usuarios que no recompraron': stats['no_recompraron'],
-            'Total de usuarios': stats['recompraron'] + stats['no_recompraron'],
-            'Porcentaje de recompra': (stats['recompraron'] / (stats['recompraron'] + stats['no_recompraron'])) * 100 
-            if (stats['recompraron'] + stats['no_recompraron']) > 0 else 0
-        }
-        for combinacion, stats in resultados.items()
-    ])
-    
-    # Ordenar por total de usuarios (descendente)
-    df_resultado = df_resultado.sort_values('Total de usuarios', ascending=False)
-    
-    return df_resultado
 
-def procesar_rango_fechas(start_date, end_date, endDateActual, nombre_rango, categoryType, purchaseType):
+    if indice is None:
+        indice = construir_indice_diagnostico(df)
+
+    tokens = pd.Index(sorted({token for variables in combinaciones.values() for token in variables}))
+    matriz = matriz_diagnostico(indice, len(df), tokens)
+    con_diagnostico = df['diagnostic'].notna().to_numpy()
+    recompro = (df['total_custom_orders'] > 1).to_numpy(dtype=bool)
+
+    encontradas = []
+    for orden, (nombre_combinacion, variables_combinacion) in enumerate(combinaciones.items()):
+        # Clientes con diagnóstico que tienen todos los elementos de la combinación
+        columnas = tokens.get_indexer(list(variables_combinacion))
+        presentes = con_diagnostico & matriz[:, columnas].all(axis=1)
+        if presentes.any():
+            # Mismo orden de aparición que el recorrido fila a fila
+            encontradas.append((presentes.argmax(), orden, nombre_combinacion, presentes))
 
-    cType = ''
-    if categoryType == 'Beard':
-        cType = 'IG00000000000000000000000000000029'
-        items = ('IT00000000000000000000001004170007','IT00000000000000000000001004170006', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170012', 'IT00000000000000000000001004170013')
-    elif categoryType == 'Hair':
-        cType = 'IG00000000000000000000000000000028'
-        items = ('IT00000000000000000000001004170001','IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170009', 'IT00000000000000000000001004170010', 'IT00000000000000000000001004170011', 'IT00000000000000000000001004170014')
+    if not encontradas:
+        return pd.DataFrame()
+    encontradas.sort(key=lambda encontrada: encontrada[:2])
+
+    return _tabla_combinaciones(
+        [nombre for _, _, nombre, _ in encontradas],
+        [', '.join(combinaciones[nombre]) for _, _, nombre, _ in encontradas],
+        [(presentes & recompro).sum() for *_, presentes in encontradas],
+        [presentes.sum() for *_, presentes in encontradas],
+    )
+
+def escanear_combinaciones_diagnostico(df, tamano=2, min_usuarios=30, indice=None):
+    """
+    Análisis de recompra de todas las combinaciones de `tamano` (2 o 3) respuestas del
+    diagnóstico, de variables distintas, con al menos `min_usuarios` clientes.
+
+    Los conteos salen de productos de la matriz clientes x tokens (co-ocurrencias), así que
+    no se evalúa cada combinación por separado; para los tríos solo se expanden los pares
+    que ya alcanzan `min_usuarios`.
+    """
+    if df.size == 0 or tamano not in (2, 3):
+        return pd.DataFrame()
+
+    if indice is None:
+        indice = construir_indice_diagnostico(df)
+
+    productos = indice['diagnostico']
+    productos = productos[~productos['variable'].isin(VARIABLES_EXCLUIDAS_ESCANEO)]
+    soporte = productos.drop_duplicates(['fila', 'producto'])['producto'].value_counts()
+    tokens = pd.Index(sorted(soporte.index[soporte >= min_usuarios]))
+    variable_token = productos.drop_duplicates('producto').set_index('producto')['variable'].reindex(tokens).to_numpy()
+
+    matriz = matriz_diagnostico(indice, len(df), tokens).astype(np.float32)
+    recompro = (df['total_custom_orders'] > 1).to_numpy(dtype=np.float32)
+
+    # Co-ocurrencias de cada par de tokens: total de clientes y cuántos recompraron
+    total = matriz.T @ matriz
+    recompraron = matriz.T @ (matriz * recompro[:, None])
+    distinta_variable = variable_token[:, None] != variable_token[None, :]
+    i, j = np.nonzero(np.triu(distinta_variable & (total >= min_usuarios), k=1))
+
+    if tamano == 2:
+        combinaciones = [(tokens[a], tokens[b]) for a, b in zip(i, j)]
+        conteo_total = total[i, j]
+        conteo_recompra = recompraron[i, j]
+    else:
+        combinaciones, conteo_total, conteo_recompra = [], [], []
+        pares = pd.DataFrame({'i': i, 'j': j})
+        for a, pares_a in pares.groupby('i'):
+            # Solo los clientes con el token `a`; se cruzan sus pares (b, c) con b < c
+            filas = matriz[:, a] > 0
+            sub = matriz[filas]
+            sub_total = sub.T @ sub
+            sub_recompra = sub.T @ (sub * recompro[filas, None])
+            b = pares_a['j'].to_numpy()
+            for c_b, b_token in enumerate(b):
+                c = b[c_b + 1:]
+                c = c[distinta_variable[b_token, c] & (sub_total[b_token, c] >= min_usuarios)]
+                combinaciones.extend((tokens[a], tokens[b_token], tokens[c_token]) for c_token in c)
+                conteo_total.extend(sub_total[b_token, c])
+                conteo_recompra.extend(sub_recompra[b_token, c])
+
+    if not combinaciones:
+        return pd.DataFrame()
+
+    return _tabla_combinaciones(
+        [' + '.join(combinacion) for combinacion in combinaciones],
+        [', '.join(combinacion) for combinacion in combinaciones],
+        np.rint(conteo_recompra),
+        np.rint(conteo_total),
+    )
+
+# Categoría de producto y kits (de los que sale el diagnóstico) de cada tipo
+CATEGORIAS_KIT = {
+    'Beard': {
+        'category': 'IG00000000000000000000000000000029',
+        'items': ('IT00000000000000000000001004170007','IT00000000000000000000001004170006', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170012', 'IT00000000000000000000001004170013'),
+    },
+    'Hair': {
+        'category': 'IG00000000000000000000000000000028',
+        'items': ('IT00000000000000000000001004170001','IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170009', 'IT00000000000000000000001004170010', 'IT00000000000000000000001004170011', 'IT00000000000000000000001004170014'),
+    },
+}
+
+def consultar_primeras_ordenes(start_date, end_date, endDateActual, categoryTypes=('Beard', 'Hair'), purchaseType='BOTH'):
+    """
+    Primeras órdenes del rango con kits de alguna de las categorías de `categoryTypes`,
+    etiquetadas con su `order_plan`, una columna `is_<categoría>` y el diagnóstico del kit
+    de cada categoría (`diagnostic_<categoría>`). Con varias categorías y plan 'BOTH' es el
+    superconjunto del que filtrar_variante saca cada variante en memoria.
+    """
+    categorias = {categoryType: CATEGORIAS_KIT[categoryType] for categoryType in categoryTypes}
+    cTypes = ", ".join(f"'{categoria['category']}'" for categoria in categorias.values())
 
     pType = ''
     if purchaseType == 'OTO':
         pType = 'AND fo.order_plan = "OTO"'
     elif purchaseType == 'SUBSCRIPTION':
         pType = 'AND fo.order_plan = "SUBSCRIPTION"'
-    
-    """
-    Procesa un rango de fechas y devuelve los DataFrames para diagnóstico
-    """
+
+    etiquetas = "".join(f""",
+            EXISTS (
+            SELECT 1
+            FROM bi.fact_sales_order_items soi
+            WHERE soi.salesOrderId = fo.id
+                AND soi.category = '{categoria['category']}'
+            ) AS is_{categoryType.lower()}"""
+        for categoryType, categoria in categorias.items()
+    )
+    diagnosticos = "".join(f""",
+        (
+            SELECT psoi.additionalFields->>"$.diagnostic"
+            FROM prod_sales_and_subscriptions.sales_order_items psoi
+            WHERE psoi.salesOrderId = fo.order_id
+            AND psoi.itemId IN {categoria['items']}
+            ORDER BY psoi.itemId
+            LIMIT 1
+        ) AS diagnostic_{categoryType.lower()}"""
+        for categoryType, categoria in categorias.items()
+    )
+    columnas_categoria = "".join(f", fo.is_{categoryType.lower()}" for categoryType in categorias)
+
     query = f"""
         WITH first_orders AS (
-        SELECT fo.id AS order_id, fo.customer_id, fo.created_at
+        SELECT fo.id AS order_id, fo.customer_id, fo.created_at, fo.order_plan{etiquetas}
         FROM bi.fact_orders fo
         WHERE fo.is_first_order = 1
             {pType}
@@ -508,7 +661,7 @@ def procesar_rango_fechas(start_date, end_date, endDateActual, nombre_rango, cat
             SELECT 1
             FROM bi.fact_sales_order_items soi
             WHERE soi.salesOrderId = fo.id
-                AND soi.category = '{cType}' 
+                AND soi.category IN ({cTypes})
             )
         ),
         custom_orders_count AS (
@@ -535,29 +688,53 @@ def procesar_rango_fechas(start_date, end_date, endDateActual, nombre_rango, cat
         GROUP BY soi.salesOrderId
         )
         SELECT
-        fo.customer_id,
-        (
-            SELECT psoi.additionalFields->>"$.diagnostic"
-            FROM prod_sales_and_subscriptions.sales_order_items psoi
-            WHERE psoi.salesOrderId = fo.order_id
-            AND psoi.itemId IN {items}
-            ORDER BY psoi.itemId
-            LIMIT 1
-        ) AS diagnostic,
+        fo.customer_id{diagnosticos},
         coc.total_custom_orders,
         foi.item_list AS first_order_items,
-        fo.created_at AS first_order_date
+        fo.created_at AS first_order_date,
+        fo.order_plan{columnas_categoria}
         FROM first_orders fo
         JOIN custom_orders_count coc ON coc.customer_id = fo.customer_id
         JOIN first_order_items foi   ON foi.order_id     = fo.order_id;
     """
-    
-    df = execute_query(query)
+
+    return execute_query(query)
+
+def filtrar_variante(primeras_ordenes, categoryType, purchaseType):
+    """
+    Filas de consultar_primeras_ordenes de una variante (categoría x plan), con las mismas
+    columnas que devolvía la consulta de una sola variante.
+    """
+    categoria = categoryType.lower()
+    filtro = primeras_ordenes[f'is_{categoria}'] == 1
+    if purchaseType in ('OTO', 'SUBSCRIPTION'):
+        filtro &= primeras_ordenes['order_plan'] == purchaseType
+
+    return primeras_ordenes.loc[
+        filtro, ['customer_id', f'diagnostic_{categoria}', 'total_custom_orders', 'first_order_items', 'first_order_date']
+    ].rename(columns={f'diagnostic_{categoria}': 'diagnostic'}).reset_index(drop=True)
+
+def procesar_rango_fechas(start_date, end_date, endDateActual, nombre_rango, categoryType, purchaseType, extracciones=None):
+    """
+    Procesa un rango de fechas y devuelve los DataFrames para diagnóstico
+    Con `extracciones` (dict compartido entre variantes, ver main_variantes) el superconjunto
+    del rango se consulta una sola vez y cada variante se filtra en memoria
+    """
+    if extracciones is None:
+        primeras_ordenes = consultar_primeras_ordenes(start_date, end_date, endDateActual, (categoryType,), purchaseType)
+    else:
+        clave = (start_date, end_date, endDateActual)
+        if clave not in extracciones:
+            extracciones[clave] = consultar_primeras_ordenes(start_date, end_date, endDateActual)
+        primeras_ordenes = extracciones[clave]
+
+    df = filtrar_variante(primeras_ordenes, categoryType, purchaseType)
+    indice = construir_indice_diagnostico(df)
     
     # Procesar los datos de diagnóstico para las 3 páginas
-    df_diagnostico_total = procesar_datos_diagnostico(df)
-    df_diagnostico_item22 = procesar_datos_diagnostico(df, 'IT00000000000000000000000000000022')
-    df_diagnostico_item23 = procesar_datos_diagnostico(df, 'IT00000000000000000000000000000023')
+    df_diagnostico_total = procesar_datos_diagnostico(df, indice=indice)
+    df_diagnostico_item22 = procesar_datos_diagnostico(df, 'IT00000000000000000000000000000022', indice)
+    df_diagnostico_item23 = procesar_datos_diagnostico(df, 'IT00000000000000000000000000000023', indice)
     
     # Añadir nombre del rango a los DataFrames
     df_diagnostico_total['Rango'] = nombre_rango
@@ -568,159 +745,97 @@ def procesar_rango_fechas(start_date, end_date, endDateActual, nombre_rango, cat
         'diagnostico_total': df_diagnostico_total,
         'diagnostico_item22': df_diagnostico_item22,
         'diagnostico_item23': df_diagnostico_item23,
-        'datos_completos': df  # Devolvemos también los datos completos para las combinaciones
+        'datos_completos': df,  # Devolvemos también los datos completos para las combinaciones
+        'indice': indice
     }
 
+# Métricas de cada rango en combinar_dataframes
+METRICAS_RANGO = ('recompraron', 'no_recompraron', 'total', 'porcentaje_maximo', 'porcentaje_variable', 'recompra')
+
+def _filas_rango(df, codigo, tipo_analisis):
+    """
+    Filas de un rango en formato largo para combinar_dataframes: clave, Variable, Value,
+    métricas y el total que aporta la fila al total de su variable.
+    """
+    if tipo_analisis == "diagnostico":
+        clave = df['Producto']
+        partes = clave.str.split(':')
+        variable = partes.str[0]
+        value = partes.str[1].fillna('')
+        # Solo los productos "variable:value" suman al total de su variable
+        suma_variable = clave.str.contains(':', regex=False) & (variable != '')
+    else:  # combinaciones
+        clave = df['Combinación']
+        variable = clave
+        value = df['Variables']
+        suma_variable = clave != ''
+
+    return pd.DataFrame({
+        'codigo': codigo,
+        'clave': clave.to_numpy(),
+        'Variable': variable.to_numpy(),
+        'Value': value.to_numpy(),
+        'recompraron': df['Usuarios que recompraron'].to_numpy(),
+        'no_recompraron': df['Usuarios que no recompraron'].to_numpy(),
+        'total': df['Total de usuarios'].to_numpy(),
+        'recompra': df['Porcentaje de recompra'].to_numpy(),
+        'total_para_variable': df['Total de usuarios'].where(suma_variable, 0).to_numpy(),
+    })
+
+def _formato_porcentaje(valores):
+    # "12.34%" para toda la columna de una vez
+    return np.char.add(np.char.mod('%.2f', valores), '%')
+
 def combinar_dataframes(lista_dataframes, nombres_rangos, tipo_analisis="diagnostico"):
     """
     Combina múltiples DataFrames en uno solo con el formato de columnas solicitado
+    Una fila por producto (o combinación) y un bloque de columnas por rango
     """
-    if not lista_dataframes:
+    codigos = list(nombres_rangos.keys())
+    partes = [
+        _filas_rango(df, codigo, tipo_analisis)
+        for codigo, df in zip(codigos, lista_dataframes)
+        if df is not None and not df.empty
+    ]
+    if not partes:
         return pd.DataFrame()
-    
-    # Mapeo de códigos a nombres completos
-    codigos_nombres = {
-        'CTF': 'Control Timeframe',
-        'DVL': 'OTO Developer change',
-        'AMZ': 'Post Amazon Launch'
-    }
-    
-    # Calcular el máximo de "Total de usuarios" por cada rango
-    maximos_por_rango = {}
-    for i, df in enumerate(lista_dataframes):
-        if df is not None and not df.empty and 'Total de usuarios' in df.columns:
-            codigo_rango = list(nombres_rangos.keys())[i]
-            maximos_por_rango[codigo_rango] = df['Total de usuarios'].max()
-        else:
-            maximos_por_rango[list(nombres_rangos.keys())[i]] = 0
-    
-    # Calcular totales por variable para cada rango
-    totales_por_variable_rango = {}
-    for i, df in enumerate(lista_dataframes):
-        if df is None or df.empty:
-            continue
-            
-        codigo_rango = list(nombres_rangos.keys())[i]
-        totales_por_variable_rango[codigo_rango] = {}
-        
-        # Extraer variable de cada producto
-        if tipo_analisis == "diagnostico":
-            df['variable_only'] = df['Producto'].apply(lambda x: x.split(':')[0] if ':' in x else '')
-        else:
-            # Para combinaciones, usamos la variable directamente
-            df['variable_only'] = df['Combinación']
-        
-        # Calcular total por variable
-        for variable in df['variable_only'].unique():
-            if variable:
-                total_variable = df[df['variable_only'] == variable]['Total de usuarios'].sum()
-                totales_por_variable_rango[codigo_rango][variable] = total_variable
-    
-    # Crear un diccionario para almacenar los datos combinados
-    datos_combinados = {}
-    
-    # Procesar cada DataFrame
-    for i, df in enumerate(lista_dataframes):
-        if df is None or df.empty:
-            continue
-            
-        # Determinar el código y nombre del rango
-        codigo_rango = list(nombres_rangos.keys())[i]
-        nombre_rango = nombres_rangos[codigo_rango]
-        maximo_rango = maximos_por_rango[codigo_rango]
-        
-        # Extraer variable de cada producto para este DataFrame
-        if tipo_analisis == "diagnostico":
-            df['variable_only'] = df['Producto'].apply(lambda x: x.split(':')[0] if ':' in x else '')
+    largo = pd.concat(partes, ignore_index=True)
+
+    # % del máximo de "Total de usuarios" del rango y % sobre el total de la variable en el rango
+    maximo = largo.groupby('codigo', sort=False)['total'].transform('max')
+    total_variable = largo.groupby(['codigo', 'Variable'], sort=False)['total_para_variable'].transform('sum')
+    largo['porcentaje_maximo'] = (largo['total'] / maximo * 100).where(maximo > 0, 0)
+    largo['porcentaje_variable'] = (largo['total'] / total_variable * 100).where(total_variable > 0, 0)
+
+    # Variable y Value salen de la primera aparición de cada clave; las métricas, de la última del rango
+    claves = largo.drop_duplicates('clave')
+    ancho = (
+        largo.drop_duplicates(['codigo', 'clave'], keep='last')
+        .pivot(index='clave', columns='codigo', values=list(METRICAS_RANGO))
+        .reindex(claves['clave'])
+    )
+
+    columnas = {'Variable': claves['Variable'].to_numpy(), 'Value': claves['Value'].to_numpy()}
+    for codigo in codigos:
+        # Los rangos sin datos (o las claves que no aparecen en un rango) quedan en 0
+        if codigo in ancho.columns.get_level_values('codigo'):
+            valores = {metrica: ancho[(metrica, codigo)].fillna(0).to_numpy() for metrica in METRICAS_RANGO}
         else:
-            df['variable_only'] = df['Combinación']
-        
-        for _, row in df.iterrows():
-            if tipo_analisis == "diagnostico":
-                clave = row['Producto']
-                variable = clave.split(':')[0]
-                value = clave.split(':')[1] if ':' in clave else ''
-            else:  # combinaciones
-                clave = row['Combinación']
-                variable = clave
-                value = row['Variables']
-            
-            if clave not in datos_combinados:
-                datos_combinados[clave] = {
-                    'Variable': variable,
-                    'Value': value,
-                }
-                
-                # Inicializar todas las columnas para los 3 rangos
-                for codigo in nombres_rangos.keys():
-                    datos_combinados[clave][f'Usuarios que recompraron {codigo}'] = 0
-                    datos_combinados[clave][f'Usuarios que no recompraron {codigo}'] = 0
-                    datos_combinados[clave][f'Total de usuarios {codigo}'] = 0
-                    datos_combinados[clave][f'% del máximo {codigo}'] = 0
-                    datos_combinados[clave][f'% por variable {codigo}'] = 0  # Nueva columna
-                    datos_combinados[clave][f'{nombres_rangos[codigo]}'] = 0
-            
-            # Asignar los valores para este rango
-            datos_combinados[clave][f'Usuarios que recompraron {codigo_rango}'] = row['Usuarios que recompraron']
-            datos_combinados[clave][f'Usuarios que no recompraron {codigo_rango}'] = row['Usuarios que no recompraron']
-            datos_combinados[clave][f'Total de usuarios {codigo_rango}'] = row['Total de usuarios']
-            
-            # Calcular el porcentaje basado en el valor máximo
-            if maximo_rango > 0:
-                porcentaje_maximo = (row['Total de usuarios'] / maximo_rango) * 100
-            else:
-                porcentaje_maximo = 0
-            datos_combinados[clave][f'% del máximo {codigo_rango}'] = porcentaje_maximo
-            
-            # Calcular el porcentaje por variable
-            total_variable = totales_por_variable_rango[codigo_rango].get(variable, 0)
-            if total_variable > 0:
-                porcentaje_variable = (row['Total de usuarios'] / total_variable) * 100
-            else:
-                porcentaje_variable = 0
-            datos_combinados[clave][f'% por variable {codigo_rango}'] = porcentaje_variable
-            
-            datos_combinados[clave][f'{nombre_rango}'] = row['Porcentaje de recompra']
-    
-    # Convertir a DataFrame
-    df_combinado = pd.DataFrame(list(datos_combinados.values()))
-    
-    # Reordenar las columnas
-    column_order = ['Variable', 'Value']
-    for codigo in nombres_rangos.keys():
-        column_order.extend([
-            f'Usuarios que recompraron {codigo}',
-            f'Usuarios que no recompraron {codigo}',
-            f'Total de usuarios {codigo}',
-            f'% del máximo {codigo}',
-            f'% por variable {codigo}',  # Nueva columna
-            f'{nombres_rangos[codigo]}'
-        ])
-    
-    # Asegurarse de que todas las columnas existan en el DataFrame
-    existing_columns = [col for col in column_order if col in df_combinado.columns]
-    df_combinado = df_combinado[existing_columns]
+            valores = dict.fromkeys(METRICAS_RANGO, np.zeros(len(claves)))
+
+        columnas[f'Usuarios que recompraron {codigo}'] = valores['recompraron'].astype(np.int64)
+        columnas[f'Usuarios que no recompraron {codigo}'] = valores['no_recompraron'].astype(np.int64)
+        columnas[f'Total de usuarios {codigo}'] = valores['total'].astype(np.int64)
+        columnas[f'% del máximo {codigo}'] = _formato_porcentaje(valores['porcentaje_maximo'])
+        columnas[f'% por variable {codigo}'] = _formato_porcentaje(valores['porcentaje_variable'])
+        columnas[f'{nombres_rangos[codigo]}'] = _formato_porcentaje(valores['recompra'])
+
+    df_combinado = pd.DataFrame(columnas)
     
     # Ordenar por Variable y Value (alfabéticamente)
-    df_combinado = df_combinado.sort_values(['Variable', 'Value'])
-    
-    # Formatear las columnas de porcentaje para incluir el símbolo %
-    for codigo in nombres_rangos.keys():
-        for porcentaje_col in [f'% del máximo {codigo}', f'% por variable {codigo}']:
-            if porcentaje_col in df_combinado.columns:
-                df_combinado[porcentaje_col] = df_combinado[porcentaje_col].apply(
-                    lambda x: f"{x:.2f}%" if pd.notna(x) and isinstance(x, (int, float)) else x
-                )
-        
-        recompra_col = f'{nombres_rangos[codigo]}'
-        if recompra_col in df_combinado.columns:
-            df_combinado[recompra_col] = df_combinado[recompra_col].apply(
-                lambda x: f"{x:.2f}%" if pd.notna(x) and isinstance(x, (int, float)) else x
-            )
-    
-    return df_combinado
+    return df_combinado.sort_values(['Variable', 'Value'])
 
-def main(date_start, date_end, endDateActual, name, categoryType, purchaseType):
+def preguntar_tipo_analisis():
     # Preguntar qué tipo de análisis realizar
     root = tk.Tk()
     root.withdraw()  # Ocultar la ventana principal
@@ -730,7 +845,11 @@ def main(date_start, date_end, endDateActual, name, categoryType, purchaseType):
                                    "Sí: Análisis por combinaciones de diagnóstico\n" +
                                    "No: Análisis tradicional por diagnóstico")
     
-    realizar_combinaciones = (opcion == 'yes')
+    return (opcion == 'yes')
+
+def main(date_start, date_end, endDateActual, name, categoryType, purchaseType, realizar_combinaciones=None, extracciones=None):
+    if realizar_combinaciones is None:
+        realizar_combinaciones = preguntar_tipo_analisis()
     
     # Definir las combinaciones preestablecidas
     combinaciones_predefinidas = {
@@ -758,7 +877,7 @@ def main(date_start, date_end, endDateActual, name, categoryType, purchaseType):
     for rango in rangos_fechas:
         print(f"Procesando rango {rango['nombre']}: {rango['start']} a {rango['end']}")
         try:
-            resultado = procesar_rango_fechas(rango['start'], rango['end'], endDateActual, rango['codigo'], categoryType, purchaseType)
+            resultado = procesar_rango_fechas(rango['start'], rango['end'], endDateActual, rango['codigo'], categoryType, purchaseType, extracciones)
             resultados.append(resultado)
             datos_completos.append(resultado['datos_completos'])
         except Exception as e:
@@ -783,7 +902,9 @@ def main(date_start, date_end, endDateActual, name, categoryType, purchaseType):
                 if df.empty:
                     combinaciones_resultados.append(pd.DataFrame())
                 else:
-                    resultado_combinaciones = procesar_datos_combinaciones_diagnostico(df, combinaciones_predefinidas)
+                    resultado_combinaciones = procesar_datos_combinaciones_diagnostico(
+                        df, combinaciones_predefinidas, resultados[i].get('indice')
+                    )
                     resultado_combinaciones['Rango'] = list(nombres_rangos.keys())[i]
                     combinaciones_resultados.append(resultado_combinaciones)
             
@@ -824,11 +945,24 @@ def main(date_start, date_end, endDateActual, name, categoryType, purchaseType):
     
     print(f"Análisis completado. Resultados consolidados guardados en: {nombre_archivo}")
 
+def main_variantes(date_start, date_end, endDateActual, name, variantes):
+    """
+    Ejecuta main() para varias variantes (categoryType, purchaseType) con una sola consulta:
+    el superconjunto de primeras órdenes se extrae una vez por rango de fechas y cada
+    variante se filtra en memoria. Cada variante sigue escribiendo su propio Excel.
+    """
+    realizar_combinaciones = preguntar_tipo_analisis()
+    extracciones = {}
+    for categoryType, purchaseType in variantes:
+        main(date_start, date_end, endDateActual, name, categoryType, purchaseType, realizar_combinaciones, extracciones)
+
 if __name__ == "__main__":
 
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Beard', 'OTO')
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Hair', 'OTO')
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Beard', 'SUBSCRIPTION')
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Hair', 'SUBSCRIPTION')
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Beard', 'BOTH')
-    main('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', 'Hair', 'BOTH')
\ No newline at end of file
+    main_variantes('2025-10-01', '2026-01-01', '2026-04-01', 'Q4 - 2025', [
+        ('Beard', 'OTO'),
+        ('Hair', 'OTO'),
+        ('Beard', 'SUBSCRIPTION'),
+        ('Hair', 'SUBSCRIPTION'),
+        ('Beard', 'BOTH'),
+        ('Hair', 'BOTH'),
+    ])
@@ -4,6 +4,11 @@ from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 
 from modules.database_queries import execute_query
+from modules.diagnostic_fields import extract_diagnostic_fields
+from modules.cancellation_cube import (
+    cancellation_cube, cancellation_fact, normalize_reasons, reason_ethnicity_table,
+    reason_shade_table, shade_column, shade_flags,
+)
 
 
 # Diccionario completo de colorants (30ml + 45ml)
@@ -48,21 +53,6 @@ shades = {
 }
 
 
-def procesar_razon(razon):
-    if pd.isna(razon) or str(razon).strip() == "":
-        return "Sin razón especificada"
-    razon_str = str(razon).strip()
-    if '->' in razon_str:
-        return razon_str.split('->')[0].strip()
-    return razon_str
-
-
-def agregar_porcentaje(valor):
-    if pd.isna(valor):
-        return ""
-    return f"{valor}%"
-
-
 def ajustar_ancho_columnas(archivo_excel):
     try:
         wb = load_workbook(archivo_excel)
@@ -84,42 +74,6 @@ def ajustar_ancho_columnas(archivo_excel):
         print(f"✗ Error ajustando el ancho de columnas para {archivo_excel}: {e}")
 
 
-def analizar_cancelaciones_por_razon(df_cancel_unico):
-    """
-    df_cancel_unico: 1 fila por cancelación (no por item)
-    """
-    df = df_cancel_unico.copy()
-    df['razon_procesada'] = df['reason'].apply(procesar_razon)
-
-    resultado = df.groupby('razon_procesada').agg(
-        total_cancelaciones=('id', 'count'),
-        suscripciones_unicas=('subscriptionId', 'nunique'),
-        caucasian=('has_13', 'sum'),
-        african=('has_14', 'sum'),
-        asian=('has_15', 'sum'),
-    ).reset_index()
-
-    total_cancelaciones = int(resultado['total_cancelaciones'].sum())
-
-    if total_cancelaciones > 0:
-        resultado['porcentaje_cancelaciones'] = (resultado['total_cancelaciones'] / total_cancelaciones * 100).round(2)
-    else:
-        resultado['porcentaje_cancelaciones'] = 0
-
-    total_caucasian = int(resultado['caucasian'].sum())
-    total_african = int(resultado['african'].sum())
-    total_asian = int(resultado['asian'].sum())
-
-    resultado['porcentaje_caucasian'] = (resultado['caucasian'] / total_caucasian * 100).round(2) if total_caucasian else 0
-    resultado['porcentaje_african'] = (resultado['african'] / total_african * 100).round(2) if total_african else 0
-    resultado['porcentaje_asian'] = (resultado['asian'] / total_asian * 100).round(2) if total_asian else 0
-
-    for col in ['porcentaje_cancelaciones', 'porcentaje_caucasian', 'porcentaje_african', 'porcentaje_asian']:
-        resultado[col] = resultado[col].apply(agregar_porcentaje)
-
-    return resultado.sort_values('total_cancelaciones', ascending=False)
-
-
 def _build_cancel_level_table(df_items):
     """
     Convierte df a nivel cancelación:
@@ -127,6 +81,7 @@ def _build_cancel_level_table(df_items):
     - reason: tomamos la primera (debería ser consistente)
     - etnicity: primera
     - salesOrderNumberBeforeCancel / orderAtBeforeCancel: primera
+    - shade_XXXX: True si el pedido antes de la cancelación tenía el shade
     """
     cancel_key = ['subscriptionId', 'cancelAt']
 
@@ -141,6 +96,11 @@ def _build_cancel_level_table(df_items):
         )
     )
 
+    # Flags de shade por item, colapsados a nivel cancelación (si el pedido tenía el shade, queda True)
+    flags = shade_flags(df_items['itemId'], shades)
+    flags = flags.groupby([df_items[columna] for columna in cancel_key]).max()
+    df_cancel = df_cancel.join(flags, on=cancel_key)
+
     # id artificial para conteos
     df_cancel['id'] = np.arange(1, len(df_cancel) + 1)
 
@@ -152,94 +112,6 @@ def _build_cancel_level_table(df_items):
     return df_cancel
 
 
-def analizar_cancelaciones_por_razon_y_shade(df_items, filtro_etnia=None):
-    """
-    df_items viene a nivel item (una fila por itemId del pedido antes de la cancelación).
-    Para no inflar:
-    - Creamos flags por cancelación y shade usando groupby + max().
-    """
-    cancel_key = ['subscriptionId', 'cancelAt']
-
-    df = df_items.copy()
-
-    # flags etnia a nivel fila (se mantienen para el groupby)
-    df['has_13'] = df['etnicity'].eq(13)
-    df['has_14'] = df['etnicity'].eq(14)
-    df['has_15'] = df['etnicity'].eq(15)
-
-    # filtrar por etnia si aplica
-    if filtro_etnia == 13:
-        df = df[df['has_13'] == True]
-        nombre_etnia = "CAUCASIAN"
-    elif filtro_etnia == 14:
-        df = df[df['has_14'] == True]
-        nombre_etnia = "AFRICAN"
-    elif filtro_etnia == 15:
-        df = df[df['has_15'] == True]
-        nombre_etnia = "ASIAN"
-    else:
-        nombre_etnia = "TODAS"
-
-    df['razon_procesada'] = df['reason'].apply(procesar_razon)
-
-    # Crear flags por shade a nivel fila (item)
-    for item_id in shades.keys():
-        col = f"shade_{item_id[-4:]}"
-        df[col] = (df['itemId'] == item_id)
-
-    # Ahora colapsar a nivel cancelación (subscriptionId+cancelAt) con max()
-    # (si el pedido tenía el shade, queda True)
-    agg_cols = {'razon_procesada': ('razon_procesada', 'first')}
-    for item_id in shades.keys():
-        col = f"shade_{item_id[-4:]}"
-        agg_cols[col] = (col, 'max')
-
-    df_cancel_shade = (
-        df.groupby(cancel_key, as_index=False)
-          .agg(**agg_cols)
-    )
-
-    # id artificial de cancelación (para conteo)
-    df_cancel_shade['id'] = np.arange(1, len(df_cancel_shade) + 1)
-
-    # Agrupar por razón (ya a nivel cancelación)
-    agg_dict = {
-        'total_cancelaciones': ('id', 'count'),
-        'suscripciones_unicas': ('subscriptionId', 'nunique'),
-    }
-    for item_id in shades.keys():
-        col = f"shade_{item_id[-4:]}"
-        agg_dict[col] = (col, 'sum')
-
-    resultado = df_cancel_shade.groupby('razon_procesada').agg(**agg_dict).reset_index()
-
-    # % total cancelaciones
-    total_cancel = int(resultado['total_cancelaciones'].sum())
-    resultado['porcentaje_cancelaciones'] = (resultado['total_cancelaciones'] / total_cancel * 100).round(2) if total_cancel else 0
-
-    # % por shade
-    for item_id in shades.keys():
-        col = f"shade_{item_id[-4:]}"
-        total_shade = int(resultado[col].sum())
-        resultado[f'porcentaje_{col}'] = (resultado[col] / total_shade * 100).round(2) if total_shade else 0
-
-    # Renombrar columnas a nombres legibles
-    rename_dict = {}
-    for item_id, shade_name in shades.items():
-        base = f"shade_{item_id[-4:]}"
-        rename_dict[base] = shade_name
-        rename_dict[f'porcentaje_{base}'] = f'porcentaje_{shade_name}'
-    resultado = resultado.rename(columns=rename_dict)
-
-    # Agregar símbolo % a columnas porcentuales
-    pct_cols = ['porcentaje_cancelaciones'] + [f'porcentaje_{name}' for name in shades.values()]
-    for col in pct_cols:
-        if col in resultado.columns:
-            resultado[col] = resultado[col].apply(agregar_porcentaje)
-
-    return resultado.sort_values('total_cancelaciones', ascending=False), nombre_etnia
-
-
 def main(startDate, endDate, kitType):
     
     idType = 'IG00000000000000000000000000000028'
@@ -278,38 +150,7 @@ SELECT
   fo.order_number AS salesOrderNumberBeforeCancel,
   fo.created_at   AS orderAtBeforeCancel,
 
-  (
-    SELECT
-      CASE
-        WHEN SUM(v = '14') > 0 THEN 14
-        WHEN SUM(v = '15') > 0 THEN 15
-        WHEN SUM(v = '13') > 0 THEN 13
-        ELSE NULL
-      END
-    FROM (
-      SELECT jt.v
-      FROM JSON_TABLE(
-        CASE
-          WHEN JSON_TYPE(sub.additionalFields->'$.diagnostic.values') = 'ARRAY'
-          THEN sub.additionalFields->'$.diagnostic.values'
-          ELSE JSON_ARRAY()
-        END,
-        '$[*]' COLUMNS ( v VARCHAR(50) PATH '$.value' )
-      ) jt
-
-      UNION ALL
-
-      SELECT jt2.v
-      FROM JSON_TABLE(
-        CASE
-          WHEN JSON_TYPE(sub.additionalFields->'$.diagnostic.values') = 'OBJECT'
-          THEN sub.additionalFields->'$.diagnostic.values'
-          ELSE JSON_OBJECT()
-        END,
-        '$.*' COLUMNS ( v VARCHAR(50) PATH '$.value' )
-      ) jt2
-    ) x
-  ) AS etnicity,
+  sub.additionalFields->>"$.diagnostic" AS additionalFields,
 
   di.itemId
 FROM cancel_with_last_order c
@@ -372,28 +213,31 @@ WHERE c.lastOrderAt IS NOT NULL
         print("No se encontraron cancelaciones en el rango.")
         return
 
-    # Asegurar tipos útiles
+    # Etnia del diagnóstico de la suscripción: si hay varias, 14 > 15 > 13
+    # (hay una fila por item, así que cada diagnóstico se parsea una sola vez). Como el
+    # JSON_TABLE anterior, solo se leen las respuestas dentro de "values"
     df_items = df_items.copy()
-    df_items['etnicity'] = pd.to_numeric(df_items['etnicity'], errors='coerce')  # 13/14/15 o NaN
+    diagnostico = extract_diagnostic_fields(df_items['additionalFields'], ethnicity_priority=(14, 15, 13), wrapped_only=True)
+    df_items['etnicity'] = diagnostico['ethnicity']  # 13/14/15 o NaN
 
-    # 1) Tabla cancelación única (para "Por Razon (Etnias)")
+    # 1) Tabla cancelación única (una fila por cancelación, con sus shades)
     df_cancel_unico = _build_cancel_level_table(df_items)
 
-    # 2) Tablas de salida
-    print("Procesando datos de cancelaciones por razón (con etnias)...")
-    df_por_razon = analizar_cancelaciones_por_razon(df_cancel_unico)
-
-    print("Procesando datos de cancelaciones por razón (con shades)...")
-    df_por_razon_y_shade, _ = analizar_cancelaciones_por_razon_y_shade(df_items)
-
-    print("Procesando datos de cancelaciones por razón (CAUCASIAN)...")
-    df_caucasian, _ = analizar_cancelaciones_por_razon_y_shade(df_items, 13)
-
-    print("Procesando datos de cancelaciones por razón (AFRICAN)...")
-    df_african, _ = analizar_cancelaciones_por_razon_y_shade(df_items, 14)
+    # 2) Tablas de salida: todas salen de un cubo razón x etnia con los shades
+    print("Procesando cubo de cancelaciones (razón x etnia x shade)...")
+    fact = cancellation_fact(
+        df_cancel_unico['subscriptionId'],
+        normalize_reasons(df_cancel_unico['reason'], blank_as_missing=True),
+        ethnicity=df_cancel_unico['etnicity'],
+        shades=df_cancel_unico[[shade_column(item_id) for item_id in shades]],
+    )
+    cubo = cancellation_cube(fact, ['razon', 'etnia'])
 
-    print("Procesando datos de cancelaciones por razón (ASIAN)...")
-    df_asian, _ = analizar_cancelaciones_por_razon_y_shade(df_items, 15)
+    df_por_razon = reason_ethnicity_table(cubo)
+    df_por_razon_y_shade = reason_shade_table(cubo, shades)
+    df_caucasian = reason_shade_table(cubo, shades, 13)
+    df_african = reason_shade_table(cubo, shades, 14)
+    df_asian = reason_shade_table(cubo, shades, 15)
 
     # 3) Excel (mismo layout general que antes, sin tablas de subs activas)
     nombre_archivo = f"analisis_cancelaciones_{startDate}_to_{endDate}_{kitType}_softBlack30ml.xlsx"
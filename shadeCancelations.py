@@ -1,11 +1,15 @@
 import pandas as pd
 import numpy as np
-import json
 from collections import defaultdict
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 
 from modules.database_queries import execute_query
+from modules.diagnostic_fields import ETHNICITY_CODES, extract_diagnostic_fields, experience_code, experience_with_color
+from modules.cancellation_cube import (
+    cancellation_cube, cancellation_fact, normalize_reasons, reason_ethnicity_table,
+    reason_experience_table, reason_shade_table, shade_flags,
+)
 
 # Diccionario de shades (incluye 30ml y 45ml como está en tu script)
 shades = {
@@ -46,166 +50,24 @@ shades = {
     'IT00000000000000000000000000000045': '45ml Colorant - Jet-Black',
 }
 
-# -----------------------------
-# NUEVO: extractor genérico para leer variables del diagnostic (var 40/36, etc.)
-# -----------------------------
-def extract_diagnostic_var(additional_fields, var_ids):
-    """
-    Busca en diagnostic el primer value cuyo 'variable' esté en var_ids (en orden).
-    Soporta:
-      - diagnostic = list[dict]
-      - diagnostic = dict con keys numéricas -> dict
-      - diagnostic = dict con "values": (list o dict)
-    Retorna string (p.ej. "118") o None.
-    """
-    if not additional_fields or pd.isna(additional_fields):
-        return None
-
-    try:
-        diagnostic_data = json.loads(additional_fields)
-
-        # normalizar "values"
-        if isinstance(diagnostic_data, dict) and "values" in diagnostic_data:
-            values = diagnostic_data.get("values")
-        else:
-            values = diagnostic_data
-
-        # armar iterador de items
-        items = []
-        if isinstance(values, list):
-            items = values
-        elif isinstance(values, dict):
-            # si es dict tipo {"396654": {"value":"14","variable":"4"}} o similar
-            items = list(values.values())
-        else:
-            items = []
-
-        # var_ids en orden: primero 40, luego 36
-        for wanted_var in var_ids:
-            for item in items:
-                if not isinstance(item, dict):
-                    continue
-                var = item.get("variable", item.get("var"))
-                val = item.get("value", item.get("val"))
-                if var is None:
-                    continue
-                try:
-                    var_int = int(var)
-                except (ValueError, TypeError):
-                    continue
-                if var_int == int(wanted_var):
-                    if val is None:
-                        return None
-                    return str(val)
-
-        return None
-
-    except json.JSONDecodeError:
-        return None
-    except Exception as e:
-        print(f"Error procesando additionalFields (extract_diagnostic_var): {e}")
-        return None
-
-
-def map_experience_with_color(exp_code):
-    """
-    Mapea exp_code (string) a etiqueta.
-    """
-    if exp_code is None or (isinstance(exp_code, float) and pd.isna(exp_code)):
-        return "Unknown"
-
-    code = str(exp_code).strip()
-
-    if code in ("118", "112"):
-        return "Currently Dyed"
-    if code in ("119", "116"):
-        return "I've colored"
-    if code in ("120", "114"):
-        return "Never colored"
-    return "Unknown"
-
-
-# -----------------------------
-# EXISTENTE: etnias (13/14/15) extractor
-# -----------------------------
-def extract_diagnostic_values(additional_fields):
-    """
-    Extrae los valores de diagnóstico (13, 14, 15) del campo additionalFields
-    Devuelve una lista con los valores encontrados (solo el primero si hay múltiples)
-    """
-    if not additional_fields or pd.isna(additional_fields):
-        return []
-
-    try:
-        diagnostic_data = json.loads(additional_fields)
-        values_found = []
-
-        # Formato 1: Lista de diccionarios [{"value": 13, "variable": 4}, ...]
-        if isinstance(diagnostic_data, list):
-            for item in diagnostic_data:
-                if isinstance(item, dict) and 'value' in item:
-                    try:
-                        value = int(item['value'])
-                        if value in [13, 14, 15]:
-                            values_found.append(value)
-                    except (ValueError, TypeError):
-                        continue
-
-        # Formato 2: Diccionario {"396654": {"value": "14", "variable": "4"}}
-        elif isinstance(diagnostic_data, dict):
-            for _, value_dict in diagnostic_data.items():
-                if isinstance(value_dict, dict) and 'value' in value_dict:
-                    try:
-                        value = int(value_dict['value'])
-                        if value in [13, 14, 15]:
-                            values_found.append(value)
-                    except (ValueError, TypeError):
-                        continue
-                elif isinstance(value_dict, list):
-                    for item in value_dict:
-                        if isinstance(item, dict) and 'value' in item:
-                            try:
-                                value = int(item['value'])
-                                if value in [13, 14, 15]:
-                                    values_found.append(value)
-                            except (ValueError, TypeError):
-                                continue
-
-        return values_found[:1] if values_found else []
-
-    except json.JSONDecodeError:
-        return []
-    except Exception as e:
-        print(f"Error procesando additionalFields: {e}")
-        return []
-
+# Ítems de kit por categoría: el diagnóstico de estos ítems tiene prioridad sobre el de la orden
+ITEMS_KIT = {
+    'Beard': ('IT00000000000000000000001004170001','IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170009', 'IT00000000000000000000001004170010', 'IT00000000000000000000001004170011', 'IT00000000000000000000001004170014'),
+    'Hair': ('IT00000000000000000000001004170007','IT00000000000000000000001004170006', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170012', 'IT00000000000000000000001004170013'),
+}
 
-def procesar_razon(razon):
+def agregar_diagnostico(df):
     """
-    Procesa la razón de cancelación para obtener más detalle en casos específicos
-    (en tu script special_cases está vacío, así que se queda igual)
+    Etnia (has_13/14/15) y experience_with_color (var 40 preferido; fallback var 36 solo si
+    la 40 no aparece) a partir de additionalFields, parseando cada diagnóstico una sola vez.
     """
-    if pd.isna(razon):
-        return "Sin razón especificada"
-
-    razon_str = str(razon).strip()
-
-    special_cases = []
-
-    for case in special_cases:
-        if razon_str.startswith(case):
-            if razon_str.count('->') >= 2:
-                parts = razon_str.split('->', 2)
-                return f"{parts[0].strip()} -> {parts[1].strip()}"
-            elif '->' in razon_str:
-                return razon_str
-            else:
-                return razon_str
-
-    if '->' in razon_str:
-        return razon_str.split('->')[0].strip()
-    else:
-        return razon_str
+    diagnostico = extract_diagnostic_fields(df['additionalFields'], variables=(40, 36))
+    df['ethnicity'] = diagnostico['ethnicity']
+    for code in ETHNICITY_CODES:
+        df[f'has_{code}'] = diagnostico['ethnicity'] == code
+    df['exp_code'] = experience_code(diagnostico, null_falls_back=False)
+    df['experience_with_color'] = experience_with_color(diagnostico, null_falls_back=False)
+    return df
 
 
 def agregar_porcentaje(valor):
@@ -214,47 +76,67 @@ def agregar_porcentaje(valor):
     return f"{valor}%"
 
 
-def obtener_suscripciones_activas(startDate, endDate):
+def _ventanas_sql(ventanas):
     """
-    Obtiene suscripciones (para tablas de distribución) por etnia, shade
-    y AHORA también experience_with_color.
+    CTE `ventanas` (ventana, startDate, endDate) con una fila por rango de fechas; la columna
+    `ventana` es la posición del rango en la lista.
+    """
+    return "\n        UNION ALL ".join(
+        f"SELECT {i} AS ventana, CAST('{startDate}' AS DATETIME) AS startDate, CAST('{endDate}' AS DATETIME) AS endDate"
+        for i, (startDate, endDate) in enumerate(ventanas)
+    )
+
+
+def obtener_suscripciones_activas_por_ventana(ventanas):
+    """
+    Suscripciones (para tablas de distribución) de varias ventanas de fechas con una sola
+    consulta. Devuelve un dict posición de la ventana -> DataFrame como el de
+    obtener_suscripciones_activas.
     """
     item_ids = list(shades.keys())
     item_ids_str = "', '".join(item_ids)
+    inicio = min(startDate for startDate, _ in ventanas)
+    fin = max(endDate for _, endDate in ventanas)
 
     query = f"""
+    WITH ventanas AS (
+        {_ventanas_sql(ventanas)}
+    )
     SELECT  
+        v.ventana,
         sub.id,
         sub.additionalFields->>"$.diagnostic" AS additionalFields,
         subIt.itemId
     FROM prod_sales_and_subscriptions.subscriptions sub
     JOIN bi.fact_orders fo ON sub.id = fo.subscription_id
+    JOIN ventanas v ON fo.created_at BETWEEN v.startDate AND v.endDate
     JOIN prod_sales_and_subscriptions.subscription_items subIt on sub.id = subIt.subscriptionId
     WHERE fo.status NOT IN ('CANCELLED','PAYMENT_ERROR')
-    AND fo.created_at BETWEEN '{startDate}' AND '{endDate}'
+    AND fo.created_at BETWEEN '{inicio}' AND '{fin}'
     AND subIt.itemId IN ('{item_ids_str}')
-    GROUP BY sub.id;
+    GROUP BY v.ventana, sub.id;
     """
 
     df_suscripciones = execute_query(query)
 
-    # Etnias
-    df_suscripciones['diagnostic_values'] = df_suscripciones['additionalFields'].apply(extract_diagnostic_values)
-    df_suscripciones['has_13'] = df_suscripciones['diagnostic_values'].apply(lambda x: 13 in x)
-    df_suscripciones['has_14'] = df_suscripciones['diagnostic_values'].apply(lambda x: 14 in x)
-    df_suscripciones['has_15'] = df_suscripciones['diagnostic_values'].apply(lambda x: 15 in x)
-
-    # Experience (var 40 preferido; fallback var 36)
-    df_suscripciones['exp_code'] = df_suscripciones['additionalFields'].apply(
-        lambda x: extract_diagnostic_var(x, [40, 36])
-    )
-    df_suscripciones['experience_with_color'] = df_suscripciones['exp_code'].apply(map_experience_with_color)
+    # Etnias y experience (var 40 preferido; fallback var 36)
+    df_suscripciones = agregar_diagnostico(df_suscripciones)
 
     # Shades
-    for item_id, shade_name in shades.items():
-        df_suscripciones[f'shade_{item_id[-4:]}'] = df_suscripciones['itemId'] == item_id
+    df_suscripciones = df_suscripciones.join(shade_flags(df_suscripciones['itemId'], shades))
 
-    return df_suscripciones
+    return {
+        i: df_suscripciones[df_suscripciones['ventana'] == i].drop(columns='ventana')
+        for i in range(len(ventanas))
+    }
+
+
+def obtener_suscripciones_activas(startDate, endDate):
+    """
+    Obtiene suscripciones (para tablas de distribución) por etnia, shade
+    y AHORA también experience_with_color.
+    """
+    return obtener_suscripciones_activas_por_ventana([(startDate, endDate)])[0]
 
 
 def crear_tabla_etnias(df_suscripciones):
@@ -328,157 +210,6 @@ def crear_tabla_experience(df_suscripciones):
     return counts
 
 
-def analizar_cancelaciones_por_razon(df):
-    df['razon_procesada'] = df['reason'].apply(procesar_razon)
-
-    resultado = df.groupby('razon_procesada').agg(
-        total_cancelaciones=('id', 'count'),
-        suscripciones_unicas=('subscriptionId', 'nunique'),
-        caucasian=('has_13', 'sum'),
-        african=('has_14', 'sum'),
-        asian=('has_15', 'sum')
-    ).reset_index()
-
-    total_cancelaciones = resultado['total_cancelaciones'].sum()
-
-    if total_cancelaciones > 0:
-        resultado['porcentaje_cancelaciones'] = (resultado['total_cancelaciones'] / total_cancelaciones * 100).round(2)
-    else:
-        resultado['porcentaje_cancelaciones'] = 0
-
-    total_caucasian = resultado['caucasian'].sum()
-    total_african = resultado['african'].sum()
-    total_asian = resultado['asian'].sum()
-
-    resultado['porcentaje_caucasian'] = (resultado['caucasian'] / total_caucasian * 100).round(2) if total_caucasian > 0 else 0
-    resultado['porcentaje_african'] = (resultado['african'] / total_african * 100).round(2) if total_african > 0 else 0
-    resultado['porcentaje_asian'] = (resultado['asian'] / total_asian * 100).round(2) if total_asian > 0 else 0
-
-    for col in ['porcentaje_cancelaciones', 'porcentaje_caucasian', 'porcentaje_african', 'porcentaje_asian']:
-        resultado[col] = resultado[col].apply(agregar_porcentaje)
-
-    resultado = resultado.sort_values('total_cancelaciones', ascending=False)
-
-    return resultado
-
-
-def analizar_cancelaciones_por_razon_y_shade(df, filtro_etnia=None):
-    if filtro_etnia == 13:
-        df = df[df['has_13'] == True]
-        nombre_etnia = "CAUCASIAN"
-    elif filtro_etnia == 14:
-        df = df[df['has_14'] == True]
-        nombre_etnia = "AFRICAN"
-    elif filtro_etnia == 15:
-        df = df[df['has_15'] == True]
-        nombre_etnia = "ASIAN"
-    else:
-        nombre_etnia = "TODAS"
-
-    df['razon_procesada'] = df['reason'].apply(procesar_razon)
-
-    for item_id, shade_name in shades.items():
-        col_name = f"shade_{item_id[-4:]}"
-        df[col_name] = df['itemIds'].str.contains(item_id, na=False)
-
-    agg_dict = {
-        'total_cancelaciones': ('id', 'count'),
-        'suscripciones_unicas': ('subscriptionId', 'nunique')
-    }
-
-    for item_id in shades.keys():
-        col_name = f"shade_{item_id[-4:]}"
-        agg_dict[col_name] = (col_name, 'sum')
-
-    resultado = df.groupby('razon_procesada').agg(**agg_dict).reset_index()
-
-    total_cancelaciones = resultado['total_cancelaciones'].sum()
-
-    if total_cancelaciones > 0:
-        resultado['porcentaje_cancelaciones'] = (resultado['total_cancelaciones'] / total_cancelaciones * 100).round(2)
-    else:
-        resultado['porcentaje_cancelaciones'] = 0
-
-    for item_id in shades.keys():
-        col_name = f"shade_{item_id[-4:]}"
-        total_shade = resultado[col_name].sum()
-        if total_shade > 0:
-            resultado[f'porcentaje_{col_name}'] = (resultado[col_name] / total_shade * 100).round(2)
-        else:
-            resultado[f'porcentaje_{col_name}'] = 0
-
-    rename_dict = {}
-    for item_id, shade_name in shades.items():
-        col_name = f"shade_{item_id[-4:]}"
-        rename_dict[col_name] = shade_name
-        rename_dict[f'porcentaje_{col_name}'] = f'porcentaje_{shade_name}'
-
-    resultado = resultado.rename(columns=rename_dict)
-
-    columnas_porcentaje = ['porcentaje_cancelaciones'] + [f'porcentaje_{shade_name}' for shade_name in shades.values()]
-    for col in columnas_porcentaje:
-        if col in resultado.columns:
-            resultado[col] = resultado[col].apply(agregar_porcentaje)
-
-    resultado = resultado.sort_values('total_cancelaciones', ascending=False)
-
-    return resultado, nombre_etnia
-
-
-# -----------------------------
-# NUEVO: análisis por razón + experience_with_color
-# -----------------------------
-def analizar_cancelaciones_por_razon_y_experience(df):
-    df = df.copy()
-    df["razon_procesada"] = df["reason"].apply(procesar_razon)
-
-    # Normaliza experiencia
-    df["experience_with_color"] = df["experience_with_color"].fillna("Unknown")
-
-    # Booleans por categoría
-    df["exp_currently_dyed"] = df["experience_with_color"] == "Currently Dyed"
-    df["exp_ive_colored"] = df["experience_with_color"] == "I've colored"
-    df["exp_never_colored"] = df["experience_with_color"] == "Never colored"
-    df["exp_unknown"] = df["experience_with_color"] == "Unknown"
-
-    resultado = df.groupby("razon_procesada").agg(
-        total_cancelaciones=("id", "count"),
-        suscripciones_unicas=("subscriptionId", "nunique"),
-        currently_dyed=("exp_currently_dyed", "sum"),
-        ive_colored=("exp_ive_colored", "sum"),
-        never_colored=("exp_never_colored", "sum"),
-        unknown=("exp_unknown", "sum"),
-    ).reset_index()
-
-    total_cancelaciones = resultado["total_cancelaciones"].sum()
-    if total_cancelaciones > 0:
-        resultado["porcentaje_cancelaciones"] = (resultado["total_cancelaciones"] / total_cancelaciones * 100).round(2)
-    else:
-        resultado["porcentaje_cancelaciones"] = 0
-
-    # Porcentajes por cada categoría (sobre el total de la categoría)
-    for col, pct_col in [
-        ("currently_dyed", "porcentaje_currently_dyed"),
-        ("ive_colored", "porcentaje_ive_colored"),
-        ("never_colored", "porcentaje_never_colored"),
-        ("unknown", "porcentaje_unknown"),
-    ]:
-        denom = resultado[col].sum()
-        resultado[pct_col] = (resultado[col] / denom * 100).round(2) if denom > 0 else 0
-
-    # Formato %
-    for col in [
-        "porcentaje_cancelaciones",
-        "porcentaje_currently_dyed",
-        "porcentaje_ive_colored",
-        "porcentaje_never_colored",
-        "porcentaje_unknown",
-    ]:
-        resultado[col] = resultado[col].apply(agregar_porcentaje)
-
-    return resultado.sort_values("total_cancelaciones", ascending=False)
-
-
 def ajustar_ancho_columnas(archivo_excel):
     try:
         wb = load_workbook(archivo_excel)
@@ -509,26 +240,47 @@ def ajustar_ancho_columnas(archivo_excel):
         print(f"✗ Error ajustando el ancho de columnas para {archivo_excel}: {e}")
 
 
-def main(startDate, endDate, categoryType):
-    # 1. Obtener datos de cancelaciones
+def consultar_cancelaciones(ventanas, categoryTypes=('Beard', 'Hair')):
+    """
+    Cancelaciones de varias ventanas de fechas y categorías de kit con una sola consulta.
+    La última orden, sus ítems y su diagnóstico se calculan una vez por cancelación; cada fila
+    sale etiquetada con `ventana` (posición en `ventanas`; una cancelación aparece en todas las
+    ventanas que la incluyen) y `categoryType`, que solo cambia qué ítems de kit aportan el
+    diagnóstico.
+    """
     item_ids = list(shades.keys())
     item_ids_str = "', '".join(item_ids)
+    inicio = min(startDate for startDate, _ in ventanas)
+    fin = max(endDate for _, endDate in ventanas)
 
-    if categoryType == "Beard":
-        items_beard_hair = "('IT00000000000000000000001004170001','IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170009', 'IT00000000000000000000001004170010', 'IT00000000000000000000001004170011', 'IT00000000000000000000001004170014')"
-    elif categoryType == "Hair":
-        items_beard_hair = "('IT00000000000000000000001004170007','IT00000000000000000000001004170006', 'IT00000000000000000000001004170008', 'IT00000000000000000000001004170012', 'IT00000000000000000000001004170013')"
-    
+    categorias = "\n        UNION ALL ".join(f"SELECT '{categoryType}' AS categoryType" for categoryType in categoryTypes)
+    items_kit = " OR ".join(
+        "(cat.categoryType = '{}' AND soi.itemId IN ('{}'))".format(categoryType, "', '".join(ITEMS_KIT[categoryType]))
+        for categoryType in categoryTypes
+    )
 
     query = f"""
-    WITH cancels AS (
+    WITH ventanas AS (
+        {_ventanas_sql(ventanas)}
+        ),
+
+        categorias AS (
+        {categorias}
+        ),
+
+        cancels AS (
         SELECT
             fc.id,
             fc.subscriptionId,
             fc.reason,
             fc.createdAt
         FROM bi.fact_cancellations fc
-        WHERE fc.createdAt BETWEEN '{startDate}' AND '{endDate}'
+        WHERE fc.createdAt BETWEEN '{inicio}' AND '{fin}'
+        AND EXISTS (
+            SELECT 1
+            FROM ventanas v
+            WHERE fc.createdAt BETWEEN v.startDate AND v.endDate
+        )
         ),
 
         last_order AS (
@@ -565,19 +317,23 @@ def main(startDate, endDate, categoryType):
         diagnostic AS (
         SELECT
             lo.cancel_id,
+            cat.categoryType,
             COALESCE(
             soi.additionalFields->>"$.diagnostic",
             so.additionalFields->>"$.diagnostic"
             ) AS additionalFields
         FROM last_order lo
+        CROSS JOIN categorias cat
         JOIN prod_sales_and_subscriptions.sales_orders so
             ON so.id = lo.salesOrderId
         LEFT JOIN prod_sales_and_subscriptions.sales_order_items soi
             ON soi.salesOrderId = so.id
-        AND soi.itemId IN {items_beard_hair}
+        AND ({items_kit})
         )
 
         SELECT
+        v.ventana,
+        cat.categoryType,
         c.id,
         c.subscriptionId,
         c.reason,
@@ -586,12 +342,16 @@ def main(startDate, endDate, categoryType):
         lo.order_number AS orderNumbers,
         d.additionalFields
         FROM cancels c
+        JOIN ventanas v
+        ON c.createdAt BETWEEN v.startDate AND v.endDate
         JOIN last_order lo
         ON lo.cancel_id = c.id
         JOIN items i
         ON i.cancel_id = c.id
+        CROSS JOIN categorias cat
         LEFT JOIN diagnostic d
         ON d.cancel_id = c.id
+        AND d.categoryType = cat.categoryType
         WHERE EXISTS (
         SELECT 1
         FROM bi.fact_sales_order_items fso2
@@ -600,48 +360,30 @@ def main(startDate, endDate, categoryType):
         );
     """
 
-    df = execute_query(query)
-
-    # Etnias
-    print("Procesando datos de diagnóstico (etnias)...")
-    df['diagnostic_values'] = df['additionalFields'].apply(extract_diagnostic_values)
-    df['has_13'] = df['diagnostic_values'].apply(lambda x: 13 in x)
-    df['has_14'] = df['diagnostic_values'].apply(lambda x: 14 in x)
-    df['has_15'] = df['diagnostic_values'].apply(lambda x: 15 in x)
-
-    # NUEVO: Experience with color
-    print("Procesando datos de diagnóstico (experience_with_color)...")
-    df["exp_code"] = df["additionalFields"].apply(lambda x: extract_diagnostic_var(x, [40, 36]))
-    df["experience_with_color"] = df["exp_code"].apply(map_experience_with_color)
-
-    # 2. Suscripciones activas (para tablas)
-    print("Obteniendo datos de suscripciones activas...")
-    df_suscripciones = obtener_suscripciones_activas(startDate, endDate)
-
-    print("Creando tablas de suscripciones...")
-    tabla_etnias = crear_tabla_etnias(df_suscripciones)
-    tabla_shades = crear_tabla_shades(df_suscripciones)
-    tabla_experience = crear_tabla_experience(df_suscripciones)
-
-    # 3. Tablas de cancelaciones
-    print("Procesando datos de cancelaciones por razón (con etnias)...")
-    df_por_razon = analizar_cancelaciones_por_razon(df)
-
-    print("Procesando datos de cancelaciones por razón (con shades)...")
-    df_por_razon_y_shade, _ = analizar_cancelaciones_por_razon_y_shade(df)
+    return execute_query(query)
 
-    print("Procesando datos de cancelaciones por razón (CAUCASIAN)...")
-    df_caucasian, _ = analizar_cancelaciones_por_razon_y_shade(df, 13)
 
-    print("Procesando datos de cancelaciones por razón (AFRICAN)...")
-    df_african, _ = analizar_cancelaciones_por_razon_y_shade(df, 14)
+def generar_reporte(df, shades_por_fila, df_suscripciones, tablas_suscripciones, startDate, endDate, categoryType):
+    """
+    Workbook de una ventana y categoría a partir de sus cancelaciones (con diagnóstico y
+    razón ya procesados), su matriz de shades y las suscripciones activas de la ventana.
+    """
+    tabla_etnias, tabla_shades, tabla_experience = tablas_suscripciones
 
-    print("Procesando datos de cancelaciones por razón (ASIAN)...")
-    df_asian, _ = analizar_cancelaciones_por_razon_y_shade(df, 15)
+    # 3. Tablas de cancelaciones: todas salen de un cubo razón x etnia x experience con los shades
+    print("Procesando cubo de cancelaciones (razón x etnia x experience x shade)...")
+    fact = cancellation_fact(
+        df['subscriptionId'], df['razon_procesada'], ethnicity=df['ethnicity'],
+        experience=df['experience_with_color'], shades=shades_por_fila
+    )
+    cubo = cancellation_cube(fact, ['razon', 'etnia', 'experiencia'])
 
-    # NUEVO: Por razón (Experience)
-    print("Procesando datos de cancelaciones por razón (Experience)...")
-    df_por_razon_experience = analizar_cancelaciones_por_razon_y_experience(df)
+    df_por_razon = reason_ethnicity_table(cubo)
+    df_por_razon_y_shade = reason_shade_table(cubo, shades)
+    df_caucasian = reason_shade_table(cubo, shades, 13)
+    df_african = reason_shade_table(cubo, shades, 14)
+    df_asian = reason_shade_table(cubo, shades, 15)
+    df_por_razon_experience = reason_experience_table(cubo)
 
     # 4. Guardar Excel
     nombre_archivo = f"analisis_cancelaciones_{startDate}_to_{endDate}_{categoryType}.xlsx"
@@ -712,29 +454,56 @@ def main(startDate, endDate, categoryType):
     print(tabla_experience)
 
 
+def main_ventanas(ventanas, categoryTypes=('Beard', 'Hair')):
+    """
+    Genera el workbook de cada ventana (startDate, endDate) y categoría con una sola consulta
+    de cancelaciones y una de suscripciones activas, compartida entre categorías.
+    """
+    # 1. Obtener datos de cancelaciones
+    print(f"Consultando cancelaciones de {len(ventanas)} ventana(s) para {', '.join(categoryTypes)}...")
+    df_cancelaciones = consultar_cancelaciones(ventanas, categoryTypes)
+
+    # Etnias y experience with color
+    print("Procesando datos de diagnóstico (etnias y experience_with_color)...")
+    df_cancelaciones = agregar_diagnostico(df_cancelaciones)
+    df_cancelaciones['razon_procesada'] = normalize_reasons(df_cancelaciones['reason'])
+    shades_por_fila = shade_flags(df_cancelaciones['itemIds'], shades)
+
+    # 2. Suscripciones activas (para tablas)
+    print("Obteniendo datos de suscripciones activas...")
+    suscripciones_por_ventana = obtener_suscripciones_activas_por_ventana(ventanas)
+
+    for i, (startDate, endDate) in enumerate(ventanas):
+        df_suscripciones = suscripciones_por_ventana[i]
+
+        print(f"Creando tablas de suscripciones ({startDate} a {endDate})...")
+        tablas_suscripciones = (
+            crear_tabla_etnias(df_suscripciones),
+            crear_tabla_shades(df_suscripciones),
+            crear_tabla_experience(df_suscripciones),
+        )
+
+        for categoryType in categoryTypes:
+            filas = (df_cancelaciones['ventana'] == i) & (df_cancelaciones['categoryType'] == categoryType)
+            df = df_cancelaciones[filas].drop(columns=['ventana', 'categoryType'])
+            generar_reporte(
+                df, shades_por_fila[filas], df_suscripciones, tablas_suscripciones,
+                startDate, endDate, categoryType
+            )
+
+
+def main(startDate, endDate, categoryType):
+    main_ventanas([(startDate, endDate)], (categoryType,))
+
+
 if __name__ == "__main__":
-    main('2026-01-01', '2026-04-01', 'Beard')
-    main('2026-01-01', '2026-04-01', 'Hair')
-    # main('2021-03-01', '2021-07-01')
-    # main('2021-07-01', '2021-10-01')
-    # main('2021-10-01', '2022-01-01')
-
-    # main('2022-01-01', '2022-04-01')
-    # main('2022-03-01', '2022-07-01')
-    # main('2022-07-01', '2022-10-01')
-    # main('2022-10-01', '2023-01-01')
-
-    # main('2023-01-01', '2023-04-01')
-    # main('2023-03-01', '2023-07-01')
-    # main('2023-07-01', '2023-10-01')
-    # main('2023-10-01', '2024-01-01')
-    
-    # main('2024-01-01', '2024-04-01')
-    # main('2024-03-01', '2024-07-01')
-    # main('2024-07-01', '2024-10-01')
-    # main('2024-10-01', '2025-01-01')
-
-    # main('2025-01-01', '2025-04-01')
-    # main('2025-03-01', '2025-07-01')
-    # main('2025-07-01', '2025-10-01')
-    # main('2025-10-01', '2026-01-01')
\ No newline at end of file
+    main_ventanas([('2026-01-01', '2026-04-01')], ('Beard', 'Hair'))
+
+    # Histórico trimestral: todas las ventanas y ambas categorías en una sola consulta
+    # main_ventanas([
+    #     ('2021-03-01', '2021-07-01'), ('2021-07-01', '2021-10-01'), ('2021-10-01', '2022-01-01'),
+    #     ('2022-01-01', '2022-04-01'), ('2022-03-01', '2022-07-01'), ('2022-07-01', '2022-10-01'), ('2022-10-01', '2023-01-01'),
+    #     ('2023-01-01', '2023-04-01'), ('2023-03-01', '2023-07-01'), ('2023-07-01', '2023-10-01'), ('2023-10-01', '2024-01-01'),
+    #     ('2024-01-01', '2024-04-01'), ('2024-03-01', '2024-07-01'), ('2024-07-01', '2024-10-01'), ('2024-10-01', '2025-01-01'),
+    #     ('2025-01-01', '2025-04-01'), ('2025-03-01', '2025-07-01'), ('2025-07-01', '2025-10-01'), ('2025-10-01', '2026-01-01'),
+    # ])
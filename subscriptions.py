@@ -10,6 +10,7 @@ from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
 from modules.database_queries import execute_query
+from modules.order_snapshot import get_order_snapshot, not_equal
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_dataframe_to_excel_orders
 from report import anotar_datos_excel
@@ -32,17 +33,6 @@ def subs(start_date, end_date):
     AND plan_id IN ('SP00000000000000000000000000000002', 'SP00000000000000000000000000000003', 'SP00000000000000000000000000000004', 'SP00000000000000000000000000000005', 'SP00000000000000000000000000000008', 'SP00000000000000000000000000000009', 'SP00000000000000000000000000000010', 'SP00000000000000000000000000000011');
     """
 
-    query_oto = f"""
-    SELECT *
-    FROM bi.fact_sales_order_items so
-    JOIN bi.fact_orders fo ON so.salesOrderId = fo.id
-    WHERE fo.created_at >= '{start_date} 00:00:00' -- Fecha de inicio
-    AND fo.created_at < '{end_date} 00:00:00' -- Fecha actual
-    AND fo.status != 'CANCELLED'
-    AND fo.order_plan != 'SUBSCRIPTION'
-    AND so.itemId IN ('IT00000000000000000000001004170001', 'IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170006', 'IT00000000000000000000001004170007', 'IT00000000000000000000001004170008','IT00000000000000000000001004170009', 'IT00000000000000000000001004170010')
-    """
-
     new_query_minisubs = f"""
     SELECT sub.*, fo.is_first_order FROM bi.fact_subscriptions sub
     JOIN bi.fact_orders fo ON sub.id = fo.subscription_id
@@ -91,7 +81,16 @@ def subs(start_date, end_date):
     """
     miniSubs = execute_query(query_minisubs)
     subs = execute_query(query_subs)
-    oto = execute_query(query_oto)
+
+    # Ítems OTO de órdenes no canceladas del periodo, sobre la foto compartida de fact_orders
+    snapshot = get_order_snapshot(start_date, end_date)
+    items = snapshot.order_items()
+    oto = items[
+        snapshot.between(data=items)
+        & not_equal(items['status'], 'CANCELLED')
+        & not_equal(items['order_plan'], 'SUBSCRIPTION')
+        & items['itemId'].isin(['IT00000000000000000000001004170001', 'IT00000000000000000000001004170002', 'IT00000000000000000000001004170003', 'IT00000000000000000000001004170004', 'IT00000000000000000000001004170005', 'IT00000000000000000000001004170006', 'IT00000000000000000000001004170007', 'IT00000000000000000000001004170008','IT00000000000000000000001004170009', 'IT00000000000000000000001004170010'])
+    ]
 
     miniSubsMew = execute_query(new_query_minisubs)
     subsNew = execute_query(new_query_subs)
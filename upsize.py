@@ -9,86 +9,33 @@ from tkinter import Tk, Label, Button, Entry
 from tkinter import messagebox
 from tkcalendar import Calendar
 from modules.colors import lighten_color
-from modules.database_queries import execute_query
+from modules.order_snapshot import get_order_snapshot, first_item_per_order, not_equal
 from modules.date_selector import open_date_selector
 from modules.excel_creator import save_dataframe_to_excel, save_dataframe_to_excel_orders
 from report import anotar_datos_excel
 
 def upsize(start_date, end_date):
 
-    query_scrub_upsized_orders = f"""
-        SELECT SI.itemId, SO.order_number, SO.status, SO.created_at, SO.is_first_order, SI.quantity, SO.units
-        FROM bi.fact_orders SO
-        JOIN bi.fact_customers CU ON CU.id = SO.customer_id
-        RIGHT JOIN bi.fact_sales_order_items SI 
-            ON SI.salesOrderId = SO.id
-        WHERE SI.itemId in ("IT00000000000000000000000000000110", "IT00000000000000000000000000000111", "IT00000000000000000000000000000112")
-        AND SO.created_at > "{start_date}" AND SO.created_at < "{end_date}"
-        AND SO.status <> "CANCELLED"
-        GROUP BY SO.id
-        ORDER BY SO.created_at DESC;
-    """
-
-    query_wipes_total_orders = f"""
-        SELECT SI.itemId, SO.order_number, SO.status, SO.created_at, SO.is_first_order, SI.quantity, SO.units
-        FROM bi.fact_orders SO
-        JOIN bi.fact_customers CU ON CU.id = SO.customer_id
-        RIGHT JOIN bi.fact_sales_order_items SI 
-            ON SI.salesOrderId = SO.id
-        WHERE SI.itemId = "IT00000000000000000000000000000115"
-        AND SO.created_at > "{start_date}" AND SO.created_at < "{end_date}"
-        AND SO.status <> "CANCELLED"
-        GROUP BY SO.id
-        ORDER BY SO.created_at DESC;
-    """
-
-    query_shampoo_total_orders = f"""
-        SELECT SI.itemId, SO.order_number, SO.status, SO.created_at, SO.is_first_order, SI.quantity, SO.units
-        FROM bi.fact_orders SO
-        JOIN bi.fact_customers CU ON CU.id = SO.customer_id
-        RIGHT JOIN bi.fact_sales_order_items SI 
-            ON SI.salesOrderId = SO.id
-        WHERE SI.itemId in ("IT00000000000000000000000000000246", "IT00000000000000000000000000000245")
-        AND SO.created_at > "{start_date}" AND SO.created_at < "{end_date}"
-        AND SO.status <> "CANCELLED"
-        GROUP BY SO.id
-        ORDER BY SO.created_at DESC;
-    """
-
-    query_conditioner_total_orders = f"""
-        SELECT SI.itemId, SO.order_number, SO.status, SO.created_at, SO.is_first_order, SI.quantity, SO.units
-        FROM bi.fact_orders SO
-        JOIN bi.fact_customers CU ON CU.id = SO.customer_id
-        RIGHT JOIN bi.fact_sales_order_items SI 
-            ON SI.salesOrderId = SO.id
-        WHERE SI.itemId = "IT00000000000000000000000000000248"
-        AND SO.created_at > "{start_date}" AND SO.created_at < "{end_date}"
-        AND SO.status <> "CANCELLED"
-        GROUP BY SO.id
-        ORDER BY SO.created_at DESC;
-    """
-    query_total_oto_orders = f"""
-        SELECT distinct
-            fo.order_number, 
-            fo.created_at, 
-            so.category 
-        FROM bi.fact_orders fo
-        JOIN bi.fact_sales_order_items so ON fo.id = so.salesOrderId
-        where fo.status <> "CANCELLED"
-        and fo.created_at > "{start_date}" AND fo.created_at < "{end_date}"
-        and fo.order_plan = "OTO"
-        and so.category in ("IG00000000000000000000000000000028", "IG00000000000000000000000000000029");
-    """
-
-    usto = execute_query(query_scrub_upsized_orders)
-
-    uwto = execute_query(query_wipes_total_orders)
+    # Ítems de órdenes no canceladas del periodo (created_at > start y < end), sobre la foto compartida
+    snapshot = get_order_snapshot(start_date, end_date)
+    items = snapshot.order_items()
+    items = items[snapshot.between(start_inclusive=False, data=items) & not_equal(items['status'], 'CANCELLED')]
+    items_customers = items[items['has_customer']]
+
+    # Órdenes con cada producto upsized (una fila por orden)
+    usto = first_item_per_order(items_customers[items_customers['itemId'].isin(["IT00000000000000000000000000000110", "IT00000000000000000000000000000111", "IT00000000000000000000000000000112"])])
+
+    uwto = first_item_per_order(items_customers[items_customers['itemId'] == "IT00000000000000000000000000000115"])
     
-    ushoto = execute_query(query_shampoo_total_orders)
+    ushoto = first_item_per_order(items_customers[items_customers['itemId'].isin(["IT00000000000000000000000000000246", "IT00000000000000000000000000000245"])])
     
-    ucto = execute_query(query_conditioner_total_orders)
+    ucto = first_item_per_order(items_customers[items_customers['itemId'] == "IT00000000000000000000000000000248"])
 
-    to = execute_query(query_total_oto_orders)
+    # Órdenes OTO de pelo y barba
+    to = items[
+        (items['order_plan'] == 'OTO')
+        & items['category'].isin(["IG00000000000000000000000000000028", "IG00000000000000000000000000000029"])
+    ].drop_duplicates(['order_number', 'created_at', 'category'])
 
     beard_total_orders = (to['category'] == 'IG00000000000000000000000000000029').sum()
     scrub_upsized_orders = usto['order_number'].nunique()